@@ -1,480 +1,439 @@
 import streamlit as st
-import pandas as pd
-from collections import defaultdict
-import sys
-import re
-import uuid
 import os
+import shutil
+import tempfile
+import time
+import uuid
+import weakref
 
-# 函数：从调研 Excel 生成表头 Excel
-def generate_header_from_survey(survey_file='survey-JP.xlsx', output_file='header-JP.xlsx', sheet_name=0):
+from engine import GenerationError, _noop_progress, generate_header, generate_headers
+from ingest import list_sheets, read_survey_bytes, survey_digest as compute_digest
+from jobs import JOB_RESULT_ENTRIES, JOB_STATUS_LABELS, JobManager, JobQueueFull
+from logs import LOG_LEVEL_LABELS, LOG_LEVELS, LogCollector
+from marketplaces import DEFAULT_MARKETPLACE, MARKETPLACES
+from perf import COUNTED_LEVELS, STAGE_LABELS, report_json, slowest_campaigns_frame, stage_frame
+from sheets import generate_combined_header, generate_sheet_headers
+from validate import issue_row_count, summarize_issues
+from writers import BULK_UPLOAD_ROW_LIMIT, COMPRESSIONS, OUTPUT_FORMATS, output_mime, zip_outputs
+
+# 调研文件解析缓存目录（按文件内容哈希），重复点击“生成表头”时跳过解析；
+# 每次写入缓存后清理超过 7 天未使用的文件，总大小超过上限时删除最久未使用的（见 ingest.evict_cache）
+SURVEY_CACHE_DIR = '.survey_cache'
+
+# 后台生成任务的进度刷新间隔（秒）
+JOB_POLL_INTERVAL = 0.5
+
+# 校验问题明细最多展示的行数（完整明细可下载）
+ISSUE_PREVIEW_ROWS = 1000
+
+# 输出格式选项的显示名称
+OUTPUT_FORMAT_LABELS = {
+    'xlsx': 'xlsx（Excel）',
+    'csv': 'csv（UTF-8，写出快、文件小）',
+    'tsv': 'tsv（制表符分隔，UTF-8）',
+}
+
+# 会话临时目录：写磁盘模式下保存本会话的上传文件和输出文件，会话结束（对象被回收）或进程退出时自动删除
+class SessionWorkdir:
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='sp-header-')
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+# 函数：当前会话的标识，后台任务按会话区分（内存输出模式下各会话的输出文件名相同）
+def session_id():
+    value = st.session_state.get('session_id')
+    if value is None:
+        value = st.session_state['session_id'] = uuid.uuid4().hex
+    return value
+
+# 函数：当前会话的临时目录
+def session_workdir():
+    workdir = st.session_state.get('workdir')
+    if workdir is None or not os.path.isdir(workdir.path):
+        workdir = SessionWorkdir()
+        st.session_state['workdir'] = workdir
+    return workdir.path
+
+# 函数：展示生成日志：概要和警告直接显示，完整日志放入可折叠、可筛选的表格，并可下载为文本
+def render_log(collector, key='log'):
+    for record in collector.filter(['summary', 'warning']):
+        if record.table is not None:
+            st.dataframe(record.table, hide_index=True)
+        elif record.level == 'warning':
+            st.warning(record.message)
+        else:
+            st.write(record.message)
+    
+    counts = collector.counts()
+    summary = '，'.join(f"{LOG_LEVEL_LABELS[level]} {count}" for level, count in counts.items() if count)
+    with st.expander(f"运行日志（共 {len(collector)} 条：{summary}）", expanded=False):
+        levels = st.multiselect("级别", options=LOG_LEVELS, default=['summary', 'warning', 'info'],
+                                format_func=LOG_LEVEL_LABELS.get, key=f'{key}-levels')
+        keyword = st.text_input("搜索日志", key=f'{key}-search')
+        st.dataframe(collector.to_frame(levels, keyword), hide_index=True)
+        st.download_button(
+            label='下载完整日志',
+            data=collector.to_text().encode('utf-8'),
+            file_name='generate-log.txt',
+            mime='text/plain',
+            key=f'{key}-download'
+        )
+
+# 函数：展示性能面板：各阶段耗时（含页面渲染）、各实体层级行数、最慢的活动，并可下载 JSON 报告
+def render_perf(report, render_seconds=None, key='perf'):
+    if not report:
+        return
+    # 缓存中的报告不修改，渲染耗时只加在展示的副本上
+    report = dict(report)
+    if render_seconds is not None:
+        report['stages'] = report['stages'] + [{
+            'stage': 'render', 'label': STAGE_LABELS['render'],
+            'wall_s': round(render_seconds, 4), 'cpu_s': None, 'peak_mb': None,
+        }]
+    total = sum(stage['wall_s'] for stage in report['stages'])
+    with st.expander(f"性能（总耗时 {total:.2f}s）", expanded=False):
+        st.dataframe(stage_frame(report), hide_index=True)
+        columns = st.columns(len(COUNTED_LEVELS))
+        for column, level in zip(columns, COUNTED_LEVELS):
+            column.metric(f"{level}行数", report['row_counts'][level])
+        campaigns = report['campaigns']
+        st.write(f"活动展开：{campaigns['count']} 个活动，合计 {campaigns['total_s']:.3f}s，"
+                 f"平均 {campaigns['mean_ms']:.3f}ms，最慢 {campaigns['max_ms']:.3f}ms")
+        if campaigns['slowest']:
+            st.write("展开最慢的活动：")
+            st.dataframe(slowest_campaigns_frame(report), hide_index=True)
+        st.download_button(
+            label='下载性能报告（JSON）',
+            data=report_json(report).encode('utf-8'),
+            file_name='generate-perf.json',
+            mime='application/json',
+            key=f'{key}-download'
+        )
+
+# 函数：展示上传前校验结果：问题汇总、明细（前 ISSUE_PREVIEW_ROWS 行）和 CSV 下载
+def render_issues(issues, key='issues'):
+    if issues is None:
+        return
+    if issues.empty:
+        st.caption("上传前校验通过")
+        return
+    st.warning(f"上传前校验发现 {len(issues)} 个问题（涉及 {issue_row_count(issues)} 行），上传前请修正")
+    with st.expander("校验问题明细", expanded=False):
+        st.dataframe(summarize_issues(issues), hide_index=True)
+        st.dataframe(issues.head(ISSUE_PREVIEW_ROWS).astype({'值': str}), hide_index=True)
+        st.download_button(
+            label='下载校验问题（CSV）',
+            data=issues.to_csv(index=False).encode('utf-8-sig'),
+            file_name='header-issues.csv',
+            mime='text/csv',
+            key=f'{key}-download'
+        )
+
+# 函数：展示否定词精简少输出的行数
+def render_prune_stats(prune_stats):
+    if prune_stats:
+        st.info(f"否定词精简：少输出 {prune_stats['合计']} 行否定关键词"
+                f"（重复 {prune_stats['重复']}，被否定词组覆盖 {prune_stats['被词组覆盖']}）")
+
+# 后台任务管理（进程内所有会话共用）：限制同时生成的任务数，完成的结果保留到过期
+@st.cache_resource
+def job_manager():
+    return JobManager()
+
+# 函数：展示后台任务的进度（排队位置或当前阶段、已展开/全部活动数）和取消按钮
+def render_job_progress(job):
+    if job.status == 'queued':
+        position = job_manager().queue_position(job)
+        st.progress(0, text=f"{job.label}：{JOB_STATUS_LABELS['queued']}（前面还有 {position} 个任务）")
+    else:
+        stage = STAGE_LABELS.get(job.stage, '准备中')
+        elapsed = time.time() - job.started
+        if job.total:
+            text = f"{job.label}：{stage}，已展开 {job.done}/{job.total} 个活动（已用时 {elapsed:.0f}s）"
+        else:
+            text = f"{job.label}：{stage}（已用时 {elapsed:.0f}s）"
+        st.progress(job.fraction or 0.0, text=text)
+    if job.cancel_requested:
+        st.caption("正在取消...")
+    elif st.button("取消生成", key=f'cancel-{job.id}'):
+        job.cancel()
+        st.rerun()
+
+# 函数：在后台任务中执行 func(*args)，同一会话中 key 相同的请求共用一个任务（切换控件、点击下载等不再重新生成）
+# 任务的 key 带上会话标识，不同会话即使上传相同文件、选择相同选项也各自生成，不会看到或取消别人的任务
+# 任务未结束时展示进度并定时刷新页面；完成时返回任务，已取消、出错、排队已满或结果已过期时返回 None
+# restart=True（点击了“生成表头”）时提交任务（或重新提交已取消、出错的任务）；其他页面重跑（下载、切换控件）
+# 只查找已有任务，结果已过期（见 jobs.JOB_RESULT_TTL）时提示重新生成，不在后台悄悄重新生成
+def run_in_background(key, label, func, *args, restart=False):
+    key = (session_id(), *key)
+    if not restart and job_manager().get(key) is None:
+        st.info("生成结果已过期，请点击“生成表头”重新生成。")
+        return None
     try:
-        # 读取 Excel 文件
-        df_survey = pd.read_excel(survey_file, sheet_name=sheet_name)
-        st.write(f"成功读取文件：{survey_file}，数据形状：{df_survey.shape}")
-        st.write(f"列名列表: {list(df_survey.columns)}")
-    except FileNotFoundError:
-        st.error(f"错误：未找到文件 {survey_file}。请确保文件已上传。")
+        job = job_manager().submit(key, label, func, *args, restart=restart)
+    except JobQueueFull as e:
+        st.error(str(e))
         return None
-    except Exception as e:
-        st.error(f"读取文件时出错：{e}")
+    if job.active:
+        render_job_progress(job)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    if job.status == 'cancelled':
+        st.info("已取消生成。点击“生成表头”重新开始。")
         return None
-    
-    # 提取独特活动名称
-    unique_campaigns = [name for name in df_survey['广告活动名称'].dropna() if str(name).strip()]
-    st.write(f"独特活动名称数量: {len(unique_campaigns)}: {unique_campaigns}")
-    
-    # 创建活动到 CPC/SKU/广告组默认竞价/预算/广告位/百分比 的映射
-    non_empty_campaigns = df_survey[
-        df_survey['广告活动名称'].notna() & 
-        (df_survey['广告活动名称'] != '')
-    ]
-    required_cols = ['CPC', 'SKU', '广告组默认竞价', '预算', '广告位', '百分比']
-    if all(col in non_empty_campaigns.columns for col in required_cols):
-        campaign_to_values = non_empty_campaigns.drop_duplicates(
-            subset='广告活动名称', keep='first'
-        ).set_index('广告活动名称')[required_cols].to_dict('index')
-    else:
-        campaign_to_values = {}
-        st.warning(f"警告：缺少列 {set(required_cols) - set(non_empty_campaigns.columns)}，使用默认值")
-    
-    st.write(f"生成的字典（有 {len(campaign_to_values)} 个活动）: {campaign_to_values}")
-    
-    # 关键词列：从 suzhu/宿主-精准词（索引 9）到 广泛词.2（索引 18）
-    keyword_columns = df_survey.columns[9:19]
-    st.write(f"关键词列: {list(keyword_columns)}")
-    
-    # 检查关键词重复
-    duplicates_found = False
-    st.write("### 检查关键词重复")
-    for col in keyword_columns:
-        col_index = list(df_survey.columns).index(col) + 1
-        col_letter = chr(64 + col_index) if col_index <= 26 else f"{chr(64 + (col_index-1)//26)}{chr(64 + (col_index-1)%26 + 1)}"
-        kw_list = [kw for kw in df_survey[col].dropna() if str(kw).strip()]
-        
-        if len(kw_list) > len(set(kw_list)):
-            duplicates_mask = df_survey[col].duplicated(keep=False)
-            duplicates_df = df_survey[duplicates_mask][[col]].dropna()
-            st.warning(f"警告：{col_letter} 列 ({col}) 有重复关键词")
-            for _, row in duplicates_df.iterrows():
-                kw = str(row[col]).strip()
-                count = (df_survey[col] == kw).sum()
-                if count > 1:
-                    st.write(f"  重复词: '{kw}' (出现 {count} 次)")
-            duplicates_found = True
-    
-    if duplicates_found:
-        st.error("提示：由于检测到关键词重复，本次不生成表格。请清理重复后重试。")
+    if job.status == 'failed':
+        st.error(job.error)
         return None
+    return job
+
+# 函数：解析缓存参数；内存输出模式不写磁盘，解析结果只缓存在进程内（按调研文件哈希，见 ingest.SURVEY_MEMORY_ENTRIES）
+def survey_cache_options(options):
+    in_memory = bool(dict(options).get('in_memory'))
+    return {'cache_dir': None if in_memory else SURVEY_CACHE_DIR, 'memory_cache': in_memory}
+
+# 函数：生成表头（在后台任务中执行），返回 (结果, 输出文件内容, 日志, 错误消息)
+def run_generation(survey_file, output_file, options, previous_header=None, progress=_noop_progress):
+    log = LogCollector()
+    try:
+        result = generate_header(survey_file=survey_file, output_file=output_file, log=log,
+                                 **survey_cache_options(options), previous_header=previous_header,
+                                 progress=progress, **dict(options))
+    except GenerationError as e:
+        return None, {}, log, str(e)
     
-    st.write("关键词无重复，继续生成...")
-    
-    # 否定关键词聚合
-    neg_exact = [kw for kw in df_survey.get('否定精准', pd.Series()).dropna() if str(kw).strip()]
-    neg_phrase = [kw for kw in df_survey.get('否定词组', pd.Series()).dropna() if str(kw).strip()]
-    suzhu_extra_neg_exact = [kw for kw in df_survey.get('宿主额外否精准', pd.Series()).dropna() if str(kw).strip()]
-    suzhu_extra_neg_phrase = [kw for kw in df_survey.get('宿主额外否词组', pd.Series()).dropna() if str(kw).strip()]
-    neg_asin = [kw for kw in df_survey.get('否定ASIN', pd.Series()).dropna() if str(kw).strip()]
+    # 输出文件内容随结果一起缓存，下载时不再读取磁盘
+    files = result.output_data
+    if not files:
+        for path in result.output_files:
+            with open(path, 'rb') as f:
+                files[path] = f.read()
+    return result, files, log, None
+
+# 函数：多站点生成（在后台任务中执行）
+def run_multi_generation(survey_file, countries, output_file, options, progress=_noop_progress):
+    log = LogCollector()
+    try:
+        results = generate_headers(survey_file=survey_file, marketplaces=countries, output_file=output_file,
+                                   log=log, **survey_cache_options(options), progress=progress, **dict(options))
+    except GenerationError as e:
+        return None, {}, log, str(e)
     
-    # 列定义
-    columns = [
-        '产品', '实体层级', '操作', '广告活动编号', '广告组编号', '广告组合编号', '广告编号', '关键词编号', '商品投放 ID',
-        '广告活动名称', '广告组名称', '开始日期', '结束日期', '投放类型', '状态', '每日预算', 'SKU', '广告组默认竞价',
-        '竞价', '关键词文本', '匹配类型', '竞价方案', '广告位', '百分比', '拓展商品投放编号'
-    ]
+    files = {}
+    for result in results.values():
+        files.update(result.output_data)
+        if not result.output_data:
+            for path in result.output_files:
+                with open(path, 'rb') as f:
+                    files[path] = f.read()
+    return results, files, log, None
+
+# 函数：从一份调研 Excel 同时生成多个站点的表头，打包为一个 zip 下载
+# output_file 为文件名模板，{country} 替换为站点代码
+def generate_headers_from_survey(survey_file, countries, output_file='header-{country}.xlsx', sheet_name=0,
+                                 check_cross_columns=False, streaming=False, max_rows=BULK_UPLOAD_ROW_LIMIT,
+                                 survey_digest=None, in_memory=False, trace_memory=False, output_format='xlsx',
+                                 compression=None, prune_negatives=False, restart=False):
+    if survey_digest is None:
+        survey_digest = compute_digest(read_survey_bytes(survey_file))
+    options = (('sheet_name', sheet_name), ('check_cross_columns', check_cross_columns),
+               ('streaming', streaming), ('max_rows', max_rows), ('in_memory', in_memory),
+               ('profile', True), ('trace_memory', trace_memory), ('output_format', output_format),
+               ('compression', compression), ('prune_negatives', prune_negatives))
+    job = run_in_background(('multi', survey_digest, tuple(countries), options, output_file),
+                            f"正在生成 {len(countries)} 个站点的表头", run_multi_generation,
+                            survey_file, tuple(countries), output_file, options, restart=restart)
+    if job is None:
+        return None
+    results, files, log, error = job.result
     
-    # 默认值
-    product = '商品推广'
-    operation = 'Create'
-    status = '已启用'
-    targeting_type = '手动'
-    bidding_strategy = '动态竞价 - 仅降低'
-    default_daily_budget = 12
-    default_group_bid = 0.6
+    render_start = time.perf_counter()
+    render_log(log)
+    if error:
+        st.error(error)
+        return None
     
-   # 改进的关键词类别提取逻辑
-    def extract_keyword_categories(df_survey):
-        categories = set()
-        
-        # 从列名中提取所有可能的关键词类别
-        for col in df_survey.columns:
-            col_lower = str(col).lower()
-            
-            # 处理关键词列
-            if any(x in col_lower for x in ['精准词', '广泛词', '精准', '广泛']):
-                # 去除匹配类型后缀
-                for suffix in ['精准词', '广泛词', '精准', '广泛']:
-                    if col_lower.endswith(suffix):
-                        prefix = col_lower[:-len(suffix)].strip()
-                        # 按多种分隔符拆分
-                        parts = re.split(r'[/\-_\s\.]', prefix)
-                        for part in parts:
-                            if part and len(part) > 1:  # 只保留有意义的词
-                                categories.add(part)
-                        break
-            
-            # 处理ASIN列
-            elif 'asin' in col_lower and '否定' not in col_lower:
-                # 去除ASIN后缀
-                prefix = col_lower.replace('asin', '').strip()
-                # 按多种分隔符拆分
-                parts = re.split(r'[/\-_\s\.]', prefix)
-                for part in parts:
-                    if part and len(part) > 1:  # 只保留有意义的词
-                        categories.add(part)
-        
-        # 添加已知的关键词类别
-        categories.update(['suzhu', '宿主', 'case', '包', 'tape'])
-        
-        # 移除空字符串
-        categories.discard('')
-        
-        return categories
+    st.success(f"生成完成！共 {len(results)} 个站点，{len(files)} 个文件")
+    tabs = st.tabs(list(results))
+    for tab, (name, result) in zip(tabs, results.items()):
+        with tab:
+            file_names = [os.path.basename(path) for path in result.output_files]
+            st.write(f"输出文件：{', '.join(file_names)}，总行数：{result.row_count}")
+            render_prune_stats(result.prune_stats)
+            render_issues(result.issues, key=f'issues-{name}')
+            st.dataframe(result.preview)
     
-    keyword_categories = extract_keyword_categories(df_survey)
-    st.write(f"识别到的关键词类别: {keyword_categories}")
+    st.download_button(
+        label=f'下载全部表头文件（zip，{len(files)} 个文件）',
+        data=zip_outputs(files),
+        file_name='headers.zip',
+        mime='application/zip',
+        key='download-zip'
+    )
     
-    # 生成数据行
-    rows = []
+    render_perf(next(iter(results.values())).perf, time.perf_counter() - render_start)
+    return results
+
+# 函数：多工作表生成（在后台任务中执行）
+# 合并输出时返回 {'合并': GenerationResult}，逐表输出时返回 {工作表: GenerationResult}
+def run_sheets_generation(survey_file, sheets, per_sheet, output_file, options, progress=_noop_progress):
+    log = LogCollector()
+    try:
+        if per_sheet:
+            results = generate_sheet_headers(survey_file=survey_file, sheet_names=list(sheets),
+                                             output_file=output_file, log=log, **survey_cache_options(options),
+                                             progress=progress, **dict(options))
+        else:
+            results = {'合并': generate_combined_header(survey_file=survey_file, sheet_names=list(sheets),
+                                                        output_file=output_file, log=log,
+                                                        **survey_cache_options(options), progress=progress,
+                                                        **dict(options))}
+    except GenerationError as e:
+        return None, {}, log, str(e)
     
-    # 函数：为商品定向活动查找匹配的列
-    def find_matching_asin_columns(campaign_name, df_survey, keyword_categories):
-        # 修改：广告活动名称必须跟列名完全一样
-        matching_columns = []
-        for col in df_survey.columns:
-            col_lower = str(col).lower()
-            if str(col) == str(campaign_name) and 'asin' in col_lower and '否定' not in col_lower:
-                matching_columns.append(col)
-                st.write(f"  匹配的ASIN列: {col} (完全匹配活动名称 {campaign_name})")
-                break  # 假设只有一个完全匹配的列
-        
-        if not matching_columns:
-            st.write(f"  {campaign_name} 未找到完全匹配的ASIN列")
-        
-        return matching_columns
+    files = {}
+    for result in results.values():
+        files.update(result.output_data)
+        if not result.output_data:
+            for path in result.output_files:
+                with open(path, 'rb') as f:
+                    files[path] = f.read()
+    return results, files, log, None
 
-    # 函数：查找匹配的关键词列
-    def find_matching_keyword_columns(campaign_name, df_survey, keyword_categories, keyword_columns, match_type):
-        campaign_name_normalized = str(campaign_name).lower()
-        
-        # 确定关键词类别
-        matched_categories = []
-        for category in keyword_categories:
-            if category and category in campaign_name_normalized:
-                matched_categories.append(category)
-        
-        st.write(f"  匹配的关键词类别: {matched_categories}")
-        
-        if not matched_categories:
-            st.write("  无匹配的关键词类别")
-            return [], []
-        
-        # 确定匹配类型关键词
-        match_type_keywords = []
-        if match_type == '精准':
-            match_type_keywords = ['精准', 'exact']
-        elif match_type == '广泛':
-            match_type_keywords = ['广泛', 'broad']
-        
-        # 查找匹配的列
-        matching_columns = []
-        for col in keyword_columns:
-            col_lower = str(col).lower()
-            
-            # 检查列名是否包含匹配类型关键词
-            has_match_type = any(keyword in col_lower for keyword in match_type_keywords)
-            
-            # 检查列名是否包含任何匹配的类别
-            has_category = any(category in col_lower for category in matched_categories)
-            
-            if has_match_type and has_category:
-                matching_columns.append(col)
-        
-        st.write(f"  匹配的列: {matching_columns}")
-        
-        # 提取关键词
-        keywords = []
-        for col in matching_columns:
-            keywords.extend([kw for kw in df_survey[col].dropna() if str(kw).strip()])
-        
-        # 去重
-        keywords = list(dict.fromkeys(keywords))
-        st.write(f"  关键词数量: {len(keywords)} (示例: {keywords[:2] if keywords else '无'})")
-        
-        return matching_columns, keywords
+# 函数：从一份调研 Excel 的多个工作表生成表头：合并为一个表头，或每个工作表一个表头（打包为 zip 下载）
+def generate_sheets_from_survey(survey_file, sheets, per_sheet=False, output_file='header-JP.xlsx',
+                                check_cross_columns=False, streaming=False, max_rows=BULK_UPLOAD_ROW_LIMIT,
+                                survey_digest=None, country=DEFAULT_MARKETPLACE, in_memory=False, output_format='xlsx',
+                                compression=None, prune_negatives=False, restart=False):
+    if survey_digest is None:
+        survey_digest = compute_digest(read_survey_bytes(survey_file))
+    options = (('check_cross_columns', check_cross_columns), ('streaming', streaming), ('max_rows', max_rows),
+               ('in_memory', in_memory), ('marketplace', country), ('output_format', output_format),
+               ('compression', compression), ('prune_negatives', prune_negatives), ('profile', True))
+    job = run_in_background(('sheets', survey_digest, tuple(sheets), per_sheet, options, output_file),
+                            f"正在处理 {len(sheets)} 个工作表", run_sheets_generation,
+                            survey_file, tuple(sheets), per_sheet, output_file, options, restart=restart)
+    if job is None:
+        return None
+    results, files, log, error = job.result
     
-    # 函数：查找否定关键词
-    def find_neg_keywords(campaign_name, df_survey, keyword_categories, keyword_columns):
-        campaign_name_normalized = str(campaign_name).lower()
-        
-        # 确定关键词类别
-        matched_categories = []
-        for category in keyword_categories:
-            if category and category in campaign_name_normalized:
-                matched_categories.append(category)
-        
-        if not matched_categories:
-            return []
-        
-        # 查找精准关键词列
-        neg_keywords = []
-        for col in keyword_columns:
-            col_lower = str(col).lower()
-            if any(category in col_lower for category in matched_categories) and any(x in col_lower for x in ['精准', 'exact']):
-                neg_keywords.extend([kw for kw in df_survey[col].dropna() if str(kw).strip()])
-        
-        # 去重
-        neg_keywords = list(dict.fromkeys(neg_keywords))
-        st.write(f"  精准否定关键词数量: {len(neg_keywords)} (示例: {neg_keywords[:2] if neg_keywords else '无'})")
-        
-        return neg_keywords
+    render_start = time.perf_counter()
+    render_log(log)
+    if error:
+        st.error(error)
+        return None
     
-    # 函数：查找交叉否定关键词
-    def find_cross_neg_keywords(campaign_name, df_survey, keyword_categories, keyword_columns):
-        campaign_name_normalized = str(campaign_name).lower()
-        
-        cross_neg_keywords = []
-        
-        # 如果是宿主组，否定case精准词
-        if any(x in campaign_name_normalized for x in ['suzhu', '宿主']):
-            # 查找case精准关键词作为否定词
-            for col in keyword_columns:
-                col_lower = str(col).lower()
-                if any(case_word in col_lower for case_word in ['case', '包', 'tape']) and any(x in col_lower for x in ['精准', 'exact']):
-                    cross_neg_keywords.extend([kw for kw in df_survey[col].dropna() if str(kw).strip()])
-        
-        # 如果是case组，否定宿主精准词
-        elif any(x in campaign_name_normalized for x in ['case', '包', 'tape']):
-            # 查找宿主精准关键词作为否定词
-            for col in keyword_columns:
-                col_lower = str(col).lower()
-                if any(suzhu_word in col_lower for suzhu_word in ['suzhu', '宿主']) and any(x in col_lower for x in ['精准', 'exact']):
-                    cross_neg_keywords.extend([kw for kw in df_survey[col].dropna() if str(kw).strip()])
-        
-        # 去重
-        cross_neg_keywords = list(dict.fromkeys(cross_neg_keywords))
-        st.write(f"  交叉否定关键词数量: {len(cross_neg_keywords)} (示例: {cross_neg_keywords[:2] if cross_neg_keywords else '无'})")
-        
-        return cross_neg_keywords
+    total_rows = sum(result.row_count for result in results.values())
+    st.success(f"生成完成！共 {len(sheets)} 个工作表，{len(files)} 个文件，总行数：{total_rows}")
+    tabs = st.tabs(list(results))
+    for tab, (name, result) in zip(tabs, results.items()):
+        with tab:
+            file_names = [os.path.basename(path) for path in result.output_files]
+            st.write(f"输出文件：{', '.join(file_names)}，总行数：{result.row_count}")
+            render_prune_stats(result.prune_stats)
+            render_issues(result.issues, key=f'issues-{name}')
+            st.dataframe(result.preview)
     
-    for campaign_name in unique_campaigns:
-        # 获取 CPC、SKU、广告组默认竞价、预算、广告位、百分比
-        if campaign_name in campaign_to_values:
-            cpc = campaign_to_values[campaign_name]['CPC']
-            sku = campaign_to_values[campaign_name]['SKU']
-            group_bid = campaign_to_values[campaign_name]['广告组默认竞价']
-            budget = campaign_to_values[campaign_name]['预算']
-            ad_position = campaign_to_values[campaign_name]['广告位']
-            percentage = campaign_to_values[campaign_name]['百分比']
-        else:
-            cpc = 0.5
-            sku = 'SKU-1'
-            group_bid = default_group_bid
-            budget = default_daily_budget
-            ad_position = ''
-            percentage = ''
-        
-        st.write(f"处理活动: {campaign_name}")
-        
-        campaign_name_normalized = str(campaign_name).lower()
-        
-        # 确定匹配类型
-        is_exact = any(x in campaign_name_normalized for x in ['精准', 'exact'])
-        is_broad = any(x in campaign_name_normalized for x in ['广泛', 'broad'])
-        is_asin = 'asin' in campaign_name_normalized
-        match_type = '精准' if is_exact else '广泛' if is_broad else 'ASIN' if is_asin else None
-        st.write(f"  is_exact: {is_exact}, is_broad: {is_broad}, is_asin: {is_asin}, match_type: {match_type}")
-        
-        # 提取关键词（用于正向关键词，精准/广泛匹配）
-        keywords = []
-        matched_columns = []
-        if is_exact or is_broad:
-            matched_columns, keywords = find_matching_keyword_columns(
-                campaign_name, df_survey, keyword_categories, keyword_columns, match_type
+    if len(files) > 1:
+        st.download_button(
+            label=f'下载全部表头文件（zip，{len(files)} 个文件）',
+            data=zip_outputs(files),
+            file_name='headers.zip',
+            mime='application/zip',
+            key='download-sheets-zip'
+        )
+    else:
+        for path, data in files.items():
+            st.download_button(
+                label=f'下载生成的表头文件 ({os.path.basename(path)})',
+                data=data,
+                file_name=os.path.basename(path),
+                mime=output_mime(path),
+                key=f'download-{path}'
             )
-        
-        # 提取精准关键词（用于广泛匹配活动的否定关键词）
-        neg_keywords = []
-        if is_broad:
-            neg_keywords = find_neg_keywords(campaign_name, df_survey, keyword_categories, keyword_columns)
-        
-        # 提取 ASIN（用于商品定向）
-        asin_targets = []
-        if is_asin:
-            matching_columns = find_matching_asin_columns(campaign_name, df_survey, keyword_categories)
-            for col in matching_columns:
-                asin_targets.extend([kw for kw in df_survey[col].dropna() if str(kw).strip()])
-            asin_targets = list(dict.fromkeys(asin_targets))
-            st.write(f"  商品定向 ASIN 数量: {len(asin_targets)} (示例: {asin_targets[:2] if asin_targets else '无'})")
-        
-        # 广告活动行
-        rows.append([
-            product, '广告活动', operation, campaign_name, '', '', '', '', '',
-            campaign_name, '', '', '', targeting_type, status, budget, '', '',
-            '', '', '', bidding_strategy, '', '', ''
-        ])
-        
-        # 竞价调整行
-        rows.append([
-            '商品推广', '竞价调整', 'Create', campaign_name, '', '', '', '', '',
-            campaign_name, campaign_name, '', '', '手动', '', '', '', '',
-            '', '', '', '动态竞价 - 仅降低', ad_position, percentage, ''
-        ])
-        
-        # 广告组行
-        rows.append([
-            product, '广告组', operation, campaign_name, campaign_name, '', '', '', '',
-            campaign_name, campaign_name, '', '', '', status, '', '', group_bid,
-            '', '', '', '', '', '', ''
-        ])
-        
-        # 商品广告行
-        rows.append([
-            product, '商品广告', operation, campaign_name, campaign_name, '', '', '', '',
-            campaign_name, campaign_name, '', '', '', status, '', sku, '',
-            '', '', '', '', '', '', ''
-        ])
-        
-        # 关键词行（仅精准/广泛匹配）
-        if is_exact or is_broad:
-            for kw in keywords:
-                rows.append([
-                    product, '关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '',
-                    cpc, kw, match_type, '', '', '', ''
-                ])
-        
-        # 否定关键词行（仅精准/广泛匹配）
-        if is_exact:
-            # 原有规则：全局否定精准和否定词组
-            for kw in neg_exact:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定精准匹配', '', '', '', ''
-                ])
-            for kw in neg_phrase:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定词组', '', '', '', ''
-                ])
-            
-            # 新增：交叉否定规则（宿主精准组否定case精准词，case精准组否定宿主精准词）
-            cross_neg_keywords = find_cross_neg_keywords(campaign_name, df_survey, keyword_categories, keyword_columns)
-            for kw in cross_neg_keywords:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定精准匹配', '', '', '', ''
-                ])
-        elif is_broad:
-            # 全局否定精准
-            for kw in neg_exact:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定精准匹配', '', '', '', ''
-                ])
-            # 全局否定词组
-            for kw in neg_phrase:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定词组', '', '', '', ''
-                ])
-            # 同类的精准关键词作为否定精准
-            for kw in neg_keywords:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定精准匹配', '', '', '', ''
-                ])
-            
-            # 交叉否定规则：宿主广泛组否定case精准词，case广泛组否定宿主精准词
-            cross_neg_keywords = find_cross_neg_keywords(campaign_name, df_survey, keyword_categories, keyword_columns)
-            
-            # 如果是宿主广泛组，添加宿主额外否定词
-            if any(x in campaign_name_normalized for x in ['suzhu', '宿主']):
-                for kw in suzhu_extra_neg_exact:
-                    rows.append([
-                        product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                        campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                        kw, '否定精准匹配', '', '', '', ''
-                    ])
-                for kw in suzhu_extra_neg_phrase:
-                    rows.append([
-                        product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                        campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                        kw, '否定词组', '', '', '', ''
-                    ])
-            
-            # 添加交叉否定关键词
-            for kw in cross_neg_keywords:
-                rows.append([
-                    product, '否定关键词', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '', '',
-                    kw, '否定精准匹配', '', '', '', ''
-                ])
-        
-        # 商品定向和否定商品定向（仅 ASIN 组）
-        if is_asin:
-            for asin in asin_targets:
-                rows.append([
-                    product, '商品定向', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '',
-                    cpc, '', '', '', '', '', f'asin="{asin}"'
-                ])
-            for asin in neg_asin:
-                rows.append([
-                    product, '否定商品定向', operation, campaign_name, campaign_name, '', '', '', '',
-                    campaign_name, campaign_name, '', '', '', status, '', '', '',
-                    '', '', '', '', '', '', f'asin="{asin}"'
-                ])
     
-    # 创建 DataFrame
-    df_header = pd.DataFrame(rows, columns=columns)
-    try:
-        df_header.to_excel(output_file, index=False, engine='openpyxl')
-        st.success(f"生成完成！输出文件：{output_file}，总行数：{len(rows)}")
-    except PermissionError:
-        st.error(f"错误：无法写入 {output_file}，请确保文件未被占用或有写入权限。")
+    render_perf(next(iter(results.values())).perf, time.perf_counter() - render_start)
+    return results
+
+# 函数：从调研 Excel 生成表头 Excel
+def generate_header_from_survey(survey_file='survey-JP.xlsx', output_file='header-JP.xlsx', sheet_name=0,
+                                check_cross_columns=False, streaming=False, max_rows=BULK_UPLOAD_ROW_LIMIT,
+                                survey_digest=None, country=DEFAULT_MARKETPLACE, in_memory=False, previous_header=None,
+                                trace_memory=False, output_format='xlsx', compression=None, prune_negatives=False,
+                                restart=False):
+    # country 同时决定站点默认值（预算、竞价、CPC、金额精度）
+    if survey_digest is None:
+        survey_digest = compute_digest(read_survey_bytes(survey_file))
+    options = (('sheet_name', sheet_name), ('check_cross_columns', check_cross_columns),
+               ('streaming', streaming), ('max_rows', max_rows), ('in_memory', in_memory),
+               ('profile', True), ('trace_memory', trace_memory), ('marketplace', country),
+               ('output_format', output_format), ('compression', compression),
+               ('prune_negatives', prune_negatives))
+    previous_digests = tuple(upload_digest(item) for item in previous_header) if previous_header else ()
+    job = run_in_background(('header', survey_digest, country, options, output_file, previous_digests),
+                            "正在生成表头", run_generation, survey_file, output_file, options,
+                            previous_header or None, restart=restart)
+    if job is None:
         return None
+    result, files, log, error = job.result
     
-    # 调试输出
-    keyword_rows = [row for row in rows if row[1] == '关键词']
-    st.write(f"关键词行数量: {len(keyword_rows)}")
-    if keyword_rows:
-        st.write(f"示例关键词行: 实体层级={keyword_rows[0][1]}, 关键词文本={keyword_rows[0][19]}, 匹配类型={keyword_rows[0][20]}")
-    
-    product_targeting_rows = [row for row in rows if row[1] == '商品定向']
-    st.write(f"商品定向行数量: {len(product_targeting_rows)}")
-    if product_targeting_rows:
-        st.write(f"示例商品定向行: 实体层级={product_targeting_rows[0][1]}, 竞价={product_targeting_rows[0][18]}, 拓展商品投放编号={product_targeting_rows[0][24]}")
+    render_start = time.perf_counter()
+    render_log(log)
+    if error:
+        st.error(error)
+        return None
     
-    levels = set(row[1] for row in rows)
-    st.write(f"所有实体层级: {levels}")
+    file_names = [os.path.basename(path) for path in result.output_files]
+    st.success(f"生成完成！输出文件：{', '.join(file_names)}，总行数：{result.row_count}")
+    if result.diff_stats:
+        diff_stats = result.diff_stats
+        st.info(f"增量模式：完整表头 {diff_stats['完整行数']} 行，本次只输出 {result.row_count} 行"
+                f"（新增 {diff_stats['Create']}，更新 {diff_stats['Update']}，归档 {diff_stats['Archive']}，"
+                f"未变化 {diff_stats['未变化']}）")
+    render_prune_stats(result.prune_stats)
+    render_issues(result.issues)
     
     st.write("生成的表格预览：")
-    st.dataframe(df_header.head(20))  # 显示前20行作为预览
+    st.dataframe(result.preview)  # 显示前20行作为预览
     
-    # 添加下载按钮
-    with open(output_file, 'rb') as f:
+    # 添加下载按钮（分卷时每个文件一个按钮）
+    for path, data in files.items():
         st.download_button(
-            label=f'下载生成的表头文件 ({output_file})',
-            data=f.read(),
-            file_name=output_file,
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            label=f'下载生成的表头文件 ({os.path.basename(path)})',
+            data=data,
+            file_name=os.path.basename(path),
+            mime=output_mime(path),
+            key=f'download-{path}'
         )
     
-    return df_header
+    render_perf(result.perf, time.perf_counter() - render_start)
+    return result
+
+# 函数：上传文件的内容哈希，同一上传只计算一次
+def upload_digest(uploaded_file):
+    digests = st.session_state.setdefault('upload_digests', {})
+    file_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    if file_id not in digests:
+        digests[file_id] = compute_digest(uploaded_file.getvalue())
+    return digests[file_id]
+
+# 函数：上传文件的工作表名称，同一上传只读取一次
+def upload_sheets(uploaded_file, digest):
+    sheets = st.session_state.setdefault('upload_sheets', {})
+    if digest not in sheets:
+        try:
+            sheets[digest] = list_sheets(uploaded_file.getvalue())
+        except Exception:
+            sheets[digest] = []
+    return sheets[digest]
 
 # Streamlit 主界面
 def main():
     st.title("SP-批量模版生成工具")
     
-    # 国家选择
-    country = st.selectbox("选择国家/地区", options=['JP', 'A EU'], index=0)
+    # 国家/地区选择：可多选，同一份调研一次生成多个站点
+    countries = st.multiselect("选择国家/地区（可多选）", options=list(MARKETPLACES), default=[DEFAULT_MARKETPLACE],
+                               format_func=lambda code: f"{code}（{MARKETPLACES[code].name}）")
+    country = countries[0] if countries else DEFAULT_MARKETPLACE
     
     # 基于国家显示对应的规则说明
     if country == 'JP':
@@ -531,18 +490,122 @@ def main():
     # 文件上传（不指定文件名）
     uploaded_file = st.file_uploader("上传调查 Excel 文件", type=['xlsx'])
     
-    if uploaded_file is not None:
-        # 保存上传的文件，使用原始文件名
-        saved_file_name = uploaded_file.name
-        with open(saved_file_name, 'wb') as f:
-            f.write(uploaded_file.getbuffer())
-        st.success(f"文件上传成功！已保存为：{saved_file_name}")
-        
-        output_file = f'header-{country}.xlsx'
-        
-        # 生成表头
-        if st.button("生成表头"):
-            generate_header_from_survey(survey_file=saved_file_name, output_file=output_file)
+    if uploaded_file is not None and not countries:
+        st.warning("请至少选择一个国家/地区。")
+    elif uploaded_file is not None:
+        digest = upload_digest(uploaded_file)
+        
+        # 多站点时输出文件名为模板，{country} 替换为各站点代码
+        multiple = len(countries) > 1
+        output_name = 'header-{country}.xlsx' if multiple else f'header-{country}.xlsx'
+        
+        # 内存模式：上传和输出都不落盘，多人同时使用互不覆盖
+        in_memory = st.checkbox("内存输出（不写磁盘，多人同时使用互不影响）", value=True)
+        if in_memory:
+            survey_source = uploaded_file
+            output_file = output_name
+            st.success(f"文件上传成功：{uploaded_file.name}")
+        else:
+            # 保存到本会话的临时目录，使用原始文件名；同一内容只写入一次，换文件时删除旧文件
+            workdir = session_workdir()
+            saved_file_name = os.path.join(workdir, uploaded_file.name)
+            saved_upload = st.session_state.get('saved_upload')
+            if saved_upload != (digest, saved_file_name) or not os.path.exists(saved_file_name):
+                if saved_upload and saved_upload[1] != saved_file_name and os.path.exists(saved_upload[1]):
+                    os.remove(saved_upload[1])
+                with open(saved_file_name, 'wb') as f:
+                    f.write(uploaded_file.getbuffer())
+                st.session_state['saved_upload'] = (digest, saved_file_name)
+            survey_source = saved_file_name
+            output_file = os.path.join(workdir, output_name)
+            st.success(f"文件上传成功！已保存为：{uploaded_file.name}")
+        
+        # 多工作表工作簿：可选择多个工作表，合并为一个表头或每个工作表各一个表头（并行处理）
+        sheet_options = upload_sheets(uploaded_file, digest)
+        sheets = sheet_options[:1]
+        per_sheet = False
+        if len(sheet_options) > 1:
+            sheets = st.multiselect("选择工作表（可多选）", options=sheet_options, default=sheet_options[:1]) \
+                or sheet_options[:1]
+            if len(sheets) > 1 and multiple:
+                st.caption(f"多站点生成时只处理一个工作表：{sheets[0]}")
+                sheets = sheets[:1]
+            elif len(sheets) > 1:
+                per_sheet = st.radio("多个工作表的输出方式", ["合并为一个表头", "每个工作表一个表头"],
+                                     horizontal=True) == "每个工作表一个表头"
+        sheet_name = sheets[0] if sheets else 0
+        multi_sheet = len(sheets) > 1
+        
+        # 跨列重复只提示，不中止生成
+        check_cross_columns = st.checkbox("同时检查跨列重复关键词", value=False)
+        
+        # 否定词精简：同一活动内去掉重复的否定词和已被否定词组覆盖的否定精准词
+        prune_negatives = st.checkbox("精简冗余否定关键词（去重、去掉被否定词组覆盖的否定精准词）", value=False)
+        
+        # 输出格式：csv/tsv 写出比 xlsx 快得多、文件更小，可再压缩，超过行数上限自动分卷
+        output_format = st.selectbox("输出格式", options=list(OUTPUT_FORMATS), format_func=OUTPUT_FORMAT_LABELS.get)
+        compression = None
+        if output_format != 'xlsx':
+            compression = st.radio("压缩", options=[None, *COMPRESSIONS], horizontal=True,
+                                   format_func=lambda option: option or '不压缩')
+        
+        # 大文件：流式写出，超过行数上限自动拆分为 -part2、-part3 ...
+        streaming = st.checkbox("流式写出（适合大文件，超过行数上限自动分卷）", value=False)
+        max_rows = BULK_UPLOAD_ROW_LIMIT
+        if streaming or output_format != 'xlsx':
+            max_rows = int(st.number_input("单个文件行数上限", min_value=1000, max_value=BULK_UPLOAD_ROW_LIMIT,
+                                           value=BULK_UPLOAD_ROW_LIMIT, step=10000))
+        
+        # 性能面板默认只记录耗时；内存峰值需要 tracemalloc，会明显拖慢生成
+        trace_memory = st.checkbox("性能面板记录各阶段内存峰值（会明显变慢）", value=False)
+        
+        # 增量模式：上传上次生成的完整表头（可多个分卷），只输出新增、变化和需要归档的行（仅单站点）
+        previous_header = []
+        if multiple:
+            st.caption("多站点生成时不支持增量模式，将输出各站点的完整表头。")
+        elif multi_sheet:
+            st.caption("多工作表生成时不支持增量模式，将输出完整表头。")
+        else:
+            previous_header = st.file_uploader("上次生成的表头文件（可选，上传后只输出增量）",
+                                               type=['xlsx', 'csv', 'tsv', 'gz', 'zip'], accept_multiple_files=True)
+        if previous_header:
+            stem, ext = os.path.splitext(output_file)
+            output_file = f"{stem}-diff{ext}"
+        previous_digests = tuple(upload_digest(item) for item in previous_header)
+        
+        # 生成表头：点击后记住本次请求，之后的页面重跑（下载、切换控件）直接展示缓存结果；
+        # 只记住最近 JOB_RESULT_ENTRIES 个请求（更早请求的结果也已从任务管理中删除）
+        request_key = (digest, tuple(countries), tuple(sheets), per_sheet, check_cross_columns, streaming, max_rows,
+                       in_memory, previous_digests, trace_memory, output_format, compression, prune_negatives)
+        requested = st.session_state.setdefault('requested_generations', {})
+        restart = st.button("生成表头")
+        if restart:
+            requested.pop(request_key, None)
+            requested[request_key] = True
+            while len(requested) > JOB_RESULT_ENTRIES:
+                del requested[next(iter(requested))]
+        if request_key in requested and multiple:
+            generate_headers_from_survey(survey_file=survey_source, countries=countries, output_file=output_file,
+                                         sheet_name=sheet_name, check_cross_columns=check_cross_columns,
+                                         streaming=streaming, max_rows=max_rows,
+                                         survey_digest=digest, in_memory=in_memory, trace_memory=trace_memory,
+                                         output_format=output_format, compression=compression,
+                                         prune_negatives=prune_negatives, restart=restart)
+        elif request_key in requested and multi_sheet:
+            generate_sheets_from_survey(survey_file=survey_source, sheets=sheets, per_sheet=per_sheet,
+                                        output_file=output_file, check_cross_columns=check_cross_columns,
+                                        streaming=streaming, max_rows=max_rows,
+                                        survey_digest=digest, country=country, in_memory=in_memory,
+                                        output_format=output_format, compression=compression,
+                                        prune_negatives=prune_negatives, restart=restart)
+        elif request_key in requested:
+            generate_header_from_survey(survey_file=survey_source, output_file=output_file, sheet_name=sheet_name,
+                                        check_cross_columns=check_cross_columns,
+                                        streaming=streaming, max_rows=max_rows,
+                                        survey_digest=digest, country=country, in_memory=in_memory,
+                                        previous_header=previous_header, trace_memory=trace_memory,
+                                        output_format=output_format, compression=compression,
+                                        prune_negatives=prune_negatives, restart=restart)
     else:
         st.info("请上传 .xlsx 文件以开始生成。")
 
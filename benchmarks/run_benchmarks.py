@@ -0,0 +1,351 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+from benchmarks.synthetic_survey import write_survey
+from engine import (
+    blocks_to_frame, find_duplicate_keywords, iter_campaign_blocks, iter_campaign_rows, load_survey,
+    prepare_survey, survey_plan, write_header_frame, write_header_streaming,
+)
+from ingest import available_reader
+from negatives import NegativePruner
+from validate import validate_header
+from writers import BULK_UPLOAD_ROW_LIMIT, COMPRESSIONS, OUTPUT_FORMATS, check_output_format, output_path
+
+# 基准测试：用合成调研文件测量生成各阶段的耗时和内存峰值，结果保存为 JSON 以便比较
+#
+# 阶段：
+#   read        解析调研 Excel（load_survey）
+#   plan        由表头推断生成计划（survey_plan；同一进程中表头相同的规模命中缓存）
+#   duplicates  关键词重复检查（find_duplicate_keywords）
+#   categorise  活动配置映射、否定词聚合和关键词索引（prepare_survey）
+#   build       逐个活动展开并拼接为表头（xlsx 模式为 DataFrame，streaming 模式为行块列表）
+#   validate    上传前校验（validate_header，仅 xlsx 模式）
+#   write       写出表头（xlsx 为 to_excel 或流式写出；--format csv/tsv 时写出分隔文本，可加 --compression）
+#
+# 用法示例：
+#   python -m benchmarks.run_benchmarks --scale small medium
+#   python -m benchmarks.run_benchmarks --campaigns 2000 --keywords 50000 -o bench.json
+#   python -m benchmarks.run_benchmarks --scale medium --compare benchmarks/results/上次结果.json
+#   python -m benchmarks.run_benchmarks --scale medium --format csv --compression gzip
+#   python -m benchmarks.run_benchmarks --scale medium --prune-negatives
+
+# 预设规模：(活动数, 关键词数)；表头行数约为 活动数 × 关键词数 / 10 × 2.4
+SCALES = {
+    'small': (50, 1_000),
+    'medium': (200, 2_000),
+    'campaigns-50k': (50_000, 1_000),
+    'keywords-1m': (50, 1_000_000),
+    'xlarge': (50_000, 1_000_000),
+}
+
+# 阶段顺序与显示名称
+STAGES = ['read', 'plan', 'duplicates', 'categorise', 'build', 'validate', 'write']
+STAGE_LABELS = {
+    'read': '读取',
+    'plan': '生成计划',
+    'duplicates': '重复检查',
+    'categorise': '分类',
+    'build': '行构建',
+    'validate': '上传前校验',
+    'write': '写出',
+}
+
+# 表头行数超过此值时跳过 build/write（避免超大表头耗尽内存）
+DEFAULT_MAX_HEADER_ROWS = 2_000_000
+
+# 内存采样间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.005
+
+# 默认结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+# 函数：当前进程常驻内存（字节），不支持的平台返回 None
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# 函数：默认内存测量方式：Linux 上采样常驻内存（含 C 扩展分配，几乎不影响耗时），否则用 tracemalloc
+def default_memory_mode():
+    return 'rss' if current_rss() is not None else 'tracemalloc'
+
+
+class RssSampler:
+    # 后台线程定时采样常驻内存，记录阶段内的峰值
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return False
+
+
+# 函数：执行一个阶段，记录墙钟时间、CPU 时间和内存峰值
+# memory='rss'：阶段内常驻内存峰值相对阶段开始时的增量；'tracemalloc'：Python 分配峰值（耗时明显变长）；'none'：不测内存
+def measure(func, memory='rss'):
+    gc.collect()
+    if memory == 'tracemalloc':
+        tracemalloc.start()
+    sampler = RssSampler() if memory == 'rss' else None
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        if sampler is not None:
+            with sampler:
+                value = func()
+        else:
+            value = func()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = tracemalloc.get_traced_memory()[1] if memory == 'tracemalloc' else None
+    finally:
+        if memory == 'tracemalloc':
+            tracemalloc.stop()
+    stats = {'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4)}
+    if sampler is not None:
+        peak = sampler.peak - sampler.baseline
+        stats['peak_rss_mb'] = round(sampler.peak / 2 ** 20, 2)
+    if peak is not None:
+        stats['peak_mb'] = round(peak / 2 ** 20, 2)
+    return value, stats
+
+
+# 函数：进程最大常驻内存（MB），不支持的平台返回 None
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+# 函数：合成调研文件路径，已存在时直接复用
+def survey_path_for(survey_dir, campaigns, keywords, seed):
+    path = os.path.join(survey_dir, f'survey-bench-{campaigns}x{keywords}-s{seed}.xlsx')
+    if not os.path.exists(path):
+        write_survey(path, campaigns, keywords, seed)
+    return path
+
+
+# 函数：单个规模的基准测试
+def run_scale(name, campaigns, keywords, survey_dir, seed=1, reader='auto', writer='xlsx', memory='rss',
+              max_header_rows=DEFAULT_MAX_HEADER_ROWS, output_format='xlsx', compression=None,
+              prune_negatives=False, log=print):
+    log(f"[{name}] {campaigns} 个活动，{keywords} 个关键词")
+    generate_start = time.perf_counter()
+    survey_file = survey_path_for(survey_dir, campaigns, keywords, seed)
+    run = {
+        'scale': name,
+        'campaigns': campaigns,
+        'keywords': keywords,
+        'seed': seed,
+        'survey_bytes': os.path.getsize(survey_file),
+        'survey_generation_s': round(time.perf_counter() - generate_start, 2),
+        'stages': {},
+        'skipped': [],
+    }
+    stages = run['stages']
+
+    df_survey, stages['read'] = measure(lambda: load_survey(survey_file, reader=reader), memory)
+    run['survey_rows'] = len(df_survey)
+    plan, stages['plan'] = measure(lambda: survey_plan(df_survey), memory)
+    report, stages['duplicates'] = measure(lambda: find_duplicate_keywords(df_survey, plan.keyword_columns), memory)
+    run['duplicates'] = len(report)
+    prepared, stages['categorise'] = measure(
+        lambda: prepare_survey(df_survey, check_duplicates=False, plan=plan), memory
+    )
+
+    # 行块只引用索引中的关键词列表，计数代价很小，先估算表头行数
+    counting_pruner = NegativePruner() if prune_negatives else None
+    header_rows = sum(len(block) for blocks in iter_campaign_blocks(prepared, pruner=counting_pruner)
+                      for block in blocks)
+    run['header_rows'] = header_rows
+    if counting_pruner is not None:
+        run['prune_stats'] = counting_pruner.stats()
+        log(f"  否定词精简：少输出 {run['prune_stats']['合计']} 行")
+    output_file = os.path.join(survey_dir, f'header-bench-{campaigns}x{keywords}.xlsx')
+    if output_format != 'xlsx':
+        output_file = output_path(output_file, output_format, compression)
+    if header_rows > max_header_rows:
+        run['skipped'] = ['build', 'validate', 'write']
+        log(f"  表头 {header_rows} 行超过 --max-header-rows {max_header_rows}，跳过行构建、校验和写出")
+    elif writer == 'streaming':
+        campaign_blocks, stages['build'] = measure(
+            lambda: list(iter_campaign_blocks(prepared, pruner=NegativePruner() if prune_negatives else None)), memory
+        )
+        _, stages['write'] = measure(
+            lambda: write_header_streaming(iter_campaign_rows(campaign_blocks), output_file,
+                                           max_rows=BULK_UPLOAD_ROW_LIMIT, output_format=output_format,
+                                           compression=compression),
+            memory,
+        )
+    else:
+        df_header, stages['build'] = measure(
+            lambda: blocks_to_frame(
+                block for blocks in iter_campaign_blocks(prepared, pruner=NegativePruner() if prune_negatives else None)
+                for block in blocks
+            ),
+            memory,
+        )
+        _, stages['validate'] = measure(lambda: validate_header(df_header), memory)
+        if output_format != 'xlsx':
+            # 分隔文本按上限分卷写出，不受单表行数限制
+            _, stages['write'] = measure(
+                lambda: write_header_frame(df_header, output_file, output_format=output_format,
+                                           compression=compression), memory
+            )
+        elif header_rows > BULK_UPLOAD_ROW_LIMIT:
+            run['skipped'] = ['write']
+            log(f"  表头 {header_rows} 行超过单表上限 {BULK_UPLOAD_ROW_LIMIT}，跳过 xlsx 写出（可用 --writer streaming）")
+        else:
+            _, stages['write'] = measure(
+                lambda: df_header.to_excel(output_file, index=False, engine='openpyxl'), memory
+            )
+
+    run['total_wall_s'] = round(sum(stage['wall_s'] for stage in stages.values()), 4)
+    run['max_rss_mb'] = max_rss_mb()
+    for stage in STAGES:
+        if stage in stages:
+            peak = f"，内存峰值 +{stages[stage]['peak_mb']} MB" if 'peak_mb' in stages[stage] else ''
+            log(f"  {STAGE_LABELS[stage]}: {stages[stage]['wall_s']:.3f}s{peak}")
+    log(f"  表头行数：{header_rows}，合计：{run['total_wall_s']:.3f}s")
+    return run
+
+
+# 函数：与上次结果按规模和阶段比较墙钟时间
+def compare_runs(current, previous, log=print):
+    previous_runs = {(run['campaigns'], run['keywords']): run for run in previous.get('runs', [])}
+    for key in ['reader', 'writer', 'output_format', 'compression', 'prune_negatives', 'memory']:
+        if previous.get(key) != current.get(key):
+            log(f"注意：两次结果的 {key} 不同（{previous.get(key)} / {current.get(key)}），耗时不可直接比较")
+    for run in current['runs']:
+        old = previous_runs.get((run['campaigns'], run['keywords']))
+        if old is None:
+            log(f"[{run['scale']}] 上次结果中没有相同规模，跳过比较")
+            continue
+        log(f"[{run['scale']}] 与上次比较（墙钟时间）")
+        for stage in STAGES:
+            if stage not in run['stages'] or stage not in old['stages']:
+                continue
+            new_wall = run['stages'][stage]['wall_s']
+            old_wall = old['stages'][stage]['wall_s']
+            ratio = new_wall / old_wall if old_wall else float('inf')
+            log(f"  {STAGE_LABELS[stage]}: {old_wall:.3f}s -> {new_wall:.3f}s（×{ratio:.2f}）")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='表头生成基准测试（合成调研文件）')
+    parser.add_argument('--scale', nargs='+', choices=list(SCALES), default=None,
+                        help='预设规模：' + '，'.join(f'{name}={c} 活动/{k} 关键词' for name, (c, k) in SCALES.items()))
+    parser.add_argument('--campaigns', type=int, default=None, help='自定义活动数量（与 --keywords 一起使用）')
+    parser.add_argument('--keywords', type=int, default=None, help='自定义关键词总数')
+    parser.add_argument('--seed', type=int, default=1, help='合成数据随机种子（默认 1）')
+    parser.add_argument('--reader', choices=['auto', 'openpyxl', 'calamine'], default='auto', help='Excel 解析引擎')
+    parser.add_argument('--writer', choices=['xlsx', 'streaming'], default='xlsx',
+                        help='写出方式：xlsx（DataFrame.to_excel，默认）或 streaming（流式写出）')
+    parser.add_argument('--format', dest='output_format', choices=list(OUTPUT_FORMATS), default='xlsx',
+                        help='输出格式：xlsx（默认）、csv 或 tsv')
+    parser.add_argument('--compression', choices=list(COMPRESSIONS), default=None,
+                        help='csv/tsv 输出压缩：gzip 或 zip')
+    parser.add_argument('--prune-negatives', action='store_true', help='行构建时精简冗余否定关键词')
+    parser.add_argument('--memory', choices=['rss', 'tracemalloc', 'none'], default=None,
+                        help='内存测量方式：rss（采样常驻内存，Linux 默认）、tracemalloc（Python 分配，耗时变长）或 none')
+    parser.add_argument('--max-header-rows', type=int, default=DEFAULT_MAX_HEADER_ROWS,
+                        help=f'表头行数超过此值时跳过行构建和写出（默认 {DEFAULT_MAX_HEADER_ROWS}）')
+    parser.add_argument('--survey-dir', default=None, help='合成调研文件目录，已存在的文件直接复用（默认临时目录）')
+    parser.add_argument('-o', '--output', default=None, help='结果 JSON 路径（默认 benchmarks/results/时间戳.json）')
+    parser.add_argument('--compare', default=None, help='与之前的结果 JSON 比较')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.campaigns is None) != (args.keywords is None):
+        parser.error('--campaigns 与 --keywords 需要同时给出')
+    try:
+        check_output_format(args.output_format, args.compression)
+    except ValueError as e:
+        parser.error(str(e))
+
+    scales = [(name, *SCALES[name]) for name in (args.scale or [])]
+    if args.campaigns is not None:
+        scales.append(('custom', args.campaigns, args.keywords))
+    if not scales:
+        scales = [('small', *SCALES['small']), ('medium', *SCALES['medium'])]
+
+    memory = args.memory or default_memory_mode()
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'platform': platform.platform(),
+        'reader': available_reader() if args.reader == 'auto' else args.reader,
+        'writer': args.writer,
+        'output_format': args.output_format,
+        'compression': args.compression,
+        'prune_negatives': args.prune_negatives,
+        'memory': memory,
+        'runs': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        survey_dir = args.survey_dir or tmp_dir
+        os.makedirs(survey_dir, exist_ok=True)
+        for name, campaigns, keywords in scales:
+            results['runs'].append(run_scale(
+                name, campaigns, keywords, survey_dir, seed=args.seed, reader=args.reader, writer=args.writer,
+                memory=memory, max_header_rows=args.max_header_rows, output_format=args.output_format,
+                compression=args.compression, prune_negatives=args.prune_negatives,
+            ))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存：{output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_runs(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import argparse
+import random
+import sys
+
+from openpyxl import Workbook
+
+# 合成调研文件：按真实调研表布局生成指定规模的工作簿，用于基准测试
+#
+# 布局：
+#   索引 0-8   广告活动名称、CPC、SKU、广告组默认竞价、预算、广告位、百分比 + 两个无关列
+#   索引 9-18  关键词列（5 个类别 × 精准词/广泛词）
+#   其后       ASIN 列（列名即对应的 ASIN 活动名称）和否定列
+#
+# 用法示例：
+#   python -m benchmarks.synthetic_survey survey-bench.xlsx --campaigns 5000 --keywords 100000
+
+# 配置列
+CONFIG_COLUMNS = ['广告活动名称', 'CPC', 'SKU', '广告组默认竞价', '预算', '广告位', '百分比', '备注', '负责人']
+
+# 关键词列对应的类别：(列名前缀, 活动名称中使用的类别词)
+KEYWORD_GROUPS = [
+    ('suzhu/宿主', ['suzhu', '宿主']),
+    ('case/包', ['case', '包']),
+    ('tape', ['tape']),
+    ('stand', ['stand']),
+    ('cable', ['cable']),
+]
+
+# 活动名称中的匹配类型词
+MATCH_TOKENS = ['精准', '广泛', 'exact', 'broad']
+
+# ASIN 列（列名即 ASIN 活动名称）
+ASIN_COLUMNS = ['suzhu-ASIN', 'case-ASIN', 'stand-ASIN']
+
+# 否定列
+NEGATIVE_COLUMNS = ['否定精准', '否定词组', '宿主额外否精准', '宿主额外否词组', '否定ASIN']
+
+# ASIN 活动占全部活动的比例
+ASIN_CAMPAIGN_RATIO = 0.05
+
+# 广告位选项
+AD_POSITIONS = ['搜索结果顶部（首页）', '商品页面', '']
+
+# 组成关键词的词表
+WORDS = [
+    'phone', 'holder', 'car', 'mount', 'magnetic', 'wireless', 'charger', 'stand', 'desk', 'tablet',
+    'case', 'cover', 'clear', 'slim', 'shockproof', 'leather', 'wallet', 'kids', 'tape', 'double',
+    'sided', 'strong', 'adhesive', 'cable', 'usb', 'type', 'fast', 'long', 'short', 'braided',
+]
+
+
+# 函数：关键词列名（5 个类别 × 精准词/广泛词，共 10 列）
+def keyword_columns():
+    return [f'{prefix}-{suffix}' for prefix, _ in KEYWORD_GROUPS for suffix in ['精准词', '广泛词']]
+
+
+# 函数：完整表头
+def survey_columns():
+    return CONFIG_COLUMNS + keyword_columns() + ASIN_COLUMNS + NEGATIVE_COLUMNS
+
+
+# 函数：随机 ASIN（B0 + 8 位大写字母数字）
+def random_asin(rng):
+    return 'B0' + ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=8))
+
+
+# 函数：第 n 个关键词，列内唯一
+def keyword_text(rng, n):
+    return f"{' '.join(rng.sample(WORDS, 2))} {n}"
+
+
+# 函数：活动名称列表，ASIN 活动使用 ASIN 列名，其余为 类别词-匹配类型-序号
+def campaign_names(rng, campaigns):
+    asin_campaigns = min(len(ASIN_COLUMNS), max(1, int(campaigns * ASIN_CAMPAIGN_RATIO))) if campaigns else 0
+    names = ASIN_COLUMNS[:asin_campaigns]
+    for i in range(campaigns - asin_campaigns):
+        token = rng.choice(rng.choice(KEYWORD_GROUPS)[1])
+        names.append(f'{token}-{rng.choice(MATCH_TOKENS)}-{i + 1:05d}')
+    rng.shuffle(names)
+    return names
+
+
+# 函数：按列生成调研数据（列名 → 值列表）
+def build_survey_columns(campaigns, keywords, seed=1):
+    rng = random.Random(seed)
+    data = {}
+
+    names = campaign_names(rng, campaigns)
+    data['广告活动名称'] = names
+    data['CPC'] = [round(rng.uniform(0.2, 2.0), 2) for _ in names]
+    data['SKU'] = [f'SKU-{rng.randint(1, 200):03d}' for _ in names]
+    data['广告组默认竞价'] = [round(rng.uniform(0.3, 1.5), 2) for _ in names]
+    data['预算'] = [rng.choice([10, 12, 20, 30, 50]) for _ in names]
+    positions = [rng.choice(AD_POSITIONS) for _ in names]
+    data['广告位'] = positions
+    data['百分比'] = [rng.choice([10, 20, 50]) if position else '' for position in positions]
+
+    # 关键词平均分配到 10 个关键词列，每列内唯一
+    columns = keyword_columns()
+    per_column, extra = divmod(keywords, len(columns))
+    serial = 0
+    for i, col in enumerate(columns):
+        values = []
+        for _ in range(per_column + (1 if i < extra else 0)):
+            serial += 1
+            values.append(keyword_text(rng, serial))
+        data[col] = values
+
+    # ASIN 列和否定列的规模随关键词数增长，设上限
+    asins_per_column = max(5, min(1000, keywords // 100))
+    for col in ASIN_COLUMNS:
+        data[col] = [random_asin(rng) for _ in range(asins_per_column)]
+    negatives = max(5, min(200, keywords // 200))
+    for col in NEGATIVE_COLUMNS[:-1]:
+        data[col] = [f'neg {keyword_text(rng, n)}' for n in range(negatives)]
+    data['否定ASIN'] = [random_asin(rng) for _ in range(negatives)]
+    return data
+
+
+# 函数：生成合成调研 Excel，返回数据行数
+def write_survey(path, campaigns, keywords, seed=1):
+    data = build_survey_columns(campaigns, keywords, seed)
+    columns = survey_columns()
+    n_rows = max((len(values) for values in data.values()), default=0)
+
+    # write_only 逐行写入，百万关键词时内存占用也较小
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(columns)
+    for i in range(n_rows):
+        row = []
+        for col in columns:
+            values = data.get(col, ())
+            row.append(values[i] if i < len(values) and values[i] != '' else None)
+        sheet.append(row)
+    workbook.save(path)
+    return n_rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='生成合成调研文件（真实调研表布局）')
+    parser.add_argument('output', help='输出 xlsx 路径')
+    parser.add_argument('--campaigns', type=int, default=500, help='活动数量（默认 500）')
+    parser.add_argument('--keywords', type=int, default=10_000, help='关键词总数，平均分配到 10 个关键词列（默认 10000）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（默认 1）')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    n_rows = write_survey(args.output, args.campaigns, args.keywords, args.seed)
+    print(f"已生成 {args.output}：{args.campaigns} 个活动，{args.keywords} 个关键词，{n_rows} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
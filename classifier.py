@@ -0,0 +1,100 @@
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+# 活动名称 / 列名分类：所有关键词类别和匹配类型词编译为一个正则，一次扫描得到类别、匹配类型和交叉否定分组
+
+# 匹配类型关键词
+MATCH_TYPE_TOKENS = {
+    '精准': ['精准', 'exact'],
+    '广泛': ['广泛', 'broad'],
+}
+
+# 商品定向活动关键词
+ASIN_TOKEN = 'asin'
+
+# 交叉否定分组：宿主组否定case组精准词，case组否定宿主组精准词
+SUZHU_WORDS = ['suzhu', '宿主']
+CASE_WORDS = ['case', '包', 'tape']
+
+# 交叉否定分组（按优先顺序）：名称同时含两组的词时归入前一组
+CROSS_NEGATIVE_GROUPS = {'suzhu': SUZHU_WORDS, 'case': CASE_WORDS}
+
+# 分类结果表的列
+CLASSIFICATION_COLUMNS = ['广告活动名称', '类别', '匹配类型', '分组', '精准', '广泛', 'ASIN']
+
+# 单个名称的分类结果：命中的类别（按类别列表顺序）、匹配类型、交叉否定分组、三个匹配标记和命中的全部词
+CampaignClass = namedtuple('CampaignClass', ['categories', 'match_type', 'group', 'is_exact', 'is_broad', 'is_asin', 'terms'])
+
+
+class CampaignClassifier:
+    # 分类器：类别、匹配类型词、ASIN 和分组词合并为一个前瞻交替正则 (?=(词1|词2|...))，
+    # 按长度从长到短排列，每个位置取最长的词；再用预先计算的“子串闭包”补上被长词包含的短词
+    # （如同一位置的 'suzhu' 与 'zhu'），结果与逐个词做子串判断完全一致
+    # 匹配类型词、ASIN 关键词和交叉否定分组默认为本模块的常量，生成计划（plan.py）按规则配置传入
+
+    def __init__(self, categories, match_types=MATCH_TYPE_TOKENS, asin_token=ASIN_TOKEN,
+                 groups=CROSS_NEGATIVE_GROUPS):
+        self.categories = [category for category in categories if category]
+        self.asin_token = asin_token
+        terms = set(self.categories) | {asin_token}
+        for tokens in [*match_types.values(), *groups.values()]:
+            terms.update(tokens)
+        terms = sorted(terms, key=lambda term: (-len(term), term))
+        self.pattern = re.compile('(?=(' + '|'.join(map(re.escape, terms)) + '))')
+        self.closure = {term: frozenset(other for other in terms if other in term) for term in terms}
+        self._exact = frozenset(match_types['精准'])
+        self._broad = frozenset(match_types['广泛'])
+        self._groups = [(group, frozenset(words)) for group, words in groups.items()]
+        self._by_found = {}
+        self._by_name = {}
+
+    # 函数：正则命中的词 → 分类结果（相同命中组合只计算一次）
+    def _from_found(self, found):
+        key = frozenset(found)
+        cached = self._by_found.get(key)
+        if cached is None:
+            terms = frozenset().union(*(self.closure[term] for term in key))
+            is_exact = not self._exact.isdisjoint(terms)
+            is_broad = not self._broad.isdisjoint(terms)
+            is_asin = self.asin_token in terms
+            match_type = '精准' if is_exact else '广泛' if is_broad else 'ASIN' if is_asin else None
+            group = next((group for group, words in self._groups if not words.isdisjoint(terms)), None)
+            cached = CampaignClass(
+                tuple(category for category in self.categories if category in terms),
+                match_type, group, is_exact, is_broad, is_asin, terms,
+            )
+            self._by_found[key] = cached
+        return cached
+
+    # 函数：对整列名称一次性分类，返回分类结果列表（与输入顺序一致）
+    def classify_all(self, names):
+        names = [str(name) for name in names]
+        found = pd.Series(names, dtype=object).str.lower().str.findall(self.pattern)
+        results = [self._from_found(item) for item in found]
+        self._by_name.update(zip(names, results))
+        return results
+
+    # 函数：对整列名称一次性分类，返回分类结果表（类别、匹配类型、分组及匹配标记）
+    def classify(self, names):
+        names = list(names)
+        results = self.classify_all(names)
+        return pd.DataFrame({
+            '广告活动名称': names,
+            '类别': [result.categories for result in results],
+            '匹配类型': [result.match_type for result in results],
+            '分组': [result.group for result in results],
+            '精准': [result.is_exact for result in results],
+            '广泛': [result.is_broad for result in results],
+            'ASIN': [result.is_asin for result in results],
+        }, columns=CLASSIFICATION_COLUMNS)
+
+    # 函数：单个名称的分类结果（已批量分类的名称直接取缓存）
+    def classify_one(self, name):
+        name = str(name)
+        cached = self._by_name.get(name)
+        if cached is None:
+            cached = self._from_found(self.pattern.findall(name.lower()))
+            self._by_name[name] = cached
+        return cached
@@ -0,0 +1,286 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import DuplicateKeywordError, GenerationError, generate_header
+from marketplaces import DEFAULT_MARKETPLACE, MARKETPLACES
+from negatives import merge_prune_stats
+from plan import KEYWORD_COLUMN_MODES, keyword_column_rules
+from sheets import generate_combined_header, generate_sheet_headers
+from writers import BULK_UPLOAD_ROW_LIMIT, COMPRESSIONS, OUTPUT_FORMATS, output_path, output_stem, part_path
+
+# 命令行入口：批量处理目录或通配符匹配到的调研 Excel，多进程并行生成表头
+#
+# 用法示例：
+#   python cli.py surveys/ -o output/ --country JP
+#   python cli.py "surveys/*-JP.xlsx" --workers 4
+#   python cli.py survey.xlsx --all-sheets --per-sheet
+
+
+# 函数：展开输入路径（文件、目录或通配符）为调研文件列表
+def collect_survey_files(inputs):
+    survey_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = sorted(glob.glob(os.path.join(item, '*.xlsx')))
+        else:
+            candidates = sorted(glob.glob(item)) or [item]
+        for path in candidates:
+            # 跳过 Excel 打开文件时产生的锁文件
+            if os.path.basename(path).startswith('~$'):
+                continue
+            if path not in survey_files:
+                survey_files.append(path)
+    return survey_files
+
+
+# 函数：输出文件名，沿用 header-{country}.xlsx 并附加调研文件名以免冲突
+def output_path_for(survey_file, output_dir, country):
+    stem = os.path.splitext(os.path.basename(survey_file))[0]
+    return os.path.join(output_dir, f'header-{country}-{stem}.xlsx')
+
+
+# 函数：上次生成的表头文件（含 -part2、-part3 ... 分卷），按本次的输出格式和压缩方式查找，未找到返回空列表
+def previous_files_for(survey_file, previous_dir, country, output_format='xlsx', compression=None):
+    first = output_path_for(survey_file, previous_dir, country)
+    if output_format != 'xlsx':
+        first = output_path(first, output_format, compression)
+    if not os.path.exists(first):
+        return []
+    files = [first]
+    while os.path.exists(part_path(first, len(files) + 1)):
+        files.append(part_path(first, len(files) + 1))
+    return files
+
+
+# 函数：增量模式的输出文件名
+def diff_output_path(output_file):
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}-diff{ext}"
+
+
+# 函数：校验问题表写到输出文件旁（header-JP-xxx-issues.csv），无问题时不写，返回写出的文件
+def write_issues_report(result):
+    if result.issues is None or result.issues.empty:
+        return []
+    path = f"{output_stem(result.output_files[0])}-issues.csv"
+    result.issues.to_csv(path, index=False, encoding='utf-8-sig')
+    return [path]
+
+
+# 函数：重复关键词报告的简短文本
+def format_duplicates(report, limit=5):
+    within = report[report['范围'] == '列内']
+    items = [f"{row['工作表'] + '!' if '工作表' in row else ''}{row['列']}列 '{row['关键词']}' ×{row['次数']} (行 {row['行号']})"
+             for _, row in within.head(limit).iterrows()]
+    if len(within) > limit:
+        items.append(f"等共 {len(within)} 处")
+    return '；'.join(items)
+
+
+# 函数：--sheet 参数解析为工作表名称或序号；逗号分隔多个工作表时返回列表
+def parse_sheet_names(value):
+    names = [int(item) if item.strip().isdigit() else item.strip() for item in str(value).split(',') if item.strip()]
+    return names if len(names) > 1 else (names[0] if names else 0)
+
+
+# 函数：多工作表模式下每个文件可用的工作表进程数：文件数少于 --workers 时把多出的进程分给工作表
+def sheet_workers_for(workers, file_count):
+    return max(1, (workers or os.cpu_count() or 1) // max(1, file_count))
+
+
+# 函数：多工作表模式下处理单个调研文件（workers > 1 时在工作进程内再并行处理各工作表）
+def generate_sheets(survey_file, output_file, sheet_names, per_sheet, workers=1, **options):
+    if per_sheet:
+        results = list(generate_sheet_headers(survey_file=survey_file, sheet_names=sheet_names,
+                                              output_file=output_file, workers=workers, **options).values())
+    else:
+        results = [generate_combined_header(survey_file=survey_file, sheet_names=sheet_names,
+                                            output_file=output_file, workers=workers, **options)]
+    return {'survey_file': survey_file,
+            'output_file': ', '.join(file for result in results for file in result.output_files),
+            'rows': sum(result.row_count for result in results), 'error': None,
+            'issues': sum(len(result.issues) for result in results if result.issues is not None),
+            'issues_files': [path for result in results for path in write_issues_report(result)],
+            'prune_stats': merge_prune_stats(result.prune_stats for result in results),
+            # 逐表输出时各工作表共用一份性能报告
+            'perf': results[0].perf if results else None}
+
+
+# 函数：在工作进程中处理单个调研文件，返回可序列化的摘要
+# sheet_name 为列表或 None（全部工作表）时按多工作表模式处理，per_sheet=True 时每个工作表各输出一个表头，
+# 各工作表最多使用 sheet_workers 个进程；rules 为生成计划的规则配置（见 plan.keyword_column_rules）
+def process_survey(survey_file, output_file, sheet_name=0, check_cross_columns=False, streaming=False,
+                   max_rows=BULK_UPLOAD_ROW_LIMIT, reader='auto', cache_dir=None, previous_files=None,
+                   profile=False, trace_memory=False, marketplace=None, per_sheet=False, validate=True,
+                   output_format='xlsx', compression=None, prune_negatives=False, sheet_workers=1, rules=None):
+    start = time.perf_counter()
+    try:
+        if sheet_name is None or isinstance(sheet_name, list):
+            summary = generate_sheets(survey_file, output_file, sheet_name, per_sheet, workers=sheet_workers,
+                                      check_cross_columns=check_cross_columns, streaming=streaming,
+                                      max_rows=max_rows, reader=reader, cache_dir=cache_dir, marketplace=marketplace,
+                                      validate=validate, output_format=output_format, compression=compression,
+                                      prune_negatives=prune_negatives, profile=profile, trace_memory=trace_memory,
+                                      rules=rules)
+            summary['seconds'] = time.perf_counter() - start
+            return summary
+        result = generate_header(survey_file=survey_file, output_file=output_file, sheet_name=sheet_name,
+                                 check_cross_columns=check_cross_columns, streaming=streaming, max_rows=max_rows,
+                                 reader=reader, cache_dir=cache_dir, previous_header=previous_files or None,
+                                 profile=profile, trace_memory=trace_memory, marketplace=marketplace,
+                                 validate=validate, output_format=output_format, compression=compression,
+                                 prune_negatives=prune_negatives, rules=rules)
+        issues_files = write_issues_report(result)
+    except DuplicateKeywordError as e:
+        return {'survey_file': survey_file, 'output_file': output_file, 'rows': 0,
+                'seconds': time.perf_counter() - start,
+                'error': f"{e}（{format_duplicates(e.report)}）"}
+    except GenerationError as e:
+        return {'survey_file': survey_file, 'output_file': output_file, 'rows': 0,
+                'seconds': time.perf_counter() - start, 'error': str(e)}
+    except Exception as e:
+        return {'survey_file': survey_file, 'output_file': output_file, 'rows': 0,
+                'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+    return {'survey_file': survey_file, 'output_file': ', '.join(result.output_files), 'rows': result.row_count,
+            'seconds': result.elapsed, 'error': None, 'diff_stats': result.diff_stats, 'perf': result.perf,
+            'issues': None if result.issues is None else len(result.issues), 'issues_files': issues_files,
+            'prune_stats': result.prune_stats}
+
+
+# 函数：打印每个文件的处理摘要
+def print_summary(summaries, total_seconds, stream=sys.stdout):
+    for item in summaries:
+        if item['error']:
+            print(f"[失败] {item['survey_file']} ({item['seconds']:.2f}s): {item['error']}", file=stream)
+        else:
+            print(f"[完成] {item['survey_file']} -> {item['output_file']}，"
+                  f"总行数：{item['rows']}，耗时：{item['seconds']:.2f}s", file=stream)
+            diff_stats = item.get('diff_stats')
+            if diff_stats:
+                print(f"       增量：完整 {diff_stats['完整行数']} 行，新增 {diff_stats['Create']}，"
+                      f"更新 {diff_stats['Update']}，归档 {diff_stats['Archive']}", file=stream)
+            prune_stats = item.get('prune_stats')
+            if prune_stats:
+                print(f"       否定词精简：少输出 {prune_stats['合计']} 行（重复 {prune_stats['重复']}，"
+                      f"被否定词组覆盖 {prune_stats['被词组覆盖']}）", file=stream)
+            if item.get('issues'):
+                print(f"       校验：{item['issues']} 个问题，上传前请修正（明细：{', '.join(item['issues_files'])}）",
+                      file=stream)
+    failures = sum(1 for item in summaries if item['error'])
+    print(f"共 {len(summaries)} 个文件，成功 {len(summaries) - failures} 个，失败 {failures} 个，"
+          f"总耗时：{total_seconds:.2f}s", file=stream)
+
+
+# 函数：写出性能报告 JSON（调研文件 → 报告，失败的文件只记录错误）
+def write_perf_report(summaries, path):
+    report = {
+        item['survey_file']: item.get('perf') or {'error': item['error']}
+        for item in summaries
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='SP-批量模版生成工具（命令行批量模式）')
+    parser.add_argument('inputs', nargs='+', help='调研 Excel 文件、目录或通配符')
+    parser.add_argument('-o', '--output-dir', default='.', help='输出目录（默认当前目录）')
+    parser.add_argument('--country', default=DEFAULT_MARKETPLACE,
+                        help=f'国家/地区，用于输出文件名；为已知站点（{", ".join(MARKETPLACES)}）时使用该站点的默认预算和竞价'
+                             f'（默认 {DEFAULT_MARKETPLACE}）')
+    parser.add_argument('--sheet', default=0, help='工作表名称或序号（默认第一个），逗号分隔多个工作表时合并生成')
+    parser.add_argument('--all-sheets', action='store_true', help='处理工作簿中的全部工作表（默认合并为一个表头）')
+    parser.add_argument('--per-sheet', action='store_true', help='多工作表时每个工作表各输出一个表头（文件名附加工作表名）')
+    parser.add_argument('--cross-column-duplicates', action='store_true', help='同时检查跨列重复关键词（仅提示）')
+    parser.add_argument('--streaming', action='store_true', help='流式写出，超过行数上限自动分卷')
+    parser.add_argument('--format', dest='output_format', choices=list(OUTPUT_FORMATS), default='xlsx',
+                        help='输出格式（csv/tsv 为 UTF-8 带 BOM，写出比 xlsx 快得多，按 --max-rows 分卷；默认 xlsx）')
+    parser.add_argument('--compression', choices=list(COMPRESSIONS), default=None,
+                        help='csv/tsv 的压缩方式（gzip：.csv.gz，zip：每个分卷一个 .zip）')
+    parser.add_argument('--max-rows', type=int, default=BULK_UPLOAD_ROW_LIMIT,
+                        help=f'单个文件的行数上限（xlsx 仅流式写出时分卷；默认 {BULK_UPLOAD_ROW_LIMIT}）')
+    parser.add_argument('--reader', choices=['auto', 'openpyxl', 'calamine'], default='auto',
+                        help='Excel 解析引擎（auto：已安装 python-calamine 时使用 calamine）')
+    parser.add_argument('--cache-dir', default=None, help='解析缓存目录，相同内容的调研文件不再重复解析')
+    parser.add_argument('--previous-dir', default=None,
+                        help='上次生成的表头所在目录；找到同名、同格式（--format/--compression）的表头时只输出增量'
+                             '（-diff.xlsx 等），否则输出完整表头')
+    parser.add_argument('--perf-report', default=None,
+                        help='将各文件的性能报告（各阶段耗时、各实体层级行数、最慢活动）写入此 JSON 文件')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='性能报告中包含各阶段内存峰值（tracemalloc，会明显变慢）')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='跳过上传前校验（默认校验 ASIN 格式、关键词长度、金额、SKU 和多余空白，问题写入 -issues.csv）')
+    parser.add_argument('--prune-negatives', action='store_true',
+                        help='精简否定关键词：同一活动内去掉重复的否定词和已被否定词组覆盖的否定精准词，减少输出行数')
+    parser.add_argument('--keyword-columns', choices=KEYWORD_COLUMN_MODES, default='position',
+                        help='关键词列的识别方式（position：表头第 10-19 列，与原工具一致；'
+                             'match：按列名识别，列名以“精准/广泛”等匹配类型词结尾，可调整列的顺序；默认 position）')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='并行进程数（默认 CPU 核数）')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    sheet_name = None if args.all_sheets else parse_sheet_names(args.sheet)
+    multi_sheet = sheet_name is None or isinstance(sheet_name, list)
+    if args.per_sheet and not multi_sheet:
+        sheet_name = [sheet_name]
+        multi_sheet = True
+    if multi_sheet and args.previous_dir:
+        parser.error('多工作表模式不支持 --previous-dir 增量输出')
+    if args.compression and args.output_format == 'xlsx':
+        parser.error('--compression 只能用于 --format csv 或 tsv')
+
+    survey_files = collect_survey_files(args.inputs)
+    if not survey_files:
+        print("未找到任何调研文件。", file=sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    summaries = []
+    sheet_workers = sheet_workers_for(args.workers, len(survey_files)) if multi_sheet else 1
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for path in survey_files:
+            output_file = output_path_for(path, args.output_dir, args.country)
+            previous_files = previous_files_for(path, args.previous_dir, args.country, args.output_format,
+                                                args.compression) if args.previous_dir else []
+            if previous_files:
+                output_file = diff_output_path(output_file)
+            future = pool.submit(process_survey, path, output_file, sheet_name, args.cross_column_duplicates,
+                                 args.streaming, args.max_rows, args.reader, args.cache_dir, previous_files,
+                                 bool(args.perf_report), args.trace_memory,
+                                 args.country if args.country in MARKETPLACES else None, args.per_sheet,
+                                 not args.no_validate, args.output_format, args.compression, args.prune_negatives,
+                                 sheet_workers, keyword_column_rules(args.keyword_columns))
+            futures[future] = path
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                # 工作进程异常退出（如内存不足被终止）
+                path = futures[future]
+                summaries.append({'survey_file': path, 'output_file': output_path_for(path, args.output_dir, args.country),
+                                  'rows': 0, 'seconds': time.perf_counter() - start,
+                                  'error': f"{type(e).__name__}: {e}"})
+
+    # 按输入顺序输出摘要
+    order = {path: i for i, path in enumerate(survey_files)}
+    summaries.sort(key=lambda item: order[item['survey_file']])
+    print_summary(summaries, time.perf_counter() - start)
+    if args.perf_report:
+        write_perf_report(summaries, args.perf_report)
+        print(f"性能报告已保存：{args.perf_report}")
+    return 1 if any(item['error'] for item in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import gzip
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from ingest import read_survey_bytes, survey_label
+from writers import COMPRESSIONS, OUTPUT_FORMATS
+
+# 增量模式：与上次生成的完整表头比较，只输出新增（Create）、变化（Update）和删除（Archive）的行
+
+# 实体的比较键：活动 + 实体层级 + 关键词文本 + 匹配类型 + 商品定向表达式
+DIFF_KEY_COLUMNS = ['广告活动名称', '实体层级', '关键词文本', '匹配类型', '拓展商品投放编号']
+
+# 键相同时比较的值列，任一不同即输出 Update
+DIFF_VALUE_COLUMNS = ['投放类型', '状态', '每日预算', 'SKU', '广告组默认竞价', '竞价', '竞价方案', '广告位', '百分比']
+
+# 不能归档的实体层级（竞价调整只能更新）
+NON_ARCHIVABLE_LEVELS = {'竞价调整'}
+
+# 键内各列的分隔符
+_KEY_SEPARATOR = '\x1f'
+
+
+class PreviousHeaderError(ValueError):
+    # 上次表头文件无法读取或缺少必要列
+    pass
+
+
+# 函数：按文件名后缀解析一个表头文件：xlsx，或 csv/tsv（UTF-8，可为 .gz 或只含一个文件的 .zip）；没有文件名时按 xlsx 解析
+def read_header_file(data, name=''):
+    name = str(name).lower()
+    if name.endswith(COMPRESSIONS['zip']):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            members = archive.namelist()
+            if len(members) != 1:
+                raise ValueError(f"zip 中应只有一个表头文件，实际为 {members}")
+            name = members[0].lower()
+            data = archive.read(members[0])
+    elif name.endswith(COMPRESSIONS['gzip']):
+        data = gzip.decompress(data)
+        name = name[:-len(COMPRESSIONS['gzip'])]
+    output_format = os.path.splitext(name)[1].lstrip('.')
+    if OUTPUT_FORMATS.get(output_format):
+        # 只有空单元格为空值，关键词 NA、null 等保留原文
+        return pd.read_csv(io.BytesIO(data), sep=OUTPUT_FORMATS[output_format], dtype=object, encoding='utf-8-sig',
+                           keep_default_na=False, na_values=[''])
+    return pd.read_excel(io.BytesIO(data), dtype=object)
+
+
+# 函数：读取上次生成的表头（可为多个分卷，格式见 read_header_file），合并为一个 DataFrame
+def load_previous_header(previous_header):
+    if not isinstance(previous_header, (list, tuple)):
+        previous_header = [previous_header]
+    frames = []
+    for item in previous_header:
+        try:
+            frames.append(read_header_file(read_survey_bytes(item), survey_label(item)))
+        except Exception as e:
+            raise PreviousHeaderError(f"读取上次表头文件 {survey_label(item)} 时出错：{e}")
+    df_previous = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    missing = [col for col in DIFF_KEY_COLUMNS + DIFF_VALUE_COLUMNS + ['操作'] if col not in df_previous.columns]
+    if missing:
+        raise PreviousHeaderError(f"上次表头文件缺少列：{missing}")
+    return df_previous
+
+
+# 函数：统一比较格式：空值为 ''，数字统一为浮点表示（0.5 与 '0.5'、12 与 12.0 视为相同），文本去除首尾空白
+# 分类列只转换各个类别，再按编码展开
+def _normalize(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = _normalize(pd.Series(series.cat.categories.to_numpy(dtype=object))).to_numpy(dtype=object)
+        codes = series.cat.codes.to_numpy()
+        values = np.append(categories, '')[codes]
+        return pd.Series(values, index=series.index, dtype=object)
+    values = series.astype(object).where(series.notna(), '')
+    numeric = pd.to_numeric(values, errors='coerce')
+    text = values.astype(str).str.strip()
+    return text.where(numeric.isna(), numeric.astype('float64').astype(str))
+
+
+# 函数：多列拼接为一个字符串键
+def _join_columns(df, columns):
+    normalized = [_normalize(df[col]) for col in columns]
+    key = normalized[0]
+    for part in normalized[1:]:
+        key = key + _KEY_SEPARATOR + part
+    return key
+
+
+# 函数：比较新旧表头，返回 (增量表头, 统计)
+def diff_header(df_new, df_previous):
+    # 上次已归档的行视为不存在
+    df_previous = df_previous[_normalize(df_previous['操作']) != 'Archive']
+
+    new_keys = _join_columns(df_new, DIFF_KEY_COLUMNS)
+    old_keys = _join_columns(df_previous, DIFF_KEY_COLUMNS)
+    new_unique = ~new_keys.duplicated()
+    old_unique = ~old_keys.duplicated()
+
+    # 新增：键不在上次表头中
+    create_mask = new_unique & ~new_keys.isin(old_keys)
+
+    # 更新：键相同但值不同
+    new_values = _join_columns(df_new, DIFF_VALUE_COLUMNS)
+    old_values = pd.Series(
+        _join_columns(df_previous, DIFF_VALUE_COLUMNS)[old_unique].values, index=old_keys[old_unique].values
+    )
+    common_mask = new_unique & ~create_mask
+    update_mask = common_mask & (new_keys.map(old_values) != new_values)
+
+    # 归档：上次有、本次没有的实体；整个活动归档时不再单独归档其下级实体
+    archive_mask = old_unique & ~old_keys.isin(new_keys)
+    archive_mask &= ~df_previous['实体层级'].isin(NON_ARCHIVABLE_LEVELS)
+    levels = _normalize(df_previous['实体层级'])
+    campaigns = _normalize(df_previous['广告活动名称'])
+    archived_campaigns = set(campaigns[archive_mask & (levels == '广告活动')])
+    archive_mask &= (levels == '广告活动') | ~campaigns.isin(archived_campaigns)
+
+    changed_mask = create_mask | update_mask
+    df_changed = df_new[changed_mask].assign(操作=create_mask[changed_mask].map({True: 'Create', False: 'Update'}))
+    df_archive = df_previous[archive_mask].reindex(columns=df_new.columns).assign(操作='Archive')
+    df_diff = pd.concat([df_changed, df_archive], ignore_index=True)
+
+    stats = {
+        'Create': int(create_mask.sum()),
+        'Update': int(update_mask.sum()),
+        'Archive': int(archive_mask.sum()),
+        '未变化': int((common_mask & ~update_mask).sum()),
+        '完整行数': len(df_new),
+    }
+    return df_diff, stats
@@ -0,0 +1,1108 @@
+import io
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import chain, repeat
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from diff import PreviousHeaderError, diff_header, load_previous_header
+from ingest import (
+    evict_cache, load_cached_survey, load_memory_survey, read_survey, read_survey_bytes, save_cached_survey,
+    save_memory_survey, survey_digest, survey_label,
+)
+from marketplaces import get_marketplace, marketplace_currencies
+from negatives import NegativePruner
+from perf import PerfRecorder
+from plan import NEGATIVE_SOURCES, GenerationPlan, load_plan
+from validate import (
+    concat_issues, issue_row_count, locate_issues, summarize_issues, validate_header, validate_stream,
+)
+from writers import BULK_UPLOAD_ROW_LIMIT, check_output_format, open_header_writer, output_path
+
+# 表头生成核心引擎：不依赖 Streamlit，可被网页界面和命令行共同调用
+
+# 列定义
+HEADER_COLUMNS = [
+    '产品', '实体层级', '操作', '广告活动编号', '广告组编号', '广告组合编号', '广告编号', '关键词编号', '商品投放 ID',
+    '广告活动名称', '广告组名称', '开始日期', '结束日期', '投放类型', '状态', '每日预算', 'SKU', '广告组默认竞价',
+    '竞价', '关键词文本', '匹配类型', '竞价方案', '广告位', '百分比', '拓展商品投放编号'
+]
+
+# 数值列（金额、竞价和百分比）：全部能转为数字时为 float64（空值为 NaN），否则保留原值由校验报告
+NUMERIC_COLUMNS = ['每日预算', '广告组默认竞价', '竞价', '百分比']
+
+# 默认值
+PRODUCT = '商品推广'
+OPERATION = 'Create'
+STATUS = '已启用'
+TARGETING_TYPE = '手动'
+BIDDING_STRATEGY = '动态竞价 - 仅降低'
+DEFAULT_DAILY_BUDGET = 12
+DEFAULT_GROUP_BID = 0.6
+DEFAULT_CPC = 0.5
+DEFAULT_SKU = 'SKU-1'
+
+
+class GenerationError(Exception):
+    # 无法生成表头时抛出（文件缺失、读取失败、关键词重复、无法写入等），消息可直接展示给用户
+    pass
+
+
+class DuplicateKeywordError(GenerationError):
+    # 关键词列内存在重复，report 为重复关键词报告表
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.report = report
+
+    # 跨进程传递（pickle）时保留报告
+    def __reduce__(self):
+        return type(self), (str(self), self.report)
+
+
+class GenerationCancelled(GenerationError):
+    # 生成被取消（进度回调在检查到取消请求时抛出）
+    pass
+
+
+@dataclass
+class GenerationResult:
+    survey_file: str
+    output_files: list
+    row_count: int
+    elapsed: float
+    # 流式输出时不在内存中保留完整 DataFrame，df_header 为 None
+    df_header: pd.DataFrame = None
+    preview: pd.DataFrame = None
+    level_counts: dict = field(default_factory=dict)
+    # 内存输出时各文件内容（文件名 → bytes），写磁盘时为空
+    output_data: dict = field(default_factory=dict)
+    # 增量模式的统计（新增/更新/归档/未变化行数），非增量模式为 None
+    diff_stats: dict = None
+    # 性能报告（见 perf.PerfRecorder.to_dict），未开启性能记录时为 None
+    perf: dict = None
+    # 上传前校验的问题表（见 validate.ISSUE_COLUMNS），未校验时为 None
+    issues: pd.DataFrame = None
+    # 否定词精简少输出的行数（见 negatives.NegativePruner.stats），未精简时为 None
+    prune_stats: dict = None
+
+    @property
+    def output_file(self):
+        return self.output_files[0] if self.output_files else None
+
+
+# 函数：默认日志，丢弃所有消息
+# 日志级别：summary（概要）、warning（警告）、info（信息）、debug（逐活动明细），见 logs.LogCollector
+def _noop_log(message, level='info'):
+    pass
+
+
+# 函数：默认进度回调，忽略所有进度
+# 进度回调：progress(stage, done, total)，进入阶段时 stage 为阶段名（见 perf.STAGE_LABELS），
+# 逐活动展开时 stage 为 None（阶段不变），done/total 为已展开/全部活动数；回调抛出 GenerationCancelled 即取消生成
+def _noop_progress(stage=None, done=None, total=None):
+    pass
+
+
+# 函数：未开启性能记录时的阶段占位
+def _no_stage(name, detail=None):
+    return nullcontext()
+
+
+# 函数：进入阶段前先报告进度
+def _reporting_stage(stage, progress):
+    def reporting(name, detail=None):
+        progress(name)
+        return stage(name, detail)
+    return reporting
+
+
+# 函数：逐个活动传出 RowBlock 列表，每展开一个活动报告一次进度（done 从 start 开始累计）
+def track_campaigns(campaign_blocks, total, progress=_noop_progress, start=0):
+    for done, blocks in enumerate(campaign_blocks, start + 1):
+        yield blocks
+        progress(None, done, total)
+
+
+# 函数：列序号（从 1 开始）转换为 Excel 列字母
+def column_letter(col_index):
+    return chr(64 + col_index) if col_index <= 26 else f"{chr(64 + (col_index-1)//26)}{chr(64 + (col_index-1)%26 + 1)}"
+
+
+# 函数：提取列中的非空关键词
+def clean_keywords(series):
+    return [kw for kw in series.dropna() if str(kw).strip()]
+
+
+# 函数：调研工作表的完整表头（按需读取列时，DataFrame 只包含用到的列）
+def survey_columns(df_survey):
+    return df_survey.attrs.get('survey_columns') or list(df_survey.columns)
+
+
+# 函数：读取调研 Excel
+# 只解析用到的列；reader='auto' 时优先使用 calamine；给出 cache_dir 时按文件内容哈希缓存解析结果，
+# memory_cache=True 时同时缓存在进程内（不写磁盘，见 ingest.SURVEY_MEMORY_ENTRIES）
+def load_survey(survey_file, sheet_name=0, log=_noop_log, reader='auto', cache_dir=None, memory_cache=False):
+    try:
+        data = read_survey_bytes(survey_file)
+    except FileNotFoundError:
+        raise GenerationError(f"错误：未找到文件 {survey_label(survey_file)}。请确保文件已上传。")
+    digest = survey_digest(data)
+
+    df_survey = load_memory_survey(digest, sheet_name) if memory_cache else None
+    if df_survey is not None:
+        log(f"命中内存解析缓存：{digest[:12]}，跳过解析")
+        return _loaded_survey(survey_file, df_survey, digest, log)
+    df_survey = load_cached_survey(cache_dir, digest, sheet_name) if cache_dir else None
+    if df_survey is not None:
+        log(f"命中解析缓存：{digest[:12]}，跳过解析")
+    else:
+        try:
+            df_survey = read_survey(data, sheet_name=sheet_name, reader=reader)
+        except Exception as e:
+            raise GenerationError(f"读取文件时出错：{e}")
+        if cache_dir:
+            # 缓存只用于加速，写入失败不影响生成
+            try:
+                save_cached_survey(cache_dir, digest, df_survey, sheet_name)
+            except Exception as e:
+                log(f"提示：该调研文件无法缓存（{type(e).__name__}: {e}），下次仍需重新解析")
+            evict_cache(cache_dir)
+    if memory_cache:
+        save_memory_survey(digest, df_survey, sheet_name)
+    return _loaded_survey(survey_file, df_survey, digest, log)
+
+
+# 函数：记录读取结果并在 attrs 中保存文件哈希
+def _loaded_survey(survey_file, df_survey, digest, log):
+    df_survey.attrs['survey_digest'] = digest
+    log(f"成功读取文件：{survey_label(survey_file)}，数据形状：{df_survey.shape}", level='summary')
+    log(f"列名列表: {survey_columns(df_survey)}", level='debug')
+    return df_survey
+
+
+# 重复关键词报告列
+DUPLICATE_REPORT_COLUMNS = ['范围', '列', '列名', '关键词', '次数', '行号']
+
+
+# 函数：所有关键词列合并为长表：列名、关键词、Excel 行号（表头占第 1 行），列名 → 列字母保存在 attrs['letters']
+def keyword_long_table(df_survey, keyword_columns):
+    keyword_columns = list(keyword_columns)
+    wide = df_survey[keyword_columns].reset_index(drop=True)
+    wide.index = wide.index + 2
+    long = wide.melt(ignore_index=False, var_name='列名', value_name='关键词').dropna(subset=['关键词'])
+    long = long[long['关键词'].astype(str).str.strip() != '']
+    long['行号'] = long.index
+
+    all_columns = survey_columns(df_survey)
+    long.attrs['letters'] = {col: column_letter(all_columns.index(col) + 1) for col in keyword_columns}
+    return long
+
+
+# 函数：一次性检查关键词重复，返回报告表（列内重复，可选跨列重复）
+def find_duplicate_keywords(df_survey, keyword_columns, check_cross_columns=False):
+    keyword_columns = list(keyword_columns)
+    if not keyword_columns or df_survey.empty:
+        return pd.DataFrame(columns=DUPLICATE_REPORT_COLUMNS)
+
+    long = keyword_long_table(df_survey, keyword_columns)
+    letters = long.attrs['letters']
+
+    reports = []
+
+    # 列内重复
+    within = long[long.duplicated(['列名', '关键词'], keep=False)]
+    if not within.empty:
+        grouped = within.groupby(['列名', '关键词'], sort=False)['行号'].agg(['size', list]).reset_index()
+        reports.append(pd.DataFrame({
+            '范围': '列内',
+            '列': grouped['列名'].map(letters),
+            '列名': grouped['列名'],
+            '关键词': grouped['关键词'],
+            '次数': grouped['size'],
+            '行号': [', '.join(map(str, rows)) for rows in grouped['list']],
+        }))
+
+    # 跨列重复：同一关键词出现在多个关键词列中
+    if check_cross_columns:
+        unique_pairs = long.drop_duplicates(['列名', '关键词'])
+        across = long[long['关键词'].isin(unique_pairs.loc[unique_pairs.duplicated('关键词', keep=False), '关键词'])]
+        if not across.empty:
+            across = across.assign(位置=across['列名'].map(letters) + across['行号'].astype(str))
+            grouped = across.groupby('关键词', sort=False).agg(
+                列名=('列名', lambda cols: list(dict.fromkeys(cols))),
+                次数=('行号', 'size'),
+                位置=('位置', list),
+            ).reset_index()
+            reports.append(pd.DataFrame({
+                '范围': '跨列',
+                '列': [', '.join(letters[col] for col in cols) for cols in grouped['列名']],
+                '列名': [', '.join(map(str, cols)) for cols in grouped['列名']],
+                '关键词': grouped['关键词'],
+                '次数': grouped['次数'],
+                '行号': [', '.join(cells) for cells in grouped['位置']],
+            }))
+
+    if not reports:
+        return pd.DataFrame(columns=DUPLICATE_REPORT_COLUMNS)
+    return pd.concat(reports, ignore_index=True)[DUPLICATE_REPORT_COLUMNS]
+
+
+# 函数：检查关键词重复并记录日志，有列内重复时抛出 DuplicateKeywordError
+def check_duplicate_keywords(df_survey, keyword_columns, log=_noop_log, check_cross_columns=False):
+    log("检查关键词重复")
+    duplicate_report = find_duplicate_keywords(df_survey, keyword_columns, check_cross_columns)
+    within_report = duplicate_report[duplicate_report['范围'] == '列内']
+    cross_report = duplicate_report[duplicate_report['范围'] == '跨列']
+    if not cross_report.empty:
+        log(f"提示：{len(cross_report)} 个关键词同时出现在多个关键词列中", level='warning')
+        log(cross_report.reset_index(drop=True), level='warning')
+    if not within_report.empty:
+        for col_letter, col in within_report[['列', '列名']].drop_duplicates().itertuples(index=False):
+            log(f"警告：{col_letter} 列 ({col}) 有重复关键词", level='warning')
+        log(within_report.reset_index(drop=True), level='warning')
+        raise DuplicateKeywordError(
+            "提示：由于检测到关键词重复，本次不生成表格。请清理重复后重试。", duplicate_report
+        )
+
+    log("关键词无重复，继续生成...", level='summary')
+    return duplicate_report
+
+
+# 计划来源的显示名称
+_PLAN_SOURCE_LABELS = {'memory': '内存', 'disk': '磁盘'}
+
+
+# 函数：调研表头对应的生成计划（见 plan.py），同一表头模板命中缓存时跳过列角色推断
+# 给出 cache_dir 时计划同时缓存到该目录；规则配置有误时抛出 GenerationError
+def survey_plan(df_survey, log=_noop_log, cache_dir=None, rules=None):
+    try:
+        plan, source = load_plan(survey_columns(df_survey), rules, cache_dir)
+    except ValueError as e:
+        raise GenerationError(str(e))
+    if source is not None:
+        log(f"命中生成计划缓存（{_PLAN_SOURCE_LABELS[source]}）：{plan.signature[:12]}，跳过列角色推断")
+    else:
+        log(f"生成计划：{plan.signature[:12]}，关键词列 {len(plan.keyword_columns)} 个，类别 {len(plan.categories)} 个")
+    log(f"关键词列: {plan.keyword_columns}")
+    return plan
+
+
+class KeywordIndex:
+    # 关键词索引：调研读取后按生成计划一次性构建（类别 × 匹配类型 → 列 → 去重关键词），
+    # 活动展开时只做字典查找，不再重复扫描 DataFrame
+
+    def __init__(self, df_survey, plan):
+        self.keyword_columns = list(plan.keyword_columns)
+        self.keyword_categories = list(plan.categories)
+        self.classifier = plan.classifier()
+
+        # 每列清洗、去重后的关键词
+        self.column_keywords = {
+            col: tuple(dict.fromkeys(clean_keywords(df_survey[col]))) for col in self.keyword_columns
+        }
+
+        # 类别 → 包含该类别的列；匹配类型 → 包含匹配类型关键词的列（列角色在计划中）
+        self.category_columns = {category: set() for category in self.keyword_categories}
+        self.match_type_columns = {match_type: set() for match_type in plan.match_types}
+        for col, role in plan.keyword_roles.items():
+            for category in role['categories']:
+                self.category_columns[category].add(col)
+            for match_type in role['match_types']:
+                self.match_type_columns[match_type].add(col)
+
+        # 预先计算交叉否定关键词
+        self.cross_neg = {group: self._collect(columns) for group, columns in plan.cross_negatives.items()}
+
+        # 商品定向：活动名称与列名完全一致的 ASIN 列（只取第一个）
+        self.asin_columns = plan.asin_columns
+        self.asin_targets = {
+            name: tuple(dict.fromkeys(clean_keywords(df_survey[col]))) for name, col in self.asin_columns.items()
+        }
+
+        self._keyword_cache = {}
+
+    # 函数：合并若干列的关键词并去重
+    def _collect(self, columns):
+        keywords = []
+        for col in columns:
+            keywords.extend(self.column_keywords[col])
+        return tuple(dict.fromkeys(keywords))
+
+    # 函数：活动名称命中的关键词类别
+    def campaign_categories(self, campaign_name):
+        return self.classifier.classify_one(campaign_name).categories
+
+    # 函数：类别组合 + 匹配类型 → (匹配的列, 关键词)，结果缓存
+    def lookup(self, categories, match_type):
+        key = (frozenset(categories), match_type)
+        cached = self._keyword_cache.get(key)
+        if cached is None:
+            category_cols = set()
+            for category in categories:
+                category_cols |= self.category_columns.get(category, set())
+            type_cols = self.match_type_columns.get(match_type, set())
+            columns = tuple(col for col in self.keyword_columns if col in category_cols and col in type_cols)
+            cached = (columns, self._collect(columns))
+            self._keyword_cache[key] = cached
+        return cached
+
+    # 函数：活动所属的交叉否定分组
+    def cross_neg_group(self, campaign_name):
+        return self.classifier.classify_one(campaign_name).group
+
+    # 函数：查找匹配的关键词列
+    def find_matching_keyword_columns(self, campaign_name, match_type, log=_noop_log):
+        matched_categories = self.campaign_categories(campaign_name)
+        log(f"  匹配的关键词类别: {list(matched_categories)}", level='debug')
+
+        if not matched_categories:
+            log("  无匹配的关键词类别", level='debug')
+            return [], []
+
+        matching_columns, keywords = self.lookup(matched_categories, match_type)
+        log(f"  匹配的列: {list(matching_columns)}", level='debug')
+        log(f"  关键词数量: {len(keywords)} (示例: {list(keywords[:2]) if keywords else '无'})", level='debug')
+        return list(matching_columns), keywords
+
+    # 函数：查找否定关键词（同类精准词）
+    def find_neg_keywords(self, campaign_name, log=_noop_log):
+        matched_categories = self.campaign_categories(campaign_name)
+        if not matched_categories:
+            return ()
+
+        neg_keywords = self.lookup(matched_categories, '精准')[1]
+        log(f"  精准否定关键词数量: {len(neg_keywords)} (示例: {list(neg_keywords[:2]) if neg_keywords else '无'})", level='debug')
+        return neg_keywords
+
+    # 函数：查找交叉否定关键词
+    def find_cross_neg_keywords(self, campaign_name, log=_noop_log):
+        group = self.cross_neg_group(campaign_name)
+        cross_neg_keywords = self.cross_neg[group] if group else ()
+        log(f"  交叉否定关键词数量: {len(cross_neg_keywords)} (示例: {list(cross_neg_keywords[:2]) if cross_neg_keywords else '无'})", level='debug')
+        return cross_neg_keywords
+
+    # 函数：为商品定向活动查找 ASIN
+    def find_asin_targets(self, campaign_name, log=_noop_log):
+        # 修改：广告活动名称必须跟列名完全一样
+        col = self.asin_columns.get(str(campaign_name))
+        if col is None:
+            log(f"  {campaign_name} 未找到完全匹配的ASIN列", level='debug')
+            return ()
+        log(f"  匹配的ASIN列: {col} (完全匹配活动名称 {campaign_name})", level='debug')
+        return self.asin_targets[str(campaign_name)]
+
+
+class RowBlock:
+    # 列式行块：同一活动同一实体的一组行。column 列取 data 中的值（每个值一行），
+    # 其余列为整块共用的标量，未给出的列为空字符串
+
+    __slots__ = ('scalars', 'column', 'data')
+
+    def __init__(self, scalars, column=None, data=None):
+        self.scalars = scalars
+        self.column = column
+        self.data = data if column is not None else None
+
+    def __len__(self):
+        return 1 if self.column is None else len(self.data)
+
+    # 函数：展开为行列表（流式写出时使用）
+    def rows(self, columns=HEADER_COLUMNS):
+        template = [self.scalars.get(col, '') for col in columns]
+        if self.column is None:
+            return [template]
+        pos = columns.index(self.column)
+        rows = []
+        for value in self.data:
+            row = template.copy()
+            row[pos] = value
+            rows.append(row)
+        return rows
+
+
+# 函数：行块一次性拼接为 DataFrame，标量列按块编码后用 np.repeat 广播，不逐行构造列表
+# 标量列（实体层级、操作、活动名称等，每列只有少量不同值）为分类列，竞价和金额为数值列，行内数据列（关键词文本等）也按分类编码
+def blocks_to_frame(blocks, columns=HEADER_COLUMNS):
+    blocks = [block for block in blocks if len(block)]
+    lengths = np.fromiter((len(block) for block in blocks), dtype=np.int64, count=len(blocks))
+    data = {}
+    for col in columns:
+        if any(block.column == col for block in blocks):
+            values = np.empty(int(lengths.sum()), dtype=object)
+            values[:] = list(chain.from_iterable(
+                block.data if block.column == col else repeat(block.scalars.get(col, ''), len(block))
+                for block in blocks
+            ))
+            data[col] = _categorical(*pd.factorize(values))
+        else:
+            scalars = np.empty(len(blocks), dtype=object)
+            scalars[:] = [block.scalars.get(col, '') for block in blocks]
+            data[col] = _scalar_column(scalars, lengths, col in NUMERIC_COLUMNS)
+    return pd.DataFrame(data, columns=columns)
+
+
+# 函数：每块一个标量广播为整列：数值列全部为数字或空时为 float64，其余为分类列（编码按块重复）
+def _scalar_column(scalars, lengths, numeric=False):
+    if numeric:
+        blank = pd.isna(scalars) | (scalars == '')
+        numbers = pd.to_numeric(pd.Series(scalars).where(~blank), errors='coerce').to_numpy(dtype=float)
+        if not np.isnan(numbers[~blank]).any():
+            return np.repeat(numbers, lengths)
+    codes, categories = pd.factorize(scalars)
+    return _categorical(np.repeat(codes, lengths), categories)
+
+
+# 函数：编码和类别组成分类列；类别混有文本和数字时（如 SKU 列部分为纯数字）保留为 object 列，
+# 混合类型的类别无法转换为 Arrow（界面预览）
+def _categorical(codes, categories):
+    column = pd.Categorical.from_codes(codes, categories)
+    if pd.api.types.infer_dtype(categories, skipna=True).startswith('mixed'):
+        return column.astype(object)
+    return column
+
+
+# 函数：拼接多个表头 DataFrame；各分类列先合并类别，避免拼接后退化为 object 列
+def concat_header_frames(frames, columns=HEADER_COLUMNS):
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    data = {}
+    for col in columns:
+        parts = [frame[col] for frame in frames]
+        data[col] = None
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            try:
+                column = union_categoricals(parts)
+                data[col] = _categorical(column.codes, column.categories)
+            except TypeError:
+                # 类别的类型不同（如文本与数字），按普通列拼接
+                pass
+        if data[col] is None:
+            data[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data, columns=columns)
+
+
+@dataclass
+class PreparedSurvey:
+    # 生成前的准备结果：生成计划、活动列表与配置、关键词列与类别、关键词索引、全局否定词
+    plan: GenerationPlan
+    unique_campaigns: list
+    # 与 unique_campaigns 一一对应的分类结果（classifier.CampaignClass）
+    campaign_classes: list
+    campaign_to_values: dict
+    keyword_columns: list
+    keyword_categories: list
+    index: KeywordIndex
+    # 否定词来源（见 plan.NEGATIVE_SOURCES）→ 否定词，调研中没有的否定列为空列表
+    negatives: dict
+    neg_asin_targets: list
+
+
+# 函数：生成前的准备：活动配置映射、重复检查、否定词聚合和关键词索引
+# 列角色、类别和交叉否定规则来自生成计划（plan 为 None 时按表头查找或推断，见 survey_plan）
+def prepare_survey(df_survey, log=_noop_log, check_cross_columns=False, check_duplicates=True, plan=None):
+    if plan is None:
+        plan = survey_plan(df_survey, log=log)
+    campaign_column = plan.campaign_column
+
+    # 提取独特活动名称
+    unique_campaigns = [name for name in df_survey[campaign_column].dropna() if str(name).strip()]
+    log(f"独特活动名称数量: {len(unique_campaigns)}", level='summary')
+    log(f"活动名称列表: {unique_campaigns}", level='debug')
+
+    # 创建活动到 CPC/SKU/广告组默认竞价/预算/广告位/百分比 的映射
+    if not plan.missing_config_columns:
+        non_empty_campaigns = df_survey[df_survey[campaign_column].notna() & (df_survey[campaign_column] != '')]
+        campaign_to_values = non_empty_campaigns.drop_duplicates(
+            subset=campaign_column, keep='first'
+        ).set_index(campaign_column)[plan.config_columns].to_dict('index')
+    else:
+        campaign_to_values = {}
+        log(f"警告：缺少列 {set(plan.missing_config_columns)}，使用默认值", level='warning')
+
+    log(f"生成的字典（有 {len(campaign_to_values)} 个活动）: {campaign_to_values}", level='debug')
+
+    # 检查关键词重复
+    if check_duplicates:
+        check_duplicate_keywords(df_survey, plan.keyword_columns, log, check_cross_columns)
+
+    # 否定关键词聚合
+    negatives = {source: clean_keywords(df_survey[col]) for source, col in plan.negative_columns.items()}
+    for source in NEGATIVE_SOURCES:
+        negatives.setdefault(source, [])
+    neg_asin_targets = [f'asin="{asin}"' for asin in negatives['neg_asin']]
+
+    log(f"识别到的关键词类别: {plan.categories}")
+
+    # 一次性构建关键词索引，并对全部活动名称一次性分类（类别、匹配类型、交叉否定分组）
+    index = KeywordIndex(df_survey, plan)
+    campaign_classes = index.classifier.classify_all(unique_campaigns)
+
+    return PreparedSurvey(
+        plan=plan,
+        unique_campaigns=unique_campaigns,
+        campaign_classes=campaign_classes,
+        campaign_to_values=campaign_to_values,
+        keyword_columns=list(plan.keyword_columns),
+        keyword_categories=list(plan.categories),
+        index=index,
+        negatives=negatives,
+        neg_asin_targets=neg_asin_targets,
+    )
+
+
+# 函数：是否为大于 0 的数值金额
+def _is_positive(amount):
+    try:
+        return float(amount) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+# 函数：逐个活动展开为 RowBlock 列表
+# 给出 perf（perf.PerfRecorder）时记录每个活动的展开耗时和行数
+# 给出 marketplace（站点代码）时使用该站点的默认预算/竞价/CPC，并按站点货币精度取整金额
+# 给出 pruner（negatives.NegativePruner）时精简每个活动的否定关键词（去重、去掉被否定词组覆盖的），统计在 pruner 中
+# 广告活动、竞价调整、广告组、商品广告之后的实体和否定词顺序按生成计划中活动适用的模板（见 plan.DEFAULT_RULES）
+def iter_campaign_blocks(prepared, log=_noop_log, perf=None, marketplace=None, pruner=None):
+    campaign_to_values = prepared.campaign_to_values
+    index = prepared.index
+    plan = prepared.plan
+    negative_lists = prepared.negatives
+    neg_asin_targets = prepared.neg_asin_targets
+    # (匹配类型, 是否 ASIN 活动) → (实体, 否定词规则)
+    template_steps = {}
+
+    # 默认值
+    product = PRODUCT
+    operation = OPERATION
+    status = STATUS
+    targeting_type = TARGETING_TYPE
+    bidding_strategy = BIDDING_STRATEGY
+    market = get_marketplace(marketplace) if marketplace is not None else None
+    default_cpc = market.cpc if market else DEFAULT_CPC
+    default_group_bid = market.group_bid if market else DEFAULT_GROUP_BID
+    default_budget = market.daily_budget if market else DEFAULT_DAILY_BUDGET
+    zero_warned = False
+
+    for campaign_name, campaign_class in zip(prepared.unique_campaigns, prepared.campaign_classes):
+        campaign_start = time.perf_counter()
+
+        # 生成数据行：按实体分块，列式存储
+        blocks = []
+
+        # 获取 CPC、SKU、广告组默认竞价、预算、广告位、百分比
+        if campaign_name in campaign_to_values:
+            cpc = campaign_to_values[campaign_name]['CPC']
+            sku = campaign_to_values[campaign_name]['SKU']
+            group_bid = campaign_to_values[campaign_name]['广告组默认竞价']
+            budget = campaign_to_values[campaign_name]['预算']
+            ad_position = campaign_to_values[campaign_name]['广告位']
+            percentage = campaign_to_values[campaign_name]['百分比']
+        else:
+            cpc = default_cpc
+            sku = DEFAULT_SKU
+            group_bid = default_group_bid
+            budget = default_budget
+            ad_position = ''
+            percentage = ''
+        if market is not None:
+            amounts = (cpc, group_bid, budget)
+            cpc, group_bid, budget = (market.round_amount(amount) for amount in amounts)
+            # 小于该货币最小单位的金额取整后为 0，多半是调研按其他货币填写
+            if not zero_warned and any(_is_positive(amount) and rounded == 0
+                                       for amount, rounded in zip(amounts, (cpc, group_bid, budget))):
+                zero_warned = True
+                log(f"警告：活动 {campaign_name} 的金额 {amounts} 按 {market.currency} 精度取整后为 0，"
+                    f"请确认调研中的金额是否为 {market.code} 站点的货币", level='warning')
+
+        log(f"处理活动: {campaign_name}", level='debug')
+
+        # 确定匹配类型
+        is_exact = campaign_class.is_exact
+        is_broad = campaign_class.is_broad
+        is_asin = campaign_class.is_asin
+        match_type = campaign_class.match_type
+        log(f"  is_exact: {is_exact}, is_broad: {is_broad}, is_asin: {is_asin}, match_type: {match_type}", level='debug')
+
+        # 活动适用的模板：精准/广泛模板输出关键词和否定关键词，ASIN 模板输出商品定向
+        steps = template_steps.get((match_type, is_asin))
+        if steps is None:
+            templates = [plan.templates[name] for name in plan.campaign_templates(campaign_class)]
+            steps = template_steps[(match_type, is_asin)] = (
+                {entity for template in templates for entity in template.get('entities', [])},
+                [rule for template in templates for rule in template.get('negatives', [])],
+            )
+        entities, negative_rules = steps
+
+        # 提取关键词（用于正向关键词，精准/广泛匹配）
+        keywords = []
+        matched_columns = []
+        if '关键词' in entities:
+            matched_columns, keywords = index.find_matching_keyword_columns(campaign_name, match_type, log)
+
+        # 提取 ASIN（用于商品定向）
+        asin_targets = []
+        if '商品定向' in entities:
+            asin_targets = index.find_asin_targets(campaign_name, log)
+            log(f"  商品定向 ASIN 数量: {len(asin_targets)} (示例: {list(asin_targets[:2]) if asin_targets else '无'})", level='debug')
+
+        # 广告活动行
+        blocks.append(RowBlock({
+            '产品': product, '实体层级': '广告活动', '操作': operation, '广告活动编号': campaign_name,
+            '广告活动名称': campaign_name, '投放类型': targeting_type, '状态': status, '每日预算': budget,
+            '竞价方案': bidding_strategy,
+        }))
+
+        # 竞价调整行
+        blocks.append(RowBlock({
+            '产品': '商品推广', '实体层级': '竞价调整', '操作': 'Create', '广告活动编号': campaign_name,
+            '广告活动名称': campaign_name, '广告组名称': campaign_name, '投放类型': '手动',
+            '竞价方案': '动态竞价 - 仅降低', '广告位': ad_position, '百分比': percentage,
+        }))
+
+        # 广告组、商品广告及以下实体共用的字段
+        group_fields = {
+            '产品': product, '操作': operation, '广告活动编号': campaign_name, '广告组编号': campaign_name,
+            '广告活动名称': campaign_name, '广告组名称': campaign_name, '状态': status,
+        }
+
+        # 广告组行
+        blocks.append(RowBlock({**group_fields, '实体层级': '广告组', '广告组默认竞价': group_bid}))
+
+        # 商品广告行
+        blocks.append(RowBlock({**group_fields, '实体层级': '商品广告', 'SKU': sku}))
+
+        # 关键词行（仅精准/广泛匹配）
+        if '关键词' in entities:
+            blocks.append(RowBlock(
+                {**group_fields, '实体层级': '关键词', '竞价': cpc, '匹配类型': match_type},
+                '关键词文本', keywords,
+            ))
+
+        # 否定关键词：按模板顺序收集各否定词列表，精简后每个列表为一个块
+        # 来源为否定列、同类精准词（same_category_exact）或交叉否定词（cross，宿主组否定case精准词，case组否定宿主精准词）
+        negatives = []
+        if '否定关键词' in entities:
+            for rule in negative_rules:
+                if rule.get('group') is not None and rule['group'] != campaign_class.group:
+                    continue
+                if rule['source'] == 'same_category_exact':
+                    keywords_list = index.find_neg_keywords(campaign_name, log)
+                elif rule['source'] == 'cross':
+                    keywords_list = index.find_cross_neg_keywords(campaign_name, log)
+                else:
+                    keywords_list = negative_lists[rule['source']]
+                if keywords_list:
+                    negatives.append((keywords_list, rule['match_type']))
+
+        # 否定关键词行
+        if pruner is not None:
+            negatives = pruner.prune(negatives)
+        for keywords_list, neg_match_type in negatives:
+            if keywords_list:
+                blocks.append(RowBlock(
+                    {**group_fields, '实体层级': '否定关键词', '匹配类型': neg_match_type},
+                    '关键词文本', keywords_list,
+                ))
+
+        # 商品定向和否定商品定向（仅 ASIN 组）
+        if '商品定向' in entities and asin_targets:
+            blocks.append(RowBlock(
+                {**group_fields, '实体层级': '商品定向', '竞价': cpc},
+                '拓展商品投放编号', [f'asin="{asin}"' for asin in asin_targets],
+            ))
+        if '否定商品定向' in entities and neg_asin_targets:
+            blocks.append(RowBlock(
+                {**group_fields, '实体层级': '否定商品定向'},
+                '拓展商品投放编号', neg_asin_targets,
+            ))
+
+        if perf is not None:
+            perf.record_campaign(campaign_name, time.perf_counter() - campaign_start, sum(len(block) for block in blocks))
+        yield blocks
+
+
+# 预览行数
+PREVIEW_ROWS = 20
+
+
+# 函数：记录生成结果的各实体层级统计
+def log_header_summary(df_header, log=_noop_log):
+    keyword_rows = df_header[df_header['实体层级'] == '关键词']
+    log(f"关键词行数量: {len(keyword_rows)}", level='summary')
+    if len(keyword_rows):
+        first = keyword_rows.iloc[0]
+        log(f"示例关键词行: 实体层级={first['实体层级']}, 关键词文本={first['关键词文本']}, 匹配类型={first['匹配类型']}")
+
+    product_targeting_rows = df_header[df_header['实体层级'] == '商品定向']
+    log(f"商品定向行数量: {len(product_targeting_rows)}", level='summary')
+    if len(product_targeting_rows):
+        first = product_targeting_rows.iloc[0]
+        log(f"示例商品定向行: 实体层级={first['实体层级']}, 竞价={first['竞价']}, 拓展商品投放编号={first['拓展商品投放编号']}")
+
+    levels = set(df_header['实体层级'])
+    log(f"所有实体层级: {levels}")
+
+
+# 函数：记录上传前校验结果
+def log_validation_issues(issues, log=_noop_log):
+    if issues.empty:
+        log("上传前校验通过", level='summary')
+        return
+    log(f"警告：上传前校验发现 {len(issues)} 个问题（涉及 {issue_row_count(issues)} 行），上传前请修正", level='warning')
+    log(summarize_issues(issues), level='warning')
+
+
+# 函数：逐个活动流式写出（每个活动一个行列表），返回写出器（分卷文件、总行数、内存输出内容）、预览和各实体层级行数
+# output_format 为 xlsx/csv/tsv，csv/tsv 可用 compression（gzip/zip）压缩
+def write_header_streaming(campaign_rows, output_file, max_rows=BULK_UPLOAD_ROW_LIMIT, log=_noop_log, in_memory=False,
+                           output_format='xlsx', compression=None):
+    level_counts = Counter()
+    preview_rows = []
+    try:
+        with open_header_writer(output_file, HEADER_COLUMNS, max_rows=max_rows, in_memory=in_memory,
+                                output_format=output_format, compression=compression) as writer:
+            for rows in campaign_rows:
+                writer.write_block(rows)
+                level_counts.update(row[1] for row in rows)
+                if len(preview_rows) < PREVIEW_ROWS:
+                    preview_rows.extend(rows[:PREVIEW_ROWS - len(preview_rows)])
+    except PermissionError:
+        raise GenerationError(f"错误：无法写入 {output_file}，请确保文件未被占用或有写入权限。")
+
+    if writer.split_blocks:
+        log(f"警告：{writer.split_blocks} 个活动的行数超过单文件上限 {max_rows}，已跨文件拆分", level='warning')
+    if len(writer.output_files) > 1:
+        log(f"行数超过单文件上限 {max_rows}，已拆分为 {len(writer.output_files)} 个文件: {writer.output_files}", level='summary')
+    for level in ['关键词', '商品定向']:
+        log(f"{level}行数量: {level_counts.get(level, 0)}", level='summary')
+    log(f"所有实体层级: {set(level_counts)}")
+    preview = pd.DataFrame(preview_rows, columns=HEADER_COLUMNS)
+    return writer, preview, dict(level_counts)
+
+
+# 函数：记录否定词精简结果，prefix 为消息前缀（如多站点时的 [站点代码]）
+def log_prune_stats(stats, log=_noop_log, prefix=''):
+    log(f"{prefix}否定词精简：少输出 {stats['合计']} 行否定关键词（重复 {stats['重复']}，"
+        f"被否定词组覆盖 {stats['被词组覆盖']}）", level='summary')
+
+
+# 函数：表头 DataFrame 写出，返回 (输出文件, 内存输出内容（文件名 → bytes，写磁盘时为空）)
+# xlsx 整表一次写出；csv/tsv 用 to_csv 按 max_rows 分卷（同一活动不跨分卷），比 xlsx 快得多
+def write_header_frame(df_header, output_file, in_memory=False, output_format='xlsx', compression=None,
+                       max_rows=BULK_UPLOAD_ROW_LIMIT, log=_noop_log):
+    output_data = {}
+    try:
+        if output_format != 'xlsx':
+            with open_header_writer(output_file, HEADER_COLUMNS, max_rows=max_rows, in_memory=in_memory,
+                                    output_format=output_format, compression=compression) as writer:
+                writer.write_frame(df_header, '广告活动名称')
+            if writer.split_blocks:
+                log(f"警告：{writer.split_blocks} 个活动的行数超过单文件上限 {max_rows}，已跨文件拆分", level='warning')
+            if len(writer.output_files) > 1:
+                log(f"行数超过单文件上限 {max_rows}，已拆分为 {len(writer.output_files)} 个文件: {writer.output_files}",
+                    level='summary')
+            return writer.output_files, writer.output_data, writer.part_row_counts
+        if in_memory:
+            buffer = io.BytesIO()
+            df_header.to_excel(buffer, index=False, engine='openpyxl')
+            output_data[str(output_file)] = buffer.getvalue()
+        else:
+            df_header.to_excel(output_file, index=False, engine='openpyxl')
+    except PermissionError:
+        raise GenerationError(f"错误：无法写入 {output_file}，请确保文件未被占用或有写入权限。")
+    return [str(output_file)], output_data, [len(df_header)]
+
+
+# 函数：每个活动的 RowBlock 展开为行列表
+def iter_campaign_rows(campaign_blocks):
+    for blocks in campaign_blocks:
+        yield [row for block in blocks for row in block.rows()]
+
+
+# 函数：表头 DataFrame 按活动分组为行列表（保持活动首次出现的顺序）
+def iter_frame_campaign_rows(df_header):
+    for _, group in df_header.groupby('广告活动名称', sort=False):
+        yield group.values.tolist()
+
+
+# 函数：检查站点代码、输出格式和压缩方式，不支持时抛出 GenerationError
+def check_options(marketplace=None, output_format='xlsx', compression=None):
+    try:
+        if marketplace is not None:
+            get_marketplace(marketplace)
+        check_output_format(output_format, compression)
+    except ValueError as e:
+        raise GenerationError(str(e))
+
+
+# 函数：从调研 Excel 生成表头 Excel（无界面）
+# streaming=True 时逐个活动流式写入 write_only 工作簿，超过 max_rows 行自动分卷
+# in_memory=True 时不写磁盘，输出内容在 result.output_data 中，output_file 只作为文件名
+# 给出 previous_header（上次生成的完整表头，可为多个分卷）时只输出新增、变化和需要归档的行
+# profile=True 时记录各阶段耗时和逐活动展开耗时，报告在 result.perf；trace_memory=True 时同时记录内存峰值
+# validate=True 时写出前做上传前校验（ASIN 格式、关键词长度、金额、SKU、多余空白），问题表在 result.issues
+# output_format 为 xlsx/csv/tsv（文本为 UTF-8 带 BOM，按 max_rows 分卷），csv/tsv 可用 compression（gzip/zip）压缩；
+# 输出文件名的后缀随格式替换（header-JP.csv.gz 等）
+# progress 为进度回调（当前阶段、已展开/全部活动数，见 _noop_progress），可在回调中抛出 GenerationCancelled 取消
+# prune_negatives=True 时精简每个活动的否定关键词（去重、去掉被否定词组覆盖的），少输出的行数在 result.prune_stats
+# rules 为生成计划的规则配置（默认 plan.DEFAULT_RULES，见 plan.keyword_column_rules）
+# memory_cache=True 时解析结果缓存在进程内（见 load_survey）
+def generate_header(survey_file='survey-JP.xlsx', output_file='header-JP.xlsx', sheet_name=0, log=_noop_log,
+                    check_cross_columns=False, streaming=False, max_rows=BULK_UPLOAD_ROW_LIMIT,
+                    reader='auto', cache_dir=None, in_memory=False, previous_header=None,
+                    profile=False, trace_memory=False, marketplace=None, validate=True,
+                    output_format='xlsx', compression=None, progress=_noop_progress, prune_negatives=False,
+                    rules=None, memory_cache=False):
+    check_options(marketplace, output_format, compression)
+    if output_format != 'xlsx':
+        output_file = output_path(output_file, output_format, compression)
+    perf = PerfRecorder(trace_memory=trace_memory) if profile or trace_memory else None
+    pruner = NegativePruner() if prune_negatives else None
+    try:
+        result = _generate_header(survey_file, output_file, sheet_name, log, check_cross_columns, streaming,
+                                  max_rows, reader, cache_dir, in_memory, previous_header, perf, marketplace,
+                                  validate, output_format, compression, progress, pruner, rules, memory_cache)
+    finally:
+        if perf is not None:
+            perf.finish()
+    if pruner is not None:
+        result.prune_stats = pruner.stats()
+        log_prune_stats(result.prune_stats, log)
+    if perf is not None:
+        perf.level_counts = result.level_counts
+        result.perf = perf.to_dict()
+        stage_times = '，'.join(f"{stage['label']} {stage['wall_s']:.3f}s" for stage in result.perf['stages'])
+        log(f"各阶段耗时: {stage_times}")
+    return result
+
+
+def _generate_header(survey_file, output_file, sheet_name, log, check_cross_columns, streaming, max_rows,
+                     reader, cache_dir, in_memory, previous_header, perf, marketplace, validate, output_format,
+                     compression, progress, pruner, rules, memory_cache):
+    start = time.perf_counter()
+    stage = _reporting_stage(perf.stage if perf is not None else _no_stage, progress)
+    with stage('read'):
+        df_survey = load_survey(survey_file, sheet_name=sheet_name, log=log, reader=reader, cache_dir=cache_dir,
+                                memory_cache=memory_cache)
+    df_previous = None
+    if previous_header is not None:
+        with stage('previous'):
+            try:
+                df_previous = load_previous_header(previous_header)
+            except PreviousHeaderError as e:
+                raise GenerationError(str(e))
+    with stage('plan'):
+        plan = survey_plan(df_survey, log=log, cache_dir=cache_dir, rules=rules)
+    with stage('duplicates'):
+        check_duplicate_keywords(df_survey, plan.keyword_columns, log, check_cross_columns)
+    with stage('categorise'):
+        prepared = prepare_survey(df_survey, log=log, check_duplicates=False, plan=plan)
+    blocks = track_campaigns(iter_campaign_blocks(prepared, log=log, perf=perf, marketplace=marketplace,
+                                                  pruner=pruner),
+                             len(prepared.unique_campaigns), progress)
+
+    df_header = None
+    diff_stats = None
+    if df_previous is not None:
+        with stage('build'):
+            df_full = blocks_to_frame(chain.from_iterable(blocks))
+        with stage('diff'):
+            df_header, diff_stats = diff_header(df_full, df_previous)
+        log(f"增量模式：完整表头 {diff_stats['完整行数']} 行，输出 {len(df_header)} 行"
+            f"（新增 {diff_stats['Create']}，更新 {diff_stats['Update']}，归档 {diff_stats['Archive']}，"
+            f"未变化 {diff_stats['未变化']}）", level='summary')
+
+    if streaming:
+        campaign_rows = iter_frame_campaign_rows(df_header) if df_header is not None else iter_campaign_rows(blocks)
+        # 流式写出时边写边分批校验，校验耗时计入写出阶段
+        issue_parts = []
+        if validate:
+            campaign_rows = validate_stream(campaign_rows, issue_parts, HEADER_COLUMNS)
+        with stage('stream' if df_header is None else 'write'):
+            writer, preview, level_counts = write_header_streaming(
+                campaign_rows, output_file, max_rows=max_rows, log=log, in_memory=in_memory,
+                output_format=output_format, compression=compression,
+            )
+        issues = None
+        if validate:
+            issues = locate_issues(concat_issues(issue_parts), writer.output_files, writer.part_row_counts)
+            log_validation_issues(issues, log)
+        return GenerationResult(
+            survey_file=survey_label(survey_file),
+            output_files=writer.output_files,
+            row_count=writer.row_count,
+            elapsed=time.perf_counter() - start,
+            preview=preview,
+            level_counts=level_counts,
+            output_data=writer.output_data,
+            diff_stats=diff_stats,
+            issues=issues,
+        )
+
+    # 创建 DataFrame
+    if df_header is None:
+        with stage('build'):
+            df_header = blocks_to_frame(chain.from_iterable(blocks))
+    issues = None
+    if validate:
+        with stage('validate'):
+            issues = validate_header(df_header)
+    with stage('write'):
+        output_files, output_data, part_row_counts = write_header_frame(
+            df_header, output_file, in_memory=in_memory, output_format=output_format, compression=compression,
+            max_rows=max_rows, log=log,
+        )
+    if issues is not None:
+        issues = locate_issues(issues, output_files, part_row_counts)
+        log_validation_issues(issues, log)
+
+    log_header_summary(df_header, log=log)
+    return GenerationResult(
+        survey_file=survey_label(survey_file),
+        output_files=output_files,
+        row_count=len(df_header),
+        elapsed=time.perf_counter() - start,
+        df_header=df_header,
+        preview=df_header.head(PREVIEW_ROWS),
+        level_counts=df_header['实体层级'].value_counts().to_dict(),
+        output_data=output_data,
+        diff_stats=diff_stats,
+        issues=issues,
+    )
+
+
+# 函数：并行执行 func(*args)（spawn 启动的进程池，避免在多线程的服务进程如 Streamlit 中 fork），按提交顺序返回结果
+# 只有一个任务或 workers=1 时在当前进程中执行
+def map_in_processes(func, jobs, workers=None):
+    jobs = list(jobs)
+    n_workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if n_workers <= 1:
+        return [func(*args) for args in jobs]
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(func, *args) for args in jobs]
+        return [future.result() for future in futures]
+
+
+# 函数：校验并写出一个表头（可在工作进程中执行），返回 (分卷文件, 内存输出内容, 总行数, 日志消息, 校验问题表)
+def write_header_output(df_header, output_file, streaming, max_rows, in_memory, validate=True, output_format='xlsx',
+                        compression=None):
+    messages = []
+
+    def log(message, level='info'):
+        messages.append((message, level))
+
+    issues = validate_header(df_header) if validate else None
+    if streaming:
+        writer, _, _ = write_header_streaming(
+            iter_frame_campaign_rows(df_header), output_file, max_rows=max_rows, log=log, in_memory=in_memory,
+            output_format=output_format, compression=compression,
+        )
+        output_files, output_data, row_count = writer.output_files, writer.output_data, writer.row_count
+        part_row_counts = writer.part_row_counts
+    else:
+        output_files, output_data, part_row_counts = write_header_frame(
+            df_header, output_file, in_memory=in_memory, output_format=output_format, compression=compression,
+            max_rows=max_rows, log=log,
+        )
+        row_count = len(df_header)
+    if issues is not None:
+        issues = locate_issues(issues, output_files, part_row_counts)
+        log_validation_issues(issues, log)
+    return output_files, output_data, row_count, messages, issues
+
+
+# 函数：一次解析调研文件，为多个站点生成表头（共享解析结果、重复检查和关键词索引），返回 {站点代码: GenerationResult}
+# output_file 为文件名模板，{country} 替换为站点代码；各站点的表头在主进程中构建，校验和 xlsx 写出在多个进程中并行
+def generate_headers(survey_file='survey-JP.xlsx', marketplaces=('JP',), output_file='header-{country}.xlsx',
+                     sheet_name=0, log=_noop_log, check_cross_columns=False, streaming=False,
+                     max_rows=BULK_UPLOAD_ROW_LIMIT, reader='auto', cache_dir=None, in_memory=False, workers=None,
+                     profile=False, trace_memory=False, validate=True, output_format='xlsx', compression=None,
+                     progress=_noop_progress, prune_negatives=False, rules=None, memory_cache=False):
+    start = time.perf_counter()
+    codes = list(dict.fromkeys(marketplaces))
+    if not codes:
+        raise GenerationError("请至少选择一个站点。")
+    for code in codes:
+        check_options(code, output_format, compression)
+    if output_format != 'xlsx':
+        output_file = output_path(output_file, output_format, compression)
+
+    perf = PerfRecorder(trace_memory=trace_memory) if profile or trace_memory else None
+    stage = _reporting_stage(perf.stage if perf is not None else _no_stage, progress)
+    try:
+        with stage('read'):
+            df_survey = load_survey(survey_file, sheet_name=sheet_name, log=log, reader=reader, cache_dir=cache_dir,
+                                    memory_cache=memory_cache)
+        with stage('plan'):
+            plan = survey_plan(df_survey, log=log, cache_dir=cache_dir, rules=rules)
+        with stage('duplicates'):
+            check_duplicate_keywords(df_survey, plan.keyword_columns, log, check_cross_columns)
+        with stage('categorise'):
+            prepared = prepare_survey(df_survey, log=log, check_duplicates=False, plan=plan)
+
+        # 调研中的金额没有货币信息，各站点沿用相同数值，不按汇率换算
+        currencies = marketplace_currencies(codes)
+        if len(currencies) > 1 and prepared.campaign_to_values:
+            log(f"警告：调研中 {len(prepared.campaign_to_values)} 个活动的 CPC、广告组默认竞价和预算按原数值用于全部站点"
+                f"（货币：{'、'.join(currencies)}），不做汇率换算；请确认金额，或按货币分别准备调研后生成", level='warning')
+
+        frames = {}
+        pruners = {code: NegativePruner() if prune_negatives else None for code in codes}
+        campaign_count = len(prepared.unique_campaigns)
+        for position, code in enumerate(codes):
+            # 逐活动的调试日志只记录第一个站点，其余站点规则相同；进度按全部站点的活动数累计
+            with stage('build', code):
+                frames[code] = blocks_to_frame(chain.from_iterable(track_campaigns(iter_campaign_blocks(
+                    prepared, log=log if code == codes[0] else _noop_log, perf=perf, marketplace=code,
+                    pruner=pruners[code],
+                ), campaign_count * len(codes), progress, start=campaign_count * position)))
+
+        output_files = {code: output_file.replace('{country}', code) for code in codes}
+        with stage('write'):
+            outputs = dict(zip(codes, map_in_processes(write_header_output, [
+                (frames[code], output_files[code], streaming, max_rows, in_memory, validate, output_format, compression)
+                for code in codes
+            ], workers)))
+    finally:
+        if perf is not None:
+            perf.finish()
+
+    results = {}
+    for code in codes:
+        df_header = frames[code]
+        files, output_data, row_count, messages, issues = outputs[code]
+        for message, level in messages:
+            log(f"[{code}] {message}" if isinstance(message, str) else message, level=level)
+        log(f"[{code}] 生成完成：{', '.join(files)}，总行数：{row_count}", level='summary')
+        prune_stats = pruners[code].stats() if pruners[code] is not None else None
+        if prune_stats is not None:
+            log_prune_stats(prune_stats, log, prefix=f"[{code}] ")
+        results[code] = GenerationResult(
+            survey_file=survey_label(survey_file),
+            output_files=files,
+            row_count=row_count,
+            elapsed=time.perf_counter() - start,
+            df_header=None if streaming else df_header,
+            preview=df_header.head(PREVIEW_ROWS),
+            level_counts=df_header['实体层级'].value_counts().to_dict(),
+            output_data=output_data,
+            issues=issues,
+            prune_stats=prune_stats,
+        )
+
+    if perf is not None:
+        # 各站点规则相同，行数统计取第一个站点
+        perf.level_counts = results[codes[0]].level_counts
+        report = perf.to_dict()
+        for result in results.values():
+            result.perf = report
+    return results
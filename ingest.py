@@ -0,0 +1,223 @@
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from classifier import ASIN_TOKEN, MATCH_TYPE_TOKENS
+
+# 调研文件读取：只解析生成器用到的列，可选更快的解析引擎，按文件内容 SHA-256 缓存为 parquet
+
+# 缓存格式版本，列选择规则变化时递增使旧缓存失效
+SURVEY_CACHE_VERSION = 3
+
+# 缓存目录的清理：超过 SURVEY_CACHE_MAX_AGE 秒未使用的文件删除，
+# 总大小超过 SURVEY_CACHE_MAX_BYTES 时再从最久未使用的文件开始删除（命中缓存时更新文件的修改时间）
+SURVEY_CACHE_MAX_AGE = 7 * 24 * 3600
+SURVEY_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# 进程内缓存的解析结果个数（load_survey(memory_cache=True)，用于不写磁盘的网页界面内存输出模式），按最近使用淘汰
+SURVEY_MEMORY_ENTRIES = 8
+
+# 活动名称列与活动配置列
+CAMPAIGN_COLUMN = '广告活动名称'
+CAMPAIGN_CONFIG_COLUMNS = ['CPC', 'SKU', '广告组默认竞价', '预算', '广告位', '百分比']
+
+# 关键词列默认按位置取表头的 [9, 19) 列（与原工具的 columns[9:19] 一致，见 plan.DEFAULT_RULES）
+KEYWORD_COLUMN_RANGE = (9, 19)
+
+# 按列名识别关键词列时（规则中选用）：列名以匹配类型词结尾（可带“词”字），且不含以下词（否定精准、宿主额外否精准等否定列）
+KEYWORD_EXCLUDE_WORDS = ['否']
+
+# 否定列
+NEGATIVE_COLUMNS = ['否定精准', '否定词组', '宿主额外否精准', '宿主额外否词组', '否定ASIN']
+
+
+# 函数：调研文件原始字节（支持路径、bytes 和上传文件等类文件对象）
+def read_survey_bytes(survey_file):
+    if isinstance(survey_file, (bytes, bytearray, memoryview)):
+        return bytes(survey_file)
+    if hasattr(survey_file, 'getvalue'):
+        return survey_file.getvalue()
+    if hasattr(survey_file, 'read'):
+        return survey_file.read()
+    with open(survey_file, 'rb') as f:
+        return f.read()
+
+
+# 函数：调研文件的显示名称
+def survey_label(survey_file):
+    if isinstance(survey_file, (str, os.PathLike)):
+        return str(survey_file)
+    return getattr(survey_file, 'name', None) or '<上传文件>'
+
+
+# 函数：文件内容哈希
+def survey_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# 函数：可用的最快解析引擎，安装了 python-calamine 时使用 calamine
+def available_reader():
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return 'openpyxl'
+
+
+# 函数：是否为（正向）ASIN 列
+def is_asin_column(col, asin_token=ASIN_TOKEN):
+    col_lower = str(col).lower()
+    return asin_token in col_lower and '否定' not in col_lower
+
+
+# 函数：按列名判断是否为关键词列（列名以匹配类型词结尾，不是否定列或 ASIN 列；“备注精准说明”等列不算）
+def is_keyword_column(col, match_types=MATCH_TYPE_TOKENS, exclude_words=KEYWORD_EXCLUDE_WORDS,
+                      asin_token=ASIN_TOKEN):
+    col_lower = str(col).lower().strip()
+    if is_asin_column(col, asin_token) or any(word in col_lower for word in exclude_words):
+        return False
+    tokens = [token for tokens in match_types.values() for token in tokens]
+    return re.search(f"(?:{'|'.join(map(re.escape, tokens))})词?\\Z", col_lower) is not None
+
+
+# 函数：从完整表头中选出生成器需要读取的列序号
+# 关键词列读取默认位置的列和按列名识别的列（两种识别方式共用同一份解析缓存）
+def select_survey_columns(all_columns, keyword_range=KEYWORD_COLUMN_RANGE):
+    wanted = {CAMPAIGN_COLUMN, *CAMPAIGN_CONFIG_COLUMNS, *NEGATIVE_COLUMNS}
+    start, stop = keyword_range
+    return [
+        i for i, col in enumerate(all_columns)
+        if col in wanted or start <= i < stop or is_keyword_column(col) or is_asin_column(col)
+    ]
+
+
+# 函数：工作簿中的全部工作表名称（按工作簿顺序）
+def list_sheets(data, reader='auto'):
+    engine = available_reader() if reader == 'auto' else reader
+    with pd.ExcelFile(io.BytesIO(data), engine=engine) as workbook:
+        return list(workbook.sheet_names)
+
+
+# 函数：解析调研工作表，只读取需要的列；完整表头保存在 attrs['survey_columns']
+def read_survey(data, sheet_name=0, reader='auto'):
+    engine = available_reader() if reader == 'auto' else reader
+    header = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name, nrows=0, engine=engine)
+    all_columns = list(header.columns)
+    positions = select_survey_columns(all_columns)
+    df_survey = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name, usecols=positions, engine=engine)
+    # 按完整表头命名，保证重名列的 .1/.2 后缀与整表读取一致
+    df_survey.columns = [all_columns[i] for i in positions]
+    df_survey.attrs['survey_columns'] = all_columns
+    return df_survey
+
+
+# 函数：缓存文件路径（parquet 数据 + json 列信息）
+def _cache_paths(cache_dir, digest, sheet_name):
+    key = f"{digest}-{sheet_name}-v{SURVEY_CACHE_VERSION}"
+    return os.path.join(cache_dir, f"{key}.parquet"), os.path.join(cache_dir, f"{key}.json")
+
+
+# 函数：读取缓存的调研数据，未命中返回 None
+def load_cached_survey(cache_dir, digest, sheet_name=0):
+    data_path, meta_path = _cache_paths(cache_dir, digest, sheet_name)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        df_survey = pd.read_parquet(data_path)
+    except Exception:
+        return None
+    df_survey.columns = meta['columns']
+    df_survey.attrs['survey_columns'] = meta['survey_columns']
+    touch_cache_files(data_path, meta_path)
+    return df_survey
+
+
+_survey_memory = OrderedDict()
+_survey_memory_lock = threading.Lock()
+
+
+# 函数：读取进程内缓存的调研数据（返回副本，调用方可修改），未命中返回 None
+def load_memory_survey(digest, sheet_name=0):
+    key = (digest, sheet_name)
+    with _survey_memory_lock:
+        df_survey = _survey_memory.get(key)
+        if df_survey is None:
+            return None
+        _survey_memory.move_to_end(key)
+    return df_survey.copy()
+
+
+# 函数：写入进程内缓存，超过 entries 个时删除最久未使用的
+def save_memory_survey(digest, df_survey, sheet_name=0, entries=SURVEY_MEMORY_ENTRIES):
+    with _survey_memory_lock:
+        _survey_memory[(digest, sheet_name)] = df_survey.copy()
+        _survey_memory.move_to_end((digest, sheet_name))
+        while len(_survey_memory) > entries:
+            _survey_memory.popitem(last=False)
+
+
+# 函数：写入缓存；无法写入或序列化（如同列混合数字和文本）时抛出原异常，不留下临时文件
+def save_cached_survey(cache_dir, digest, df_survey, sheet_name=0):
+    data_path, meta_path = _cache_paths(cache_dir, digest, sheet_name)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    try:
+        # parquet 只接受字符串列名，原列名保存在 json 中
+        df_survey.set_axis([str(col) for col in df_survey.columns], axis=1).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, data_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'columns': list(df_survey.columns),
+            'survey_columns': df_survey.attrs.get('survey_columns', list(df_survey.columns)),
+        }, f, ensure_ascii=False, default=str)
+
+
+# 函数：命中缓存时更新文件的修改时间（清理时按修改时间判断最近使用）
+def touch_cache_files(*paths):
+    for path in paths:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+# 函数：清理缓存目录（解析缓存和计划缓存），返回删除的文件数
+# 先删除超过 max_age 秒未使用的文件，总大小仍超过 max_bytes 时从最久未使用的文件开始删除
+def evict_cache(cache_dir, max_bytes=SURVEY_CACHE_MAX_BYTES, max_age=SURVEY_CACHE_MAX_AGE, now=None):
+    now = time.time() if now is None else now
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.is_file()]
+    except OSError:
+        return 0
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # 其他进程已删除或正在使用
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,173 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import GenerationCancelled, GenerationError
+
+# 后台任务：生成在固定数量的工作线程中执行，等待队列有上限；任务报告进度（当前阶段、已展开/全部活动数），
+# 可取消，完成的结果保留到过期，期间同一请求（相同的键）直接返回已有任务，不再重新生成
+
+# 同时执行的任务数与排队上限
+JOB_WORKERS = 2
+JOB_QUEUE_SIZE = 8
+
+# 完成的任务最多保留的个数与过期时间（秒）
+JOB_RESULT_ENTRIES = 16
+JOB_RESULT_TTL = 3600
+
+# 任务状态
+JOB_STATUS_LABELS = {
+    'queued': '排队中',
+    'running': '生成中',
+    'done': '已完成',
+    'failed': '出错',
+    'cancelled': '已取消',
+}
+
+# 未结束的任务状态
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobQueueFull(GenerationError):
+    # 排队的任务已达上限
+    pass
+
+
+class Job:
+    # 一个后台生成任务：func(*args, progress=job.progress) 在工作线程中执行，返回值保存在 result。
+    # 取消只设置标志，生成在下一次报告进度（每个活动、每个阶段）时抛出 GenerationCancelled 停止
+
+    def __init__(self, job_id, key, label, func, args):
+        self.id = job_id
+        self.key = key
+        self.label = label
+        self.func = func
+        self.args = args
+        self.status = 'queued'
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    # 函数：进度回调（见 engine._noop_progress），检查到取消请求时抛出 GenerationCancelled
+    def progress(self, stage=None, done=None, total=None):
+        if self._cancel_event.is_set():
+            raise GenerationCancelled("生成已取消")
+        if stage is not None:
+            self.stage = stage
+        if total is not None:
+            self.done, self.total = done, total
+
+    # 函数：请求取消；排队中的任务直接标记为已取消
+    def cancel(self):
+        with self._lock:
+            self._cancel_event.set()
+            if self.status == 'queued':
+                self._finish('cancelled')
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    # 函数：已展开活动的比例，还不知道活动总数时为 None
+    @property
+    def fraction(self):
+        return min(self.done / self.total, 1.0) if self.total else None
+
+    # 函数：在工作线程中执行
+    def run(self):
+        with self._lock:
+            if self.status != 'queued':
+                return
+            self.status = 'running'
+            self.started = time.time()
+        try:
+            self.result = self.func(*self.args, progress=self.progress)
+        except GenerationCancelled:
+            self._finish('cancelled')
+        except Exception as e:
+            self.error = f"生成时出错：{e}"
+            self._finish('failed')
+        else:
+            # 生成函数自行捕获 GenerationError 时，取消也可能以普通结果返回
+            self._finish('cancelled' if self.cancel_requested else 'done')
+        finally:
+            # 参数中可能有上传文件等较大对象，结束后不再保留
+            self.args = ()
+
+    # 函数：记录结束状态
+    def _finish(self, status):
+        self.status = status
+        self.finished = time.time()
+
+
+class JobManager:
+    # 后台任务管理：workers 个工作线程，最多 queue_size 个任务排队；完成的任务按 key 保留 ttl 秒（最多 max_entries 个）。
+    # 工作线程只用于限制同时生成的任务数和报告进度；多站点、多工作表的写出仍在各自的进程池中并行
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, max_entries=JOB_RESULT_ENTRIES,
+                 ttl=JOB_RESULT_TTL):
+        self.queue_size = queue_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='header-job')
+        self.workers = workers
+
+    # 函数：提交任务，返回 Job；同一 key 已有未结束或已完成的任务时直接返回该任务
+    # restart=True 时已取消或出错的任务重新提交；排队已满时抛出 JobQueueFull
+    def submit(self, key, label, func, *args, restart=False):
+        with self._lock:
+            self._expire()
+            job = self.jobs.get(key)
+            if job is not None and (job.status in ('queued', 'running', 'done') or not restart):
+                return job
+            waiting = sum(1 for item in self.jobs.values() if item.active) - self.workers
+            if waiting >= self.queue_size:
+                raise JobQueueFull(f"当前排队的生成任务已达上限（{self.queue_size} 个），请稍后再试。")
+            job = Job(next(self._ids), key, label, func, args)
+            self.jobs[key] = job
+            self._executor.submit(job.run)
+            return job
+
+    # 函数：查找 key 对应的任务，不存在或已过期时返回 None
+    def get(self, key):
+        with self._lock:
+            self._expire()
+            return self.jobs.get(key)
+
+    # 函数：任务前面还在排队的任务数
+    def queue_position(self, job):
+        with self._lock:
+            return sum(1 for item in self.jobs.values() if item.status == 'queued' and item.id < job.id)
+
+    # 函数：删除过期和超出个数的已结束任务（未结束的任务不删除）
+    def _expire(self):
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if not job.active), key=lambda job: job.finished)
+        stale = [job for job in finished if now - job.finished > self.ttl]
+        fresh = [job for job in finished if now - job.finished <= self.ttl]
+        stale += fresh[:max(len(fresh) - self.max_entries, 0)]
+        for job in stale:
+            if self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+
+    # 函数：停止工作线程（取消所有未结束的任务）
+    def shutdown(self):
+        with self._lock:
+            for job in self.jobs.values():
+                job.cancel()
+        self._executor.shutdown(wait=True)
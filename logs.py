@@ -0,0 +1,80 @@
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+# 分级日志收集：生成过程中只在内存中缓冲，结束后一次性展示或导出
+
+# 日志级别，从概要到明细
+LOG_LEVELS = ['summary', 'warning', 'info', 'debug']
+
+# 级别显示名称
+LOG_LEVEL_LABELS = {
+    'summary': '概要',
+    'warning': '警告',
+    'info': '信息',
+    'debug': '调试',
+}
+
+
+@dataclass
+class LogRecord:
+    elapsed: float
+    level: str
+    message: str
+    # 表格类日志（如重复关键词报告）
+    table: pd.DataFrame = None
+
+
+class LogCollector:
+    # 日志收集器：可直接作为引擎的 log 回调，低于 min_level 的消息直接丢弃
+
+    def __init__(self, min_level='debug'):
+        self.records = []
+        self.max_rank = LOG_LEVELS.index(min_level)
+        self._start = time.perf_counter()
+
+    def __call__(self, message, level='info'):
+        rank = LOG_LEVELS.index(level) if level in LOG_LEVELS else LOG_LEVELS.index('info')
+        if rank > self.max_rank:
+            return
+        table = None
+        if isinstance(message, pd.DataFrame):
+            table = message
+            message = f"表格（{len(table)} 行）"
+        self.records.append(LogRecord(time.perf_counter() - self._start, LOG_LEVELS[rank], str(message), table))
+
+    def __len__(self):
+        return len(self.records)
+
+    # 函数：指定级别的日志记录
+    def filter(self, levels=None, keyword=''):
+        return [
+            record for record in self.records
+            if (levels is None or record.level in levels) and (not keyword or keyword in record.message)
+        ]
+
+    # 函数：各级别消息数量
+    def counts(self):
+        counts = {level: 0 for level in LOG_LEVELS}
+        for record in self.records:
+            counts[record.level] += 1
+        return counts
+
+    # 函数：日志表（时间、级别、消息）
+    def to_frame(self, levels=None, keyword=''):
+        records = self.filter(levels, keyword)
+        return pd.DataFrame({
+            '时间(s)': [round(record.elapsed, 3) for record in records],
+            '级别': [LOG_LEVEL_LABELS[record.level] for record in records],
+            '消息': [record.message for record in records],
+        })
+
+    # 函数：完整日志文本，表格类日志展开为文本
+    def to_text(self):
+        lines = []
+        for record in self.records:
+            lines.append(f"[{record.elapsed:8.3f}s] [{LOG_LEVEL_LABELS[record.level]}] {record.message}")
+            if record.table is not None:
+                lines.append(record.table.to_string(index=False))
+        return '\n'.join(lines) + '\n'
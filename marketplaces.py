@@ -0,0 +1,69 @@
+import math
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+# 站点配置：各站点的默认每日预算、广告组默认竞价、CPC 和金额小数位
+# 默认值只用于调研中没有配置的活动。A EU 沿用工具原有的默认值（12 / 0.6 / 0.5，不做取整）；
+# 欧元、英镑、美元站点使用相同数值；其他货币由欧元默认值按近似汇率（见各行注释）换算后取为该货币的整齐数值，
+# 不是亚马逊公布的数值，使用前请按实际投放调整。日元没有小数，JP 的金额取整到 1 日元
+
+
+@dataclass(frozen=True)
+class Marketplace:
+    code: str
+    name: str
+    currency: str
+    daily_budget: float
+    group_bid: float
+    cpc: float
+    # 金额保留的小数位，None 表示不取整
+    decimals: int = None
+
+    # 函数：按站点货币精度四舍五入金额（半数进位：2.5 → 3，不按 round() 的银行家舍入），空值、无穷和文本原样返回
+    def round_amount(self, value):
+        if self.decimals is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value
+        if isinstance(value, float) and not math.isfinite(value):
+            return value
+        rounded = Decimal(str(value)).quantize(Decimal(1).scaleb(-self.decimals), rounding=ROUND_HALF_UP)
+        return int(rounded) if self.decimals == 0 else float(rounded)
+
+
+MARKETPLACES = {
+    # 1 EUR ≈ 160 JPY
+    'JP': Marketplace('JP', '日本', 'JPY', 2000, 100, 80, 0),
+    'A EU': Marketplace('A EU', '欧洲（统一）', 'EUR', 12, 0.6, 0.5),
+    'UK': Marketplace('UK', '英国', 'GBP', 12, 0.6, 0.5, 2),
+    'DE': Marketplace('DE', '德国', 'EUR', 12, 0.6, 0.5, 2),
+    'FR': Marketplace('FR', '法国', 'EUR', 12, 0.6, 0.5, 2),
+    'IT': Marketplace('IT', '意大利', 'EUR', 12, 0.6, 0.5, 2),
+    'ES': Marketplace('ES', '西班牙', 'EUR', 12, 0.6, 0.5, 2),
+    'NL': Marketplace('NL', '荷兰', 'EUR', 12, 0.6, 0.5, 2),
+    # 1 EUR ≈ 11 SEK
+    'SE': Marketplace('SE', '瑞典', 'SEK', 130, 6.5, 5.5, 2),
+    # 1 EUR ≈ 4.3 PLN
+    'PL': Marketplace('PL', '波兰', 'PLN', 50, 2.6, 2.2, 2),
+    'US': Marketplace('US', '美国', 'USD', 12, 0.6, 0.5, 2),
+    # 1 EUR ≈ 1.4 CAD
+    'CA': Marketplace('CA', '加拿大', 'CAD', 16, 0.8, 0.7, 2),
+    # 1 EUR ≈ 18 MXN
+    'MX': Marketplace('MX', '墨西哥', 'MXN', 220, 11, 9, 2),
+}
+
+# 默认站点（网页界面和命令行 --country 的默认值）
+DEFAULT_MARKETPLACE = 'JP'
+
+
+# 函数：站点列表涉及的货币（按站点顺序去重）
+def marketplace_currencies(codes):
+    return list(dict.fromkeys(get_marketplace(code).currency for code in codes))
+
+
+# 函数：按站点代码取配置，未知站点抛出 ValueError
+def get_marketplace(code):
+    if isinstance(code, Marketplace):
+        return code
+    try:
+        return MARKETPLACES[code]
+    except KeyError:
+        raise ValueError(f"未知站点：{code}（可选：{', '.join(MARKETPLACES)}）")
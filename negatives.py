@@ -0,0 +1,93 @@
+from collections import Counter
+
+# 否定关键词精简：同一活动内的否定词来自多个列表（全局否定、同类精准词、交叉否定、宿主额外否定），大量重叠。
+# 精简时去掉重复的否定词，以及已被同活动否定词组覆盖的否定词——否定词组拦截按词连续包含该词组的搜索词，
+# 因此包含某个否定词组的否定精准词（或更长的否定词组）不会再多拦截任何搜索词
+
+# 否定匹配类型
+NEGATIVE_EXACT = '否定精准匹配'
+NEGATIVE_PHRASE = '否定词组'
+
+# 精简统计的键
+PRUNE_STAT_KEYS = ['重复', '被词组覆盖']
+
+
+# 函数：匹配用的词序列：不区分大小写，按空白分词
+def negative_tokens(keyword):
+    return tuple(str(keyword).casefold().split())
+
+
+class _PhraseCoverage:
+    # 一组否定词组的覆盖判断；同一组词组在很多活动中重复出现，判断结果按 (否定词, 匹配类型) 缓存
+
+    def __init__(self, phrases):
+        self.phrases = {negative_tokens(phrase) for phrase in phrases} - {()}
+        self.max_words = max(map(len, self.phrases), default=0)
+        self.memo = {}
+
+    # 函数：tokens 是否按词连续包含某个否定词组；否定词组只与更短的词组比较（相同的词组按重复处理）
+    def covers(self, tokens, match_type):
+        longest = min(self.max_words, len(tokens) - (1 if match_type == NEGATIVE_PHRASE else 0))
+        return any(
+            tokens[start:start + words] in self.phrases
+            for words in range(1, longest + 1)
+            for start in range(len(tokens) - words + 1)
+        )
+
+
+class NegativePruner:
+    # 逐个活动精简否定关键词列表，saved 累计少输出的行数（按 PRUNE_STAT_KEYS 分类）
+
+    def __init__(self):
+        self.saved = Counter()
+        self._coverages = {}
+        # 否定词 → 词序列（全局否定词在每个活动中重复出现，只分词一次）
+        self._tokens = {}
+
+    # 函数：精简一个活动的否定词，negatives 为 [(关键词列表, 匹配类型)]（按输出顺序），返回同样结构的列表
+    # 保留每个否定词第一次出现的写法和位置
+    def prune(self, negatives):
+        phrases = tuple(keyword for keywords, match_type in negatives if match_type == NEGATIVE_PHRASE
+                        for keyword in keywords)
+        coverage = self._coverages.get(phrases)
+        if coverage is None:
+            coverage = self._coverages[phrases] = _PhraseCoverage(phrases)
+        all_tokens = self._tokens
+        memo = coverage.memo
+
+        seen = set()
+        pruned = []
+        for keywords, match_type in negatives:
+            kept = []
+            for keyword in keywords:
+                tokens = all_tokens.get(keyword)
+                if tokens is None:
+                    tokens = all_tokens[keyword] = negative_tokens(keyword)
+                key = (tokens, match_type)
+                if key in seen:
+                    self.saved['重复'] += 1
+                    continue
+                covered = memo.get(key)
+                if covered is None:
+                    covered = memo[key] = coverage.covers(tokens, match_type)
+                if covered:
+                    self.saved['被词组覆盖'] += 1
+                else:
+                    seen.add(key)
+                    kept.append(keyword)
+            pruned.append((kept, match_type))
+        return pruned
+
+    # 函数：精简统计（各类少输出的行数和合计）
+    def stats(self):
+        stats = {key: self.saved[key] for key in PRUNE_STAT_KEYS}
+        stats['合计'] = sum(stats.values())
+        return stats
+
+
+# 函数：合并多份精简统计（多工作表合并输出时使用），没有统计时返回 None
+def merge_prune_stats(stats_list):
+    stats_list = [stats for stats in stats_list if stats]
+    if not stats_list:
+        return None
+    return {key: sum(stats[key] for stats in stats_list) for key in [*PRUNE_STAT_KEYS, '合计']}
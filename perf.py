@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import pandas as pd
+
+# 性能记录：各阶段墙钟/CPU 时间、可选的内存峰值（tracemalloc）、各实体层级行数和逐活动展开耗时
+
+# 阶段显示名称
+STAGE_LABELS = {
+    'read': '读取调研文件',
+    'previous': '读取上次表头',
+    'plan': '生成计划',
+    'duplicates': '重复检查',
+    'categorise': '分类与索引',
+    'build': '行构建',
+    'diff': '增量比较',
+    'validate': '上传前校验',
+    'write': '写出',
+    'stream': '行构建 + 流式写出',
+    'render': '页面渲染',
+}
+
+# 单独统计行数的实体层级
+COUNTED_LEVELS = ['关键词', '否定关键词', '商品定向']
+
+# 报告中保留的最慢活动数
+SLOWEST_CAMPAIGNS = 10
+
+# tracemalloc 是进程级的：同时记录内存的多个记录器（如同时执行的后台任务）共用一次跟踪，
+# 由最后一个结束的记录器停止；此时各阶段峰值也包含其他任务的分配
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+# 函数：开始使用内存跟踪，尚未跟踪时开启
+def _acquire_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_users += 1
+
+
+# 函数：结束使用内存跟踪，最后一个使用者停止由本模块开启的跟踪
+def _release_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+@dataclass
+class StageTiming:
+    name: str
+    wall: float
+    cpu: float
+    # 阶段内 Python 内存分配峰值（字节），未开启内存跟踪时为 None
+    peak_memory: int = None
+    # 阶段说明（如多站点生成时的站点代码）
+    detail: str = None
+
+    @property
+    def label(self):
+        label = STAGE_LABELS.get(self.name, self.name)
+        return f"{label}（{self.detail}）" if self.detail else label
+
+
+class PerfRecorder:
+    # 性能记录器：引擎在各阶段调用 stage()，逐活动调用 record_campaign()。
+    # trace_memory=True 时用 tracemalloc 记录各阶段内存峰值（会明显拖慢 xlsx 写出）。
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.campaign_times = []
+        self.level_counts = {}
+        self._tracing = False
+
+    # 函数：记录一个阶段的耗时（上下文管理器）
+    @contextmanager
+    def stage(self, name, detail=None):
+        if self.trace_memory:
+            if not self._tracing:
+                _acquire_tracing()
+                self._tracing = True
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory and tracemalloc.is_tracing() else None
+            self.stages.append(StageTiming(
+                name, time.perf_counter() - wall_start, time.process_time() - cpu_start, peak, detail
+            ))
+
+    # 函数：记录单个活动的展开耗时和行数
+    def record_campaign(self, campaign_name, seconds, rows):
+        self.campaign_times.append((str(campaign_name), seconds, rows))
+
+    # 函数：结束记录，不再使用内存跟踪（没有其他记录器使用时停止跟踪）
+    def finish(self):
+        if self._tracing:
+            _release_tracing()
+            self._tracing = False
+
+    # 函数：可序列化的性能报告（缓存、跨进程传递和导出 JSON 用）
+    def to_dict(self):
+        stages = [{
+            'stage': timing.name,
+            'label': timing.label,
+            'wall_s': round(timing.wall, 4),
+            'cpu_s': round(timing.cpu, 4),
+            'peak_mb': None if timing.peak_memory is None else round(timing.peak_memory / 2 ** 20, 2),
+        } for timing in self.stages]
+        peaks = [stage['peak_mb'] for stage in stages if stage['peak_mb'] is not None]
+
+        seconds = [item[1] for item in self.campaign_times]
+        slowest = sorted(self.campaign_times, key=lambda item: item[1], reverse=True)[:SLOWEST_CAMPAIGNS]
+        return {
+            'stages': stages,
+            'total_wall_s': round(sum(timing.wall for timing in self.stages), 4),
+            'total_cpu_s': round(sum(timing.cpu for timing in self.stages), 4),
+            'peak_mb': max(peaks) if peaks else None,
+            'level_counts': dict(self.level_counts),
+            'row_counts': {level: int(self.level_counts.get(level, 0)) for level in COUNTED_LEVELS},
+            'campaigns': {
+                'count': len(seconds),
+                'total_s': round(sum(seconds), 4),
+                'mean_ms': round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0,
+                'max_ms': round(max(seconds) * 1000, 3) if seconds else 0,
+                'slowest': [
+                    {'campaign': name, 'ms': round(sec * 1000, 3), 'rows': rows} for name, sec, rows in slowest
+                ],
+            },
+        }
+
+
+# 函数：性能报告的阶段表（界面展示用）
+def stage_frame(report):
+    return pd.DataFrame({
+        '阶段': [stage['label'] for stage in report['stages']],
+        '墙钟时间(s)': [stage['wall_s'] for stage in report['stages']],
+        'CPU 时间(s)': [stage['cpu_s'] for stage in report['stages']],
+        '内存峰值(MB)': [stage['peak_mb'] for stage in report['stages']],
+    })
+
+
+# 函数：最慢活动表（界面展示用）
+def slowest_campaigns_frame(report):
+    slowest = report['campaigns']['slowest']
+    return pd.DataFrame({
+        '活动': [item['campaign'] for item in slowest],
+        '展开耗时(ms)': [item['ms'] for item in slowest],
+        '行数': [item['rows'] for item in slowest],
+    })
+
+
+# 函数：性能报告 JSON 文本
+def report_json(report):
+    return json.dumps(report, ensure_ascii=False, indent=2)
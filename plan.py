@@ -0,0 +1,332 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from classifier import ASIN_TOKEN, CASE_WORDS, MATCH_TYPE_TOKENS, SUZHU_WORDS, CampaignClassifier
+from ingest import (
+    CAMPAIGN_COLUMN, CAMPAIGN_CONFIG_COLUMNS, KEYWORD_COLUMN_RANGE, KEYWORD_EXCLUDE_WORDS, NEGATIVE_COLUMNS,
+    is_asin_column, is_keyword_column, touch_cache_files,
+)
+from negatives import NEGATIVE_EXACT, NEGATIVE_PHRASE
+
+# 生成计划：由规则配置和调研的完整表头一次性解析出列角色（关键词列的类别和匹配类型、ASIN 列、否定列、活动配置列）、
+# 关键词类别、交叉否定规则和各匹配类型的实体模板，可序列化为 JSON。
+# 计划按（规则 + 表头）的哈希缓存：同一模板的调研直接执行已有计划，不再推断列角色；
+# 关键词列默认与原工具一样按位置取（columns[9:19]），规则中可改为按列名识别，此时列的位置变化不影响生成结果
+
+# 计划格式版本，计划结构或推断方式变化时递增使旧缓存失效
+PLAN_VERSION = 2
+
+# 关键词列的识别方式：'position' 按位置，'match' 按列名
+KEYWORD_COLUMN_MODES = ['position', 'match']
+
+# 关键词类别来自以这些后缀结尾的列名（与原工具一致，只认中文匹配类型词；ASIN 列去掉 ASIN 关键词）
+CATEGORY_SUFFIXES = ['精准词', '广泛词', '精准', '广泛']
+
+# 内存中保留的计划个数
+PLAN_CACHE_ENTRIES = 64
+
+# 否定词来源（与 NEGATIVE_COLUMNS 一一对应）
+NEGATIVE_SOURCES = ['neg_exact', 'neg_phrase', 'suzhu_extra_neg_exact', 'suzhu_extra_neg_phrase', 'neg_asin']
+
+# 模板中不来自否定列的否定词来源：同类精准词、交叉否定词
+DERIVED_NEGATIVE_SOURCES = ['same_category_exact', 'cross']
+
+# 默认规则配置
+DEFAULT_RULES = {
+    'campaign_column': CAMPAIGN_COLUMN,
+    'config_columns': CAMPAIGN_CONFIG_COLUMNS,
+    # 否定词来源 → 否定列
+    'negative_columns': dict(zip(NEGATIVE_SOURCES, NEGATIVE_COLUMNS)),
+    # 匹配类型词：列名或活动名称包含即为该匹配类型（同时包含时精准优先）
+    'match_types': MATCH_TYPE_TOKENS,
+    # 商品定向活动关键词，列名包含即为 ASIN 列（活动名称与列名完全一致时使用）
+    'asin_token': ASIN_TOKEN,
+    # 关键词列：'position' 取表头中 [start, stop) 位置的列（默认与原工具的 columns[9:19] 一致）；
+    # 'match' 取列名以匹配类型词结尾、不含 keyword_exclude_words 中的词的列（见 ingest.is_keyword_column），
+    # 可用 keyword_column_rules('match') 得到按列名识别的规则，作为 generate_header 等的 rules 参数。
+    # 调研只读取默认位置和按列名识别的关键词列（见 ingest.select_survey_columns）
+    'keyword_columns': {'mode': 'position', 'start': KEYWORD_COLUMN_RANGE[0], 'stop': KEYWORD_COLUMN_RANGE[1]},
+    # 按列名识别关键词列时，列名同时含这些词的列不是关键词列
+    'keyword_exclude_words': KEYWORD_EXCLUDE_WORDS,
+    # 关键词类别：表头中以这些后缀结尾的列名，后缀前的部分按分隔符拆分
+    'category_suffixes': CATEGORY_SUFFIXES,
+    # 除列名外始终识别的关键词类别
+    'known_categories': [*SUZHU_WORDS, *CASE_WORDS],
+    # 交叉否定分组（按优先顺序）：分组词，以及该组活动否定哪一组的精准关键词列
+    'cross_negative_groups': {
+        'suzhu': {'words': SUZHU_WORDS, 'negates': 'case'},
+        'case': {'words': CASE_WORDS, 'negates': 'suzhu'},
+    },
+    # 各模板在广告活动、竞价调整、广告组、商品广告之后输出的实体；否定关键词按 negatives 顺序输出，
+    # group 限定只用于该交叉否定分组的活动。精准/广泛按活动的匹配类型选用，ASIN 用于名称含 asin_token 的活动
+    'templates': {
+        '精准': {
+            'entities': ['关键词', '否定关键词'],
+            'negatives': [
+                {'source': 'neg_exact', 'match_type': NEGATIVE_EXACT},
+                {'source': 'neg_phrase', 'match_type': NEGATIVE_PHRASE},
+                {'source': 'cross', 'match_type': NEGATIVE_EXACT},
+            ],
+        },
+        '广泛': {
+            'entities': ['关键词', '否定关键词'],
+            'negatives': [
+                {'source': 'neg_exact', 'match_type': NEGATIVE_EXACT},
+                {'source': 'neg_phrase', 'match_type': NEGATIVE_PHRASE},
+                {'source': 'same_category_exact', 'match_type': NEGATIVE_EXACT},
+                {'source': 'suzhu_extra_neg_exact', 'match_type': NEGATIVE_EXACT, 'group': 'suzhu'},
+                {'source': 'suzhu_extra_neg_phrase', 'match_type': NEGATIVE_PHRASE, 'group': 'suzhu'},
+                {'source': 'cross', 'match_type': NEGATIVE_EXACT},
+            ],
+        },
+        'ASIN': {'entities': ['商品定向', '否定商品定向']},
+    },
+}
+
+# 模板中可用的实体
+TEMPLATE_ENTITIES = ['关键词', '否定关键词', '商品定向', '否定商品定向']
+
+# 类别词之间的分隔符
+_CATEGORY_SEPARATORS = re.compile(r'[/\-_\s\.]')
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+@dataclass
+class GenerationPlan:
+    # 一个表头模板的生成计划，字段均可直接序列化为 JSON（to_dict / from_dict）
+    signature: str
+    campaign_column: str
+    # 调研中存在 / 缺少的活动配置列（缺少任一列时全部活动使用默认值）
+    config_columns: list
+    missing_config_columns: list
+    # 关键词列（按表头顺序）及每列命中的类别和匹配类型：列名 → {'categories': [...], 'match_types': [...]}
+    keyword_columns: list
+    keyword_roles: dict
+    # 关键词类别（排序后，分类结果的类别顺序与此一致）
+    categories: list
+    # ASIN 活动名称 → ASIN 列（同名时取第一个）
+    asin_columns: dict
+    # 否定词来源 → 否定列（只含调研中存在的列）
+    negative_columns: dict
+    # 交叉否定分组 → 该组活动否定的精准关键词列
+    cross_negatives: dict
+    # 活动分类规则：匹配类型词、ASIN 关键词、交叉否定分组词
+    match_types: dict
+    asin_token: str
+    group_words: dict
+    templates: dict
+
+    # 函数：按计划的分类规则构建活动名称分类器
+    def classifier(self):
+        return CampaignClassifier(self.categories, self.match_types, self.asin_token, self.group_words)
+
+    # 函数：活动适用的模板名称（精准/广泛按匹配类型，ASIN 活动另加 ASIN 模板）
+    def campaign_templates(self, campaign_class):
+        names = [campaign_class.match_type] if campaign_class.match_type in self.match_types else []
+        if campaign_class.is_asin:
+            names.append('ASIN')
+        return [name for name in names if name in self.templates]
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+# 函数：计划的缓存键：计划版本、规则和完整表头的 SHA-256
+def plan_signature(columns, rules=DEFAULT_RULES):
+    payload = json.dumps({'version': PLAN_VERSION, 'rules': rules, 'columns': list(columns)},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# 函数：列名中的关键词类别：去掉类别后缀（精准词、广泛 等）或 ASIN 关键词，按分隔符拆分，只保留多于一个字的词
+# 列名含类别后缀但不以其结尾（如“备注精准说明”）时没有类别，也不再按 ASIN 列处理
+def column_categories(col, suffixes=CATEGORY_SUFFIXES, asin_token=ASIN_TOKEN):
+    col_lower = str(col).lower()
+    if any(suffix in col_lower for suffix in suffixes):
+        suffix = next((suffix for suffix in suffixes if col_lower.endswith(suffix)), None)
+        if suffix is None:
+            return []
+        prefix = col_lower[:-len(suffix)].strip()
+    elif is_asin_column(col, asin_token):
+        prefix = col_lower.replace(asin_token, '').strip()
+    else:
+        return []
+    return [part for part in _CATEGORY_SEPARATORS.split(prefix) if len(part) > 1]
+
+
+# 函数：按规则选出关键词列（按表头顺序）
+def select_keyword_columns(columns, rules=DEFAULT_RULES):
+    spec = rules['keyword_columns']
+    if spec['mode'] == 'position':
+        return list(columns[spec['start']:spec['stop']])
+    return [
+        col for col in columns
+        if is_keyword_column(col, rules['match_types'], rules['keyword_exclude_words'], rules['asin_token'])
+    ]
+
+
+# 函数：改用指定关键词列识别方式（KEYWORD_COLUMN_MODES 之一）的规则，其余规则不变；不支持时抛出 ValueError
+def keyword_column_rules(mode, rules=DEFAULT_RULES):
+    if mode not in KEYWORD_COLUMN_MODES:
+        raise ValueError(f"关键词列识别方式 {mode} 不支持（可选：{KEYWORD_COLUMN_MODES}）")
+    if rules['keyword_columns']['mode'] == mode:
+        return rules
+    spec = DEFAULT_RULES['keyword_columns'] if mode == 'position' else {'mode': 'match'}
+    return {**rules, 'keyword_columns': spec}
+
+
+# 函数：检查规则中的模板，引用了不存在的实体、否定词来源或分组时抛出 ValueError
+def check_rules(rules):
+    spec = rules['keyword_columns']
+    if spec.get('mode') not in KEYWORD_COLUMN_MODES:
+        raise ValueError(f"规则配置错误：关键词列识别方式 {spec.get('mode')} 不支持（可选：{KEYWORD_COLUMN_MODES}）")
+    if spec['mode'] == 'position' and not (isinstance(spec.get('start'), int) and isinstance(spec.get('stop'), int)):
+        raise ValueError("规则配置错误：按位置识别关键词列时需要整数 start 和 stop")
+    sources = {*rules['negative_columns'], *DERIVED_NEGATIVE_SOURCES}
+    groups = rules['cross_negative_groups']
+    for group, spec in groups.items():
+        if spec['negates'] not in groups:
+            raise ValueError(f"规则配置错误：交叉否定分组 {group} 否定的分组 {spec['negates']} 不存在")
+    for name, template in rules['templates'].items():
+        unknown = [entity for entity in template.get('entities', []) if entity not in TEMPLATE_ENTITIES]
+        if unknown:
+            raise ValueError(f"规则配置错误：模板 {name} 中的实体 {unknown} 不支持（可选：{TEMPLATE_ENTITIES}）")
+        for negative in template.get('negatives', []):
+            if negative['source'] not in sources:
+                raise ValueError(f"规则配置错误：模板 {name} 中的否定词来源 {negative['source']} 不存在")
+            if negative.get('group') is not None and negative['group'] not in groups:
+                raise ValueError(f"规则配置错误：模板 {name} 中的分组 {negative['group']} 不存在")
+
+
+# 函数：由完整表头和规则推断生成计划
+def compile_plan(columns, rules=DEFAULT_RULES):
+    check_rules(rules)
+    columns = list(columns)
+    match_types = rules['match_types']
+    asin_token = rules['asin_token']
+    present = set(columns)
+
+    keyword_columns = select_keyword_columns(columns, rules)
+    asin_columns = {}
+    for col in columns:
+        if is_asin_column(col, asin_token):
+            asin_columns.setdefault(str(col), col)
+
+    # 类别从整个表头的列名中提取（与原工具一致）
+    categories = set(rules['known_categories'])
+    for col in columns:
+        categories.update(column_categories(col, rules['category_suffixes'], asin_token))
+    categories.discard('')
+
+    group_words = {group: list(spec['words']) for group, spec in rules['cross_negative_groups'].items()}
+    plan = GenerationPlan(
+        signature=plan_signature(columns, rules),
+        campaign_column=rules['campaign_column'],
+        config_columns=[col for col in rules['config_columns'] if col in present],
+        missing_config_columns=[col for col in rules['config_columns'] if col not in present],
+        keyword_columns=keyword_columns,
+        keyword_roles={},
+        categories=sorted(categories),
+        asin_columns=asin_columns,
+        negative_columns={source: col for source, col in rules['negative_columns'].items() if col in present},
+        cross_negatives={},
+        match_types={match_type: list(tokens) for match_type, tokens in match_types.items()},
+        asin_token=asin_token,
+        group_words=group_words,
+        templates=rules['templates'],
+    )
+
+    # 关键词列名与活动名称使用同一个分类器
+    column_classes = dict(zip(keyword_columns, plan.classifier().classify_all(keyword_columns)))
+    for col, column_class in column_classes.items():
+        plan.keyword_roles[col] = {
+            'categories': list(column_class.categories),
+            'match_types': [
+                match_type for match_type, tokens in match_types.items() if not column_class.terms.isdisjoint(tokens)
+            ],
+        }
+    # 交叉否定：每组活动否定含另一组分组词的精准关键词列
+    for group, spec in rules['cross_negative_groups'].items():
+        negated = group_words[spec['negates']]
+        plan.cross_negatives[group] = [
+            col for col in keyword_columns
+            if '精准' in plan.keyword_roles[col]['match_types'] and not column_classes[col].terms.isdisjoint(negated)
+        ]
+    return plan
+
+
+# 函数：计划缓存文件路径
+def _plan_path(cache_dir, signature):
+    return os.path.join(cache_dir, f"plan-{signature}.json")
+
+
+# 函数：读取缓存的计划，未命中或文件损坏时返回 None
+def load_cached_plan(cache_dir, signature):
+    path = _plan_path(cache_dir, signature)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            plan = GenerationPlan.from_dict(json.load(f))
+    except Exception:
+        return None
+    if plan.signature != signature:
+        return None
+    touch_cache_files(path)
+    return plan
+
+
+# 函数：写入计划缓存（先写临时文件再替换，多个进程同时写入时不会读到半个文件），无法写入时返回 False
+def save_cached_plan(cache_dir, plan):
+    path = _plan_path(cache_dir, plan.signature)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+# 函数：表头对应的生成计划，返回 (计划, 来源)；来源为 'memory' / 'disk'（命中缓存）或 None（新推断）
+# 给出 cache_dir 时计划同时缓存为 JSON 文件，多个进程（多工作表）和多次运行共用
+def load_plan(columns, rules=None, cache_dir=None):
+    rules = DEFAULT_RULES if rules is None else rules
+    columns = list(columns)
+    signature = plan_signature(columns, rules)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(signature)
+        if plan is not None:
+            _plan_cache.move_to_end(signature)
+            return plan, 'memory'
+
+    source = None
+    plan = load_cached_plan(cache_dir, signature) if cache_dir else None
+    if plan is not None:
+        source = 'disk'
+    else:
+        plan = compile_plan(columns, rules)
+        if cache_dir:
+            # 缓存目录不可写时只在内存中缓存
+            save_cached_plan(cache_dir, plan)
+
+    with _plan_cache_lock:
+        _plan_cache[signature] = plan
+        while len(_plan_cache) > PLAN_CACHE_ENTRIES:
+            _plan_cache.popitem(last=False)
+    return plan, source
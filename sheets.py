@@ -0,0 +1,285 @@
+import os
+import re
+import time
+from collections import Counter
+from itertools import chain
+
+import pandas as pd
+
+from engine import (
+    DUPLICATE_REPORT_COLUMNS, PREVIEW_ROWS, DuplicateKeywordError, GenerationError, GenerationResult, _no_stage,
+    _noop_log, _noop_progress, _reporting_stage, blocks_to_frame, check_duplicate_keywords, check_options, concat_header_frames,
+    iter_campaign_blocks, keyword_long_table, load_survey, log_prune_stats, map_in_processes, prepare_survey,
+    survey_plan, write_header_output,
+)
+from ingest import list_sheets, read_survey_bytes, survey_label
+from negatives import NegativePruner, merge_prune_stats
+from perf import PerfRecorder
+from writers import BULK_UPLOAD_ROW_LIMIT, output_path
+
+# 多工作表调研：同一工作簿的多个工作表（如各产品线）在多个进程中并行解析和展开，
+# 输出合并为一个表头或每个工作表一个表头；重复检查在每个工作表内和工作表之间进行
+# 进度回调（见 engine._noop_progress）只在阶段之间调用：工作进程中的解析和展开不能中途取消
+# profile=True 时记录各阶段耗时：各工作表在工作进程中的解析和展开合为一个“行构建”阶段，
+# 不记录逐活动耗时；trace_memory=True 时的内存峰值只含主进程
+
+# 文件名中不能出现的字符
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+# 函数：要处理的工作表：None 为全部，其余按给出的名称或序号；不存在的工作表抛出 GenerationError
+def resolve_sheets(data, sheet_names=None, reader='auto'):
+    try:
+        available = list_sheets(data, reader=reader)
+    except Exception as e:
+        raise GenerationError(f"读取文件时出错：{e}")
+    if sheet_names is None:
+        return available
+    sheets = []
+    for sheet in sheet_names:
+        if isinstance(sheet, int) and not isinstance(sheet, bool):
+            if not 0 <= sheet < len(available):
+                raise GenerationError(f"错误：工作表序号 {sheet} 超出范围（共 {len(available)} 个工作表）")
+            sheet = available[sheet]
+        elif sheet not in available:
+            raise GenerationError(f"错误：未找到工作表 {sheet}（可选：{', '.join(available)}）")
+        if sheet not in sheets:
+            sheets.append(sheet)
+    if not sheets:
+        raise GenerationError("请至少选择一个工作表。")
+    return sheets
+
+
+# 函数：每个工作表的输出文件名：header-JP.xlsx → header-JP-工作表名.xlsx（csv/tsv 时再按格式替换后缀）
+def sheet_output_path(output_file, sheet, output_format='xlsx', compression=None):
+    stem, ext = os.path.splitext(output_file)
+    path = f"{stem}-{_UNSAFE_FILENAME.sub('_', str(sheet))}{ext}"
+    return path if output_format == 'xlsx' else output_path(path, output_format, compression)
+
+
+# 函数：在工作进程中解析并展开一个工作表，返回 (表头 DataFrame, 关键词长表, 活动名称, 日志消息, 重复报告)
+# 有列内重复时不展开，返回的重复报告非空，由主进程汇总所有工作表后统一报错
+# prune_negatives=True 时精简否定关键词，精简统计在表头的 attrs['prune_stats']
+def build_sheet_header(survey_file, sheet, check_cross_columns=False, reader='auto', cache_dir=None,
+                       marketplace=None, prune_negatives=False, rules=None, memory_cache=False):
+    messages = []
+
+    def log(message, level='info'):
+        messages.append((message, level))
+
+    df_survey = load_survey(survey_file, sheet_name=sheet, log=log, reader=reader, cache_dir=cache_dir,
+                            memory_cache=memory_cache)
+    # 同一工作簿的工作表通常表头相同，给出 cache_dir 时各工作进程共用同一个计划缓存文件
+    plan = survey_plan(df_survey, log=log, cache_dir=cache_dir, rules=rules)
+    try:
+        check_duplicate_keywords(df_survey, plan.keyword_columns, log, check_cross_columns)
+    except DuplicateKeywordError as e:
+        return None, None, [], messages, e.report
+    long = keyword_long_table(df_survey, plan.keyword_columns)
+    prepared = prepare_survey(df_survey, log=log, check_duplicates=False, plan=plan)
+    pruner = NegativePruner() if prune_negatives else None
+    df_header = blocks_to_frame(chain.from_iterable(
+        iter_campaign_blocks(prepared, log=log, marketplace=marketplace, pruner=pruner)
+    ))
+    if pruner is not None:
+        df_header.attrs['prune_stats'] = pruner.stats()
+        log_prune_stats(df_header.attrs['prune_stats'], log)
+    return df_header, long, prepared.unique_campaigns, messages, None
+
+
+# 函数：跨工作表重复：同一关键词出现在多个工作表的同名关键词列中
+def find_cross_sheet_duplicates(sheet_keywords):
+    frames = []
+    for sheet, long in sheet_keywords.items():
+        letters = long.attrs.get('letters', {})
+        frames.append(long.assign(工作表=sheet, 位置=f'{sheet}!' + long['列名'].map(letters) + long['行号'].astype(str)))
+    if not frames:
+        return pd.DataFrame(columns=DUPLICATE_REPORT_COLUMNS)
+    combined = pd.concat(frames, ignore_index=True)
+    sheets_per_keyword = combined.groupby(['列名', '关键词'], sort=False)['工作表'].transform('nunique')
+    across = combined[sheets_per_keyword > 1]
+    if across.empty:
+        return pd.DataFrame(columns=DUPLICATE_REPORT_COLUMNS)
+    grouped = across.groupby(['列名', '关键词'], sort=False).agg(
+        次数=('行号', 'size'),
+        位置=('位置', list),
+        工作表=('工作表', lambda sheets: list(dict.fromkeys(sheets))),
+    ).reset_index()
+    return pd.DataFrame({
+        '范围': '跨表',
+        '列': [', '.join(sheets) for sheets in grouped['工作表']],
+        '列名': grouped['列名'],
+        '关键词': grouped['关键词'],
+        '次数': grouped['次数'],
+        '行号': [', '.join(cells) for cells in grouped['位置']],
+    })[DUPLICATE_REPORT_COLUMNS]
+
+
+# 函数：并行解析和展开各工作表，检查跨表重复，返回 {工作表: 表头 DataFrame}
+# combined=True（合并输出）时还提示多个工作表中的同名活动；memory_cache 的进程内解析缓存只在当前进程中执行时有效
+def build_sheet_headers(survey_file, sheets, log=_noop_log, check_cross_columns=False, reader='auto',
+                        cache_dir=None, marketplace=None, workers=None, combined=False, prune_negatives=False,
+                        rules=None, memory_cache=False):
+    # 路径直接交给工作进程读取；上传文件等对象先取出字节
+    source = survey_file if isinstance(survey_file, (str, os.PathLike)) else read_survey_bytes(survey_file)
+    outputs = map_in_processes(build_sheet_header, [
+        (source, sheet, check_cross_columns, reader, cache_dir, marketplace, prune_negatives, rules, memory_cache)
+        for sheet in sheets
+    ], workers)
+
+    frames = {}
+    sheet_keywords = {}
+    campaign_sheets = {}
+    duplicate_reports = {}
+    for sheet, (df_header, long, campaigns, messages, duplicate_report) in zip(sheets, outputs):
+        for message, level in messages:
+            log(_sheet_message(sheet, message), level=level)
+        if duplicate_report is not None:
+            duplicate_reports[sheet] = duplicate_report
+            continue
+        frames[sheet] = df_header
+        sheet_keywords[sheet] = long
+        for campaign in dict.fromkeys(campaigns):
+            campaign_sheets.setdefault(campaign, []).append(sheet)
+
+    if duplicate_reports:
+        raise DuplicateKeywordError(
+            f"提示：工作表 {', '.join(duplicate_reports)} 检测到关键词重复，本次不生成表格。请清理重复后重试。",
+            pd.concat([report.assign(工作表=sheet) for sheet, report in duplicate_reports.items()], ignore_index=True),
+        )
+
+    # 跨表重复只提示：不同工作表的活动互不影响
+    cross_report = find_cross_sheet_duplicates(sheet_keywords)
+    if not cross_report.empty:
+        log(f"提示：{len(cross_report)} 个关键词同时出现在多个工作表的同名关键词列中", level='warning')
+        log(cross_report, level='warning')
+    shared_campaigns = {campaign: names for campaign, names in campaign_sheets.items() if len(names) > 1}
+    if combined and shared_campaigns:
+        log(f"警告：{len(shared_campaigns)} 个活动名称出现在多个工作表中: "
+            f"{dict(list(shared_campaigns.items())[:10])}", level='warning')
+    return frames
+
+
+# 函数：多个工作表合并生成一个表头（按工作表顺序拼接），sheet_names 为 None 时处理全部工作表
+def generate_combined_header(survey_file='survey-JP.xlsx', sheet_names=None, output_file='header-JP.xlsx',
+                             log=_noop_log, check_cross_columns=False, streaming=False,
+                             max_rows=BULK_UPLOAD_ROW_LIMIT, reader='auto', cache_dir=None, in_memory=False,
+                             marketplace=None, workers=None, validate=True, output_format='xlsx', compression=None,
+                             progress=_noop_progress, prune_negatives=False, profile=False, trace_memory=False,
+                             rules=None, memory_cache=False):
+    start = time.perf_counter()
+    check_options(marketplace, output_format, compression)
+    if output_format != 'xlsx':
+        output_file = output_path(output_file, output_format, compression)
+    perf = PerfRecorder(trace_memory=trace_memory) if profile or trace_memory else None
+    stage = _reporting_stage(perf.stage if perf is not None else _no_stage, progress)
+    try:
+        with stage('read'):
+            sheets = resolve_sheets(_survey_data(survey_file), sheet_names, reader)
+        log(f"处理工作表: {sheets}", level='summary')
+        with stage('build', f"{len(sheets)} 个工作表，含读取"):
+            frames = build_sheet_headers(survey_file, sheets, log, check_cross_columns, reader, cache_dir,
+                                         marketplace, workers, combined=True, prune_negatives=prune_negatives,
+                                         rules=rules, memory_cache=memory_cache)
+            df_header = concat_header_frames(frames.values())
+
+        with stage('write'):
+            files, output_data, row_count, messages, issues = write_header_output(
+                df_header, output_file, streaming, max_rows, in_memory, validate, output_format, compression
+            )
+    finally:
+        if perf is not None:
+            perf.finish()
+    for message, level in messages:
+        log(message, level=level)
+    log(f"合并 {len(sheets)} 个工作表，总行数：{row_count}", level='summary')
+    result = GenerationResult(
+        survey_file=survey_label(survey_file),
+        output_files=files,
+        row_count=row_count,
+        elapsed=time.perf_counter() - start,
+        df_header=None if streaming else df_header,
+        preview=df_header.head(PREVIEW_ROWS),
+        level_counts=df_header['实体层级'].value_counts().to_dict(),
+        output_data=output_data,
+        issues=issues,
+        prune_stats=merge_prune_stats(frame.attrs.get('prune_stats') for frame in frames.values()),
+    )
+    if perf is not None:
+        perf.level_counts = result.level_counts
+        result.perf = perf.to_dict()
+    return result
+
+
+# 函数：每个工作表各生成一个表头，返回 {工作表: GenerationResult}；output_file 为基础文件名，附加工作表名
+def generate_sheet_headers(survey_file='survey-JP.xlsx', sheet_names=None, output_file='header-JP.xlsx',
+                           log=_noop_log, check_cross_columns=False, streaming=False,
+                           max_rows=BULK_UPLOAD_ROW_LIMIT, reader='auto', cache_dir=None, in_memory=False,
+                           marketplace=None, workers=None, validate=True, output_format='xlsx', compression=None,
+                           progress=_noop_progress, prune_negatives=False, profile=False, trace_memory=False,
+                           rules=None, memory_cache=False):
+    start = time.perf_counter()
+    check_options(marketplace, output_format, compression)
+    perf = PerfRecorder(trace_memory=trace_memory) if profile or trace_memory else None
+    stage = _reporting_stage(perf.stage if perf is not None else _no_stage, progress)
+    try:
+        with stage('read'):
+            sheets = resolve_sheets(_survey_data(survey_file), sheet_names, reader)
+        log(f"处理工作表: {sheets}", level='summary')
+        with stage('build', f"{len(sheets)} 个工作表，含读取"):
+            frames = build_sheet_headers(survey_file, sheets, log, check_cross_columns, reader, cache_dir,
+                                         marketplace, workers, prune_negatives=prune_negatives, rules=rules,
+                                         memory_cache=memory_cache)
+        with stage('write'):
+            outputs = map_in_processes(write_header_output, [
+                (frames[sheet], sheet_output_path(output_file, sheet, output_format, compression), streaming,
+                 max_rows, in_memory, validate, output_format, compression)
+                for sheet in sheets
+            ], workers)
+    finally:
+        if perf is not None:
+            perf.finish()
+
+    results = {}
+    for sheet, (files, output_data, row_count, messages, issues) in zip(sheets, outputs):
+        for message, level in messages:
+            log(_sheet_message(sheet, message), level=level)
+        log(f"[{sheet}] 生成完成：{', '.join(files)}，总行数：{row_count}", level='summary')
+        df_header = frames[sheet]
+        results[sheet] = GenerationResult(
+            survey_file=survey_label(survey_file),
+            output_files=files,
+            row_count=row_count,
+            elapsed=time.perf_counter() - start,
+            df_header=None if streaming else df_header,
+            preview=df_header.head(PREVIEW_ROWS),
+            level_counts=df_header['实体层级'].value_counts().to_dict(),
+            output_data=output_data,
+            issues=issues,
+            prune_stats=df_header.attrs.get('prune_stats'),
+        )
+
+    if perf is not None:
+        # 各工作表共用一份报告，行数统计为全部工作表之和
+        level_counts = Counter()
+        for result in results.values():
+            level_counts.update(result.level_counts)
+        perf.level_counts = dict(level_counts)
+        report = perf.to_dict()
+        for result in results.values():
+            result.perf = report
+    return results
+
+
+# 函数：工作表日志消息加上工作表名前缀（重复报告等表格原样保留）
+def _sheet_message(sheet, message):
+    return f"[{sheet}] {message}" if isinstance(message, str) else message
+
+
+# 函数：调研文件字节，文件不存在时抛出 GenerationError
+def _survey_data(survey_file):
+    try:
+        return read_survey_bytes(survey_file)
+    except FileNotFoundError:
+        raise GenerationError(f"错误：未找到文件 {survey_label(survey_file)}。请确保文件已上传。")
+
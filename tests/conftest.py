@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+# 测试直接导入仓库根目录下的模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_survey import write_survey  # noqa: E402
+
+# 基准表头（tests/data/baseline-header.csv）对应的合成调研：16 个活动、60 个关键词、随机种子 1。
+# 基准表头由重构前的 app.py（generate_header_from_survey）对同一调研生成
+BASELINE_SURVEY = {'campaigns': 16, 'keywords': 60, 'seed': 1}
+BASELINE_HEADER = os.path.join(os.path.dirname(__file__), 'data', 'baseline-header.csv')
+
+
+@pytest.fixture
+def survey_file(tmp_path):
+    path = tmp_path / 'survey-JP.xlsx'
+    write_survey(str(path), **BASELINE_SURVEY)
+    return str(path)
+
+
+# 三个工作表内容相同的调研工作簿（多工作表模式用；同名关键词列跨表重复只提示）
+@pytest.fixture
+def multi_sheet_survey(survey_file, tmp_path):
+    workbook = load_workbook(survey_file)
+    for title in ['产品线B', '产品线C']:
+        workbook.copy_worksheet(workbook.active).title = title
+    path = tmp_path / 'survey-sheets.xlsx'
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def baseline_header():
+    return pd.read_csv(BASELINE_HEADER, dtype=object, keep_default_na=False)
@@ -0,0 +1,54 @@
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+
+# 以相同的 key 提交一个立即完成的任务（第一次运行相当于点击“生成表头”），显示任务编号和 key
+def submit_same_job():
+    import streamlit as st
+
+    import app
+
+    restart = not st.session_state.get('submitted')
+    st.session_state['submitted'] = True
+    job = app.run_in_background(('header', 'digest', 'JP', (), 'header-JP.xlsx', ()), '生成', lambda progress: 'ok',
+                                restart=restart)
+    if job is not None:
+        st.text(f"{job.id}|{job.key[0] == app.session_id()}")
+
+
+def test_sessions_do_not_share_jobs(monkeypatch):
+    # AppTest 把测试脚本设为 __main__，测试后恢复，以免之后 spawn 的工作进程执行该脚本
+    monkeypatch.setitem(sys.modules, '__main__', sys.modules['__main__'])
+    sessions = [AppTest.from_function(submit_same_job) for _ in range(2)]
+    results = []
+    for session in sessions:
+        runs = []
+        for _ in range(2):
+            session.run(timeout=30)
+            assert not session.exception
+            runs.append(session.text[-1].value)
+        # 同一会话重新运行复用任务
+        assert runs[0] == runs[1] and runs[0].endswith('|True')
+        results.append(runs[0])
+    # 不同会话各自一个任务
+    assert results[0] != results[1]
+
+
+# 不点击“生成表头”直接查找任务（相当于结果过期后的下载重跑），显示是否返回任务、是否提交了任务
+def rerun_expired_job():
+    import streamlit as st
+
+    import app
+
+    job = app.run_in_background(('header', 'expired', 'JP', (), 'header-JP.xlsx', ()), '生成', lambda progress: 'ok')
+    st.text(f"{job is None}|{app.job_manager().get((app.session_id(), 'header', 'expired', 'JP', (), 'header-JP.xlsx', ())) is None}")
+
+
+def test_expired_job_is_not_resubmitted(monkeypatch):
+    monkeypatch.setitem(sys.modules, '__main__', sys.modules['__main__'])
+    session = AppTest.from_function(rerun_expired_job)
+    session.run(timeout=30)
+    assert not session.exception
+    assert session.text[-1].value == 'True|True'
+    assert '已过期' in session.info[0].value
@@ -0,0 +1,39 @@
+import pytest
+
+from classifier import ASIN_TOKEN, CASE_WORDS, MATCH_TYPE_TOKENS, SUZHU_WORDS, CampaignClassifier
+
+CATEGORIES = ['suzhu', '宿主', 'case', '包', 'tape', 'stand', 'cable', 'zhu', 'ab', 'abc']
+
+NAMES = [
+    'suzhu-精准-001', '宿主-broad-002', 'case-exact', '包-广泛', 'tape精准broad', 'stand-ASIN', 'suzhu-asin',
+    'Cable-EXACT', 'suzhu-case-精准', 'abc广泛', 'zhu', '', '无类别', 'suzhuzhu-broad', 'asin-精准',
+]
+
+
+# 函数：逐个词做子串判断的参照实现（重构前的分类方式）
+def substring_classify(name, categories):
+    name = name.lower()
+    is_exact = any(token in name for token in MATCH_TYPE_TOKENS['精准'])
+    is_broad = any(token in name for token in MATCH_TYPE_TOKENS['广泛'])
+    is_asin = ASIN_TOKEN in name
+    match_type = '精准' if is_exact else '广泛' if is_broad else 'ASIN' if is_asin else None
+    group = 'suzhu' if any(word in name for word in SUZHU_WORDS) else \
+        'case' if any(word in name for word in CASE_WORDS) else None
+    return (tuple(category for category in categories if category in name), match_type, group,
+            is_exact, is_broad, is_asin)
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_classify_matches_substring_checks(name):
+    classifier = CampaignClassifier(CATEGORIES)
+    result = classifier.classify_all([name])[0]
+    assert tuple(result[:6]) == substring_classify(name, CATEGORIES)
+    assert classifier.classify_one(name) == result
+
+
+def test_classify_frame_keeps_input_order():
+    classifier = CampaignClassifier(CATEGORIES)
+    frame = classifier.classify(NAMES)
+    assert frame['广告活动名称'].tolist() == NAMES
+    assert frame['类别'].tolist() == [substring_classify(name, CATEGORIES)[0] for name in NAMES]
+    assert frame['精准'].tolist() == [substring_classify(name, CATEGORIES)[3] for name in NAMES]
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+import cli
+from diff import load_previous_header
+
+
+@pytest.mark.parametrize('options, first_name, diff_name', [
+    ([], 'header-DE-survey-JP.xlsx', 'header-DE-survey-JP-diff.xlsx'),
+    (['--format', 'csv'], 'header-DE-survey-JP.csv', 'header-DE-survey-JP-diff.csv'),
+    (['--format', 'tsv', '--compression', 'gzip'], 'header-DE-survey-JP.tsv.gz', 'header-DE-survey-JP-diff.tsv.gz'),
+    (['--format', 'csv', '--compression', 'zip'], 'header-DE-survey-JP.zip', 'header-DE-survey-JP-diff.zip'),
+])
+def test_previous_dir_uses_same_output_format(survey_file, tmp_path, options, first_name, diff_name):
+    # 示例调研的金额按欧元填写，用欧元站点避免取整到日元后产生校验问题
+    first_dir, second_dir = tmp_path / 'first', tmp_path / 'second'
+    assert cli.main([survey_file, '-o', str(first_dir), '-j', '1', '--country', 'DE', *options]) == 0
+    assert os.listdir(first_dir) == [first_name]
+    assert len(load_previous_header([str(first_dir / first_name)])) == 432
+
+    assert cli.main([survey_file, '-o', str(second_dir), '--previous-dir', str(first_dir), '-j', '1', '--country', 'DE', *options]) == 0
+    assert os.listdir(second_dir) == [diff_name]
+    # 调研未变化：增量只有表头行
+    assert load_previous_header([str(second_dir / diff_name)]).empty
+
+
+@pytest.mark.parametrize('workers, file_count, expected', [(4, 1, 4), (4, 2, 2), (4, 3, 1), (2, 5, 1), (1, 1, 1)])
+def test_sheet_workers_for_gives_spare_workers_to_sheets(workers, file_count, expected):
+    assert cli.sheet_workers_for(workers, file_count) == expected
+
+
+@pytest.mark.parametrize('per_sheet', [[], ['--per-sheet']])
+def test_all_sheets_parallel_matches_serial(multi_sheet_survey, tmp_path, per_sheet):
+    outputs = {}
+    for workers in ['1', '3']:
+        output_dir = tmp_path / f'j{workers}'
+        assert cli.main([multi_sheet_survey, '-o', str(output_dir), '--all-sheets', '-j', workers, '--format', 'csv',
+                         *per_sheet]) == 0
+        outputs[workers] = {name: (output_dir / name).read_bytes() for name in sorted(os.listdir(output_dir))}
+    assert outputs['1'] == outputs['3']
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from diff import diff_header
+from engine import HEADER_COLUMNS
+
+
+# 函数：由 (实体层级, 活动, 关键词, 匹配类型, 竞价) 构建表头
+def header(*rows):
+    records = []
+    for level, campaign, keyword, match_type, bid in rows:
+        record = dict.fromkeys(HEADER_COLUMNS, '')
+        record.update({'实体层级': level, '操作': 'Create', '广告活动名称': campaign, '关键词文本': keyword,
+                       '匹配类型': match_type, '竞价': bid})
+        records.append(record)
+    return pd.DataFrame(records, columns=HEADER_COLUMNS)
+
+
+def test_diff_create_update_archive():
+    previous = header(
+        ('广告活动', 'a', '', '', ''),
+        ('关键词', 'a', 'phone', '精准', 0.5),
+        ('关键词', 'a', 'case', '精准', 0.5),
+        ('关键词', 'a', 'old', '精准', 0.5),
+    )
+    new = header(
+        ('广告活动', 'a', '', '', ''),
+        ('关键词', 'a', 'phone', '精准', '0.5'),
+        ('关键词', 'a', 'case', '精准', 0.7),
+        ('关键词', 'a', 'new', '精准', 0.5),
+    )
+    df_diff, stats = diff_header(new, previous)
+    assert stats == {'Create': 1, 'Update': 1, 'Archive': 1, '未变化': 2, '完整行数': 4}
+    assert list(zip(df_diff['关键词文本'], df_diff['操作'])) == [('case', 'Update'), ('new', 'Create'),
+                                                              ('old', 'Archive')]
+
+
+def test_diff_archives_whole_campaign_once():
+    previous = header(
+        ('广告活动', 'gone', '', '', ''),
+        ('关键词', 'gone', 'phone', '精准', 0.5),
+        ('竞价调整', 'gone', '', '', ''),
+        ('广告活动', 'kept', '', '', ''),
+    )
+    new = header(('广告活动', 'kept', '', '', ''))
+    df_diff, stats = diff_header(new, previous)
+    # 整个活动归档时下级实体不再单独归档，竞价调整不能归档
+    assert df_diff[['实体层级', '广告活动名称', '操作']].values.tolist() == [['广告活动', 'gone', 'Archive']]
+    assert stats['Archive'] == 1
+
+
+def test_diff_ignores_previously_archived_rows():
+    previous = header(('广告活动', 'a', '', '', ''), ('关键词', 'a', 'phone', '精准', 0.5))
+    previous.loc[1, '操作'] = 'Archive'
+    new = header(('广告活动', 'a', '', '', ''), ('关键词', 'a', 'phone', '精准', 0.5))
+    df_diff, stats = diff_header(new, previous)
+    assert df_diff['操作'].tolist() == ['Create']
+    assert stats['未变化'] == 1
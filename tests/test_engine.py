@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from diff import _normalize
+from engine import HEADER_COLUMNS, GenerationError, generate_header
+
+
+# 函数：两个表头逐列按增量比较的规则（数字统一为浮点、空值为空串）比较
+def assert_same_rows(df_header, df_expected):
+    assert len(df_header) == len(df_expected)
+    for column in HEADER_COLUMNS:
+        assert _normalize(df_header[column]).tolist() == _normalize(df_expected[column]).tolist(), column
+
+
+def test_engine_matches_baseline_rows(survey_file, baseline_header, tmp_path):
+    result = generate_header(survey_file, str(tmp_path / 'header-JP.xlsx'))
+    assert_same_rows(result.df_header, baseline_header)
+    assert result.issues.empty
+
+
+@pytest.mark.parametrize('output_format', ['xlsx', 'csv'])
+def test_streaming_output_matches_baseline_rows(survey_file, baseline_header, tmp_path, output_format):
+    result = generate_header(survey_file, str(tmp_path / 'header-JP.xlsx'), streaming=True, max_rows=100,
+                             output_format=output_format)
+    assert len(result.output_files) > 1
+    if output_format == 'xlsx':
+        parts = [pd.read_excel(path, dtype=object) for path in result.output_files]
+    else:
+        parts = [pd.read_csv(path, dtype=object, keep_default_na=False, encoding='utf-8-sig')
+                 for path in result.output_files]
+    assert_same_rows(pd.concat(parts, ignore_index=True), baseline_header)
+
+
+def test_missing_survey_raises_generation_error(tmp_path):
+    with pytest.raises(GenerationError):
+        generate_header(str(tmp_path / 'missing.xlsx'), str(tmp_path / 'header.xlsx'))
+
+
+@pytest.mark.parametrize('marketplace', [None, 'JP', 'DE'])
+def test_streaming_and_frame_csv_text_match(survey_file, tmp_path, marketplace):
+    texts = {}
+    for streaming in [False, True]:
+        result = generate_header(survey_file, str(tmp_path / f'header-{streaming}.csv'), streaming=streaming,
+                                 max_rows=100, output_format='csv', marketplace=marketplace)
+        texts[streaming] = [open(path, encoding='utf-8-sig').read() for path in result.output_files]
+    assert texts[False] == texts[True]
+    # 整数金额不带小数点
+    assert ',12.0,' not in texts[False][0] and ',2000.0,' not in texts[False][0]
@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+import engine
+import ingest
+from engine import load_survey
+from ingest import evict_cache, load_cached_survey
+
+
+# 函数：写入指定大小和修改时间的缓存文件
+def cache_file(cache_dir, name, size, mtime):
+    path = os.path.join(cache_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_cache_removes_old_files(tmp_path):
+    now = 1_000_000
+    old = cache_file(tmp_path, 'old.parquet', 10, now - 100)
+    new = cache_file(tmp_path, 'plan-new.json', 10, now - 10)
+    assert evict_cache(str(tmp_path), max_bytes=1000, max_age=50, now=now) == 1
+    assert not os.path.exists(old) and os.path.exists(new)
+
+
+def test_evict_cache_keeps_total_size_under_limit(tmp_path):
+    now = 1_000_000
+    paths = [cache_file(tmp_path, f'{i}.parquet', 40, now - 10 + i) for i in range(4)]
+    assert evict_cache(str(tmp_path), max_bytes=100, max_age=3600, now=now) == 2
+    # 从最久未使用的文件开始删除
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+
+
+def test_load_survey_caches_and_reuses(survey_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    messages = []
+    df_first = load_survey(survey_file, cache_dir=cache_dir, log=lambda message, level='info': messages.append(message))
+    df_cached = load_cached_survey(cache_dir, df_first.attrs['survey_digest'])
+    pd.testing.assert_frame_equal(df_cached, df_first)
+    assert df_cached.attrs['survey_columns'] == df_first.attrs['survey_columns']
+    assert not any('无法缓存' in str(message) for message in messages)
+
+
+def test_unwritable_cache_logs_real_error(survey_file, tmp_path):
+    # 缓存目录位置已被普通文件占用
+    blocked = tmp_path / 'cache'
+    blocked.write_text('')
+    messages = []
+    df_survey = load_survey(survey_file, cache_dir=str(blocked),
+                            log=lambda message, level='info': messages.append(message))
+    assert len(df_survey)
+    assert any('无法缓存（FileExistsError' in str(message) for message in messages)
+
+
+def test_memory_cache_skips_parsing(survey_file, tmp_path, monkeypatch):
+    messages = []
+
+    def log(message, level='info'):
+        messages.append(str(message))
+
+    df_first = load_survey(survey_file, memory_cache=True, log=log)
+    # 命中内存缓存时不再解析，也不写磁盘
+    monkeypatch.setattr(engine, 'read_survey', lambda *args, **kwargs: pytest.fail('重复解析'))
+    df_cached = load_survey(survey_file, memory_cache=True, log=log)
+    pd.testing.assert_frame_equal(df_cached, df_first)
+    assert df_cached.attrs['survey_columns'] == df_first.attrs['survey_columns']
+    assert any('命中内存解析缓存' in message for message in messages)
+    # 返回副本，修改不影响缓存
+    df_cached.drop(columns=df_cached.columns[0], inplace=True)
+    assert load_survey(survey_file, memory_cache=True).shape == df_first.shape
+    assert os.listdir(tmp_path) == ['survey-JP.xlsx']
+
+
+def test_memory_cache_keeps_recent_entries():
+    for i in range(ingest.SURVEY_MEMORY_ENTRIES + 2):
+        ingest.save_memory_survey(f'digest-{i}', pd.DataFrame({'a': [i]}))
+    assert ingest.load_memory_survey('digest-0') is None
+    assert ingest.load_memory_survey(f'digest-{ingest.SURVEY_MEMORY_ENTRIES + 1}')['a'].tolist() == [
+        ingest.SURVEY_MEMORY_ENTRIES + 1]
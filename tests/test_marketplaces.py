@@ -0,0 +1,61 @@
+import math
+
+import pandas as pd
+import pytest
+
+from engine import generate_header, generate_headers
+from marketplaces import MARKETPLACES, marketplace_currencies
+
+
+def test_jp_defaults_are_whole_yen():
+    jp = MARKETPLACES['JP']
+    assert jp.currency == 'JPY' and jp.decimals == 0
+    assert jp.daily_budget >= 100 and jp.group_bid >= 2
+    assert jp.round_amount(0.6) == 1 and jp.round_amount(99.5) == 100
+
+
+def test_jp_output_rounds_to_whole_yen(survey_file, tmp_path):
+    output = str(tmp_path / 'header-JP.csv')
+    generate_header(survey_file, output, in_memory=False, output_format='csv', marketplace='JP')
+    df = pd.read_csv(output, dtype=str, keep_default_na=False)
+    for column in ['每日预算', '广告组默认竞价', '竞价']:
+        values = [value for value in df[column] if value]
+        assert values and all(float(value).is_integer() for value in values)
+
+
+def test_warns_when_survey_amounts_reused_across_currencies(survey_file, tmp_path):
+    warnings = []
+
+    def log(message, level='info'):
+        if level == 'warning':
+            warnings.append(str(message))
+
+    generate_headers(survey_file, ['DE', 'FR'], str(tmp_path / 'header-{country}.xlsx'), log=log)
+    assert not any('汇率' in message for message in warnings)
+    generate_headers(survey_file, ['DE', 'UK', 'JP'], str(tmp_path / 'header-{country}.xlsx'), log=log)
+    assert any('汇率' in message and 'EUR、GBP、JPY' in message for message in warnings)
+
+
+def test_warns_when_amounts_round_to_zero(survey_file, tmp_path):
+    warnings = []
+    generate_header(survey_file, str(tmp_path / 'header-JP.xlsx'), marketplace='JP',
+                    log=lambda message, level='info': level == 'warning' and warnings.append(str(message)))
+    assert len([message for message in warnings if '取整后为 0' in message]) == 1
+
+
+def test_marketplace_currencies_keeps_order():
+    assert marketplace_currencies(['UK', 'DE', 'FR', 'JP']) == ['GBP', 'EUR', 'JPY']
+
+
+@pytest.mark.parametrize('code, value, expected', [
+    ('JP', 2.5, 3), ('JP', 3.5, 4), ('JP', 0.5, 1), ('JP', 100, 100),
+    ('DE', 0.125, 0.13), ('DE', 0.135, 0.14), ('DE', 1.005, 1.01), ('DE', 12, 12.0),
+])
+def test_round_amount_rounds_half_up(code, value, expected):
+    rounded = MARKETPLACES[code].round_amount(value)
+    assert rounded == expected and type(rounded) is type(expected)
+
+
+def test_round_amount_keeps_blank_and_text():
+    jp = MARKETPLACES['JP']
+    assert math.isnan(jp.round_amount(float('nan'))) and jp.round_amount('') == '' and jp.round_amount(None) is None
@@ -0,0 +1,47 @@
+from negatives import NEGATIVE_EXACT, NEGATIVE_PHRASE, NegativePruner, merge_prune_stats
+
+
+def test_prune_removes_duplicates_keeping_first_spelling():
+    pruner = NegativePruner()
+    pruned = pruner.prune([
+        (['Phone Case', 'car mount'], NEGATIVE_EXACT),
+        (['phone case', 'CAR  MOUNT', 'tablet'], NEGATIVE_EXACT),
+    ])
+    assert pruned == [(['Phone Case', 'car mount'], NEGATIVE_EXACT), (['tablet'], NEGATIVE_EXACT)]
+    assert pruner.stats() == {'重复': 2, '被词组覆盖': 0, '合计': 2}
+
+
+def test_prune_removes_negatives_covered_by_phrase():
+    pruner = NegativePruner()
+    pruned = pruner.prune([
+        (['cheap phone case', 'phone', 'case cover'], NEGATIVE_EXACT),
+        (['phone case', 'cheap phone case'], NEGATIVE_PHRASE),
+    ])
+    # 含词组 "phone case" 的否定精准词和更长的否定词组被覆盖；"phone" 不包含任何词组，保留
+    assert pruned == [(['phone', 'case cover'], NEGATIVE_EXACT), (['phone case'], NEGATIVE_PHRASE)]
+    assert pruner.stats() == {'重复': 0, '被词组覆盖': 2, '合计': 2}
+
+
+def test_phrase_does_not_cover_itself_or_partial_words():
+    pruner = NegativePruner()
+    pruned = pruner.prune([
+        (['phone cases', 'phone case'], NEGATIVE_EXACT),
+        (['phone case'], NEGATIVE_PHRASE),
+    ])
+    # 按词匹配："phone cases" 不包含词组 "phone case"
+    assert pruned == [(['phone cases'], NEGATIVE_EXACT), (['phone case'], NEGATIVE_PHRASE)]
+    assert pruner.stats()['被词组覆盖'] == 1
+
+
+def test_prune_keeps_same_word_with_different_match_types():
+    pruner = NegativePruner()
+    negatives = [(['stand'], NEGATIVE_EXACT), (['holder'], NEGATIVE_PHRASE)]
+    assert pruner.prune(negatives) == negatives
+    assert pruner.stats()['合计'] == 0
+
+
+def test_merge_prune_stats():
+    first = {'重复': 1, '被词组覆盖': 2, '合计': 3}
+    second = {'重复': 4, '被词组覆盖': 0, '合计': 4}
+    assert merge_prune_stats([first, None, second]) == {'重复': 5, '被词组覆盖': 2, '合计': 7}
+    assert merge_prune_stats([None]) is None
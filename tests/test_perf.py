@@ -0,0 +1,44 @@
+import json
+import tracemalloc
+
+import cli
+from perf import PerfRecorder
+
+
+def test_overlapping_recorders_share_memory_tracing():
+    assert not tracemalloc.is_tracing()
+    first, second = PerfRecorder(trace_memory=True), PerfRecorder(trace_memory=True)
+    with first.stage('read'):
+        pass
+    with second.stage('read'):
+        pass
+    # 先结束的记录器不能停止另一个记录器仍在使用的跟踪
+    first.finish()
+    with second.stage('build'):
+        data = [0] * 100_000
+    second.finish()
+    del data
+    assert not tracemalloc.is_tracing()
+    assert all(stage['peak_mb'] is not None for stage in second.to_dict()['stages'])
+    assert second.to_dict()['stages'][-1]['peak_mb'] > 0
+
+
+def test_recorder_keeps_tracing_started_elsewhere():
+    tracemalloc.start()
+    try:
+        recorder = PerfRecorder(trace_memory=True)
+        with recorder.stage('read'):
+            pass
+        recorder.finish()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_all_sheets_perf_report(multi_sheet_survey, tmp_path):
+    report_path = tmp_path / 'perf.json'
+    assert cli.main([multi_sheet_survey, '-o', str(tmp_path / 'out'), '--all-sheets', '-j', '1',
+                     '--perf-report', str(report_path)]) == 0
+    report = json.loads(report_path.read_text(encoding='utf-8'))[multi_sheet_survey]
+    assert [stage['stage'] for stage in report['stages']] == ['read', 'build', 'write']
+    assert report['level_counts']['广告活动'] == 3 * 16
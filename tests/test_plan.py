@@ -0,0 +1,120 @@
+import os
+import re
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import cli
+
+from diff import _normalize
+from engine import HEADER_COLUMNS, generate_header
+from plan import DEFAULT_RULES, GenerationPlan, compile_plan, keyword_column_rules
+
+COLUMNS = [
+    '广告活动名称', 'CPC', 'SKU', '广告组默认竞价', '预算', '广告位', '百分比', '备注', '负责人',
+    'suzhu/宿主-精准词', 'suzhu/宿主-广泛词', 'case/包-精准词', 'case/包-广泛词', 'tape-精准词', 'tape-广泛词',
+    'stand-精准词', 'stand-广泛词', 'cable-精准词', 'cable-广泛词', 'suzhu-ASIN', 'case-ASIN', 'stand-ASIN',
+    '否定精准', '否定词组', '宿主额外否精准', '宿主额外否词组', '否定ASIN',
+]
+
+
+# 函数：重构前的类别提取（参照实现）：扫描全部列名
+def baseline_categories(columns):
+    categories = set()
+    for col in columns:
+        col_lower = str(col).lower()
+        if any(x in col_lower for x in ['精准词', '广泛词', '精准', '广泛']):
+            for suffix in ['精准词', '广泛词', '精准', '广泛']:
+                if col_lower.endswith(suffix):
+                    prefix = col_lower[:-len(suffix)].strip()
+                    categories.update(part for part in re.split(r'[/\-_\s\.]', prefix) if part and len(part) > 1)
+                    break
+        elif 'asin' in col_lower and '否定' not in col_lower:
+            prefix = col_lower.replace('asin', '').strip()
+            categories.update(part for part in re.split(r'[/\-_\s\.]', prefix) if part and len(part) > 1)
+    categories.update(['suzhu', '宿主', 'case', '包', 'tape'])
+    categories.discard('')
+    return categories
+
+
+# 函数：按列名识别关键词列的规则
+def match_rules():
+    return keyword_column_rules('match')
+
+
+# 函数：关键词列移到活动名称之后的调研文件
+def moved_survey(survey_file, tmp_path):
+    df = pd.read_excel(survey_file, dtype=object)
+    columns = list(df.columns)
+    path = tmp_path / 'survey-moved.xlsx'
+    df[[columns[0], *columns[9:19], *columns[1:9], *columns[19:]]].to_excel(path, index=False)
+    return str(path)
+
+
+# 函数：表头与基准逐列比较
+def assert_baseline_rows(df_header, baseline_header):
+    assert len(df_header) == len(baseline_header)
+    for column in HEADER_COLUMNS:
+        assert _normalize(df_header[column]).tolist() == _normalize(baseline_header[column]).tolist(), column
+
+
+@pytest.mark.parametrize('columns', [
+    COLUMNS,
+    [*COLUMNS[:9], 'case exact', 'case broad', *COLUMNS[11:]],
+    [*COLUMNS[:7], '备注精准说明', *COLUMNS[8:]],
+])
+def test_default_plan_matches_positional_slice(columns):
+    plan = compile_plan(columns)
+    assert plan.keyword_columns == columns[9:19]
+    assert set(plan.categories) == baseline_categories(columns)
+
+
+def test_match_mode_finds_moved_keyword_columns():
+    columns = [*COLUMNS[:7], '备注精准说明', *COLUMNS[8:]]
+    moved = [columns[0], *columns[9:19], *columns[1:9], *columns[19:]]
+    plan = compile_plan(moved, match_rules())
+    assert plan.keyword_columns == COLUMNS[9:19]
+    assert plan.keyword_roles == compile_plan(columns).keyword_roles
+
+
+def test_unknown_keyword_column_mode_is_rejected():
+    with pytest.raises(ValueError):
+        compile_plan(COLUMNS, {**DEFAULT_RULES, 'keyword_columns': {'mode': 'guess'}})
+
+
+def test_plan_round_trips_through_dict():
+    plan = compile_plan(COLUMNS)
+    assert GenerationPlan.from_dict(plan.to_dict()) == plan
+
+
+def test_notes_column_with_match_word_keeps_baseline_output(survey_file, baseline_header, tmp_path):
+    # 备注列改名为“备注精准说明”并填入重复的说明，不影响关键词列和生成结果
+    workbook = load_workbook(survey_file)
+    sheet = workbook.active
+    sheet.cell(row=1, column=8, value='备注精准说明')
+    for row in range(2, sheet.max_row + 1):
+        sheet.cell(row=row, column=8, value='同一说明')
+    path = tmp_path / 'survey-notes.xlsx'
+    workbook.save(path)
+
+    result = generate_header(str(path), str(tmp_path / 'header.xlsx'), in_memory=True)
+    assert_baseline_rows(result.df_header, baseline_header)
+
+
+def test_match_rules_reach_generation(survey_file, baseline_header, tmp_path):
+    path = moved_survey(survey_file, tmp_path)
+    result = generate_header(path, str(tmp_path / 'header.xlsx'), in_memory=True, rules=match_rules())
+    assert_baseline_rows(result.df_header, baseline_header)
+
+
+@pytest.mark.parametrize('sheet_options', [[], ['--all-sheets']])
+def test_cli_keyword_columns_option(survey_file, baseline_header, tmp_path, sheet_options):
+    path = moved_survey(survey_file, tmp_path)
+    output_dir = tmp_path / 'out'
+    # 未知站点不套用站点默认值和金额取整，输出与基准表头可比
+    assert cli.main([path, '-o', str(output_dir), '-j', '1', '--format', 'csv', '--keyword-columns', 'match',
+                     '--country', 'XX', *sheet_options]) == 0
+    (output_file,) = os.listdir(output_dir)
+    assert_baseline_rows(pd.read_csv(output_dir / output_file, dtype=object, keep_default_na=False,
+                                     encoding='utf-8-sig'), baseline_header)
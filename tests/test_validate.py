@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+from diff import load_previous_header
+from engine import HEADER_COLUMNS, generate_header
+from validate import KEYWORD_MAX_LENGTH, locate_issues, summarize_issues, validate_header
+
+
+# 函数：由部分列的取值构建表头行
+def row(level, campaign='a', **values):
+    record = dict.fromkeys(HEADER_COLUMNS, '')
+    record.update({'实体层级': level, '广告活动编号': campaign, '广告活动名称': campaign})
+    record.update(values)
+    return record
+
+
+# 函数：问题表中的 (行号, 列, 原因)
+def issue_set(issues):
+    return set(zip(issues['行号'], issues['列'], issues['原因']))
+
+
+def test_valid_header_has_no_issues():
+    df = pd.DataFrame([
+        row('广告活动', 每日预算=12),
+        row('广告组', 广告组默认竞价=0.6),
+        row('商品广告', SKU='SKU-1'),
+        row('关键词', 竞价=0.5, 关键词文本='phone case', 匹配类型='精准'),
+        row('商品定向', 竞价=0.5, 拓展商品投放编号='asin="B0ABCDEFGH"'),
+    ], columns=HEADER_COLUMNS)
+    assert validate_header(df).empty
+
+
+def test_issues_report_excel_row_numbers():
+    df = pd.DataFrame([
+        row('广告活动', 每日预算=1),
+        row('广告组', 广告组默认竞价=2),
+        row('商品广告', SKU=' '),
+        row('关键词', 竞价='abc', 关键词文本='x' * (KEYWORD_MAX_LENGTH + 1), 匹配类型='精准'),
+        row('否定关键词', 关键词文本='a b c d e', 匹配类型='否定词组'),
+        row('商品定向', 竞价=0.5, 拓展商品投放编号='asin="B0ABC"'),
+        row('关键词', 竞价=0.5, 关键词文本='two  spaces', 匹配类型='精准'),
+    ], columns=HEADER_COLUMNS)
+    # 表头占第 1 行，数据从第 2 行开始
+    assert issue_set(validate_header(df)) == {
+        (3, '广告组默认竞价', '广告组默认竞价高于活动每日预算'),
+        (4, 'SKU', 'SKU 为空'),
+        (4, 'SKU', '首尾或连续空白'),
+        (5, '竞价', '竞价不是数字'),
+        (5, '关键词文本', f'关键词超过 {KEYWORD_MAX_LENGTH} 个字符'),
+        (6, '关键词文本', '否定词组超过 4 个词'),
+        (7, '拓展商品投放编号', 'ASIN 格式不正确（应为 10 位字母数字）'),
+        (8, '关键词文本', '首尾或连续空白'),
+    }
+
+
+def test_row_offset_shifts_row_numbers():
+    df = pd.DataFrame([row('商品广告', SKU='')], columns=HEADER_COLUMNS)
+    assert validate_header(df, row_offset=10)['行号'].tolist() == [12]
+
+
+def test_categorical_columns_validate_like_object_columns():
+    df = pd.DataFrame([
+        row('广告活动', 每日预算=12),
+        row('关键词', 竞价=20, 关键词文本=' phone', 匹配类型='精准'),
+    ], columns=HEADER_COLUMNS)
+    categorical = df.astype({'实体层级': 'category', '关键词文本': 'category'})
+    pd.testing.assert_frame_equal(validate_header(categorical), validate_header(df))
+
+
+def test_locate_issues_maps_rows_to_parts():
+    issues = pd.DataFrame({'文件': None, '行号': [2, 4, 5, 6], '列': 'SKU', '原因': 'SKU 为空'})
+    located = locate_issues(issues, ['out/h-part1.csv', 'out/h-part2.csv'], [3, 2])
+    assert list(zip(located['文件'], located['行号'])) == [
+        ('h-part1.csv', 2), ('h-part1.csv', 4), ('h-part2.csv', 2), ('h-part2.csv', 3),
+    ]
+
+
+@pytest.mark.parametrize('streaming, output_format', [(True, 'xlsx'), (True, 'csv'), (False, 'csv')])
+def test_split_output_issues_point_at_part_rows(survey_file, tmp_path, streaming, output_format):
+    # 示例调研的金额按欧元填写，按日元取整后部分竞价为 0
+    result = generate_header(survey_file, str(tmp_path / 'header.xlsx'), marketplace='JP', streaming=streaming,
+                             max_rows=10, output_format=output_format)
+    assert len(result.output_files) > 1 and not result.issues.empty
+    # 问题行不在第一个分卷中，行号为分卷内的行号
+    assert os.path.basename(result.output_files[0]) not in set(result.issues['文件'])
+    assert result.issues['行号'].max() <= 11
+    parts = {os.path.basename(path): load_previous_header([path]) for path in result.output_files}
+    for issue in result.issues.itertuples():
+        line = parts[issue.文件].iloc[issue.行号 - 2]
+        assert line['广告活动名称'] == issue.广告活动名称 and line['实体层级'] == issue.实体层级
+
+
+def test_summary_prefixes_rows_with_file_when_split():
+    issues = pd.DataFrame({'文件': ['h-part1.csv', 'h-part2.csv'], '行号': [3, 3], '列': 'SKU', '原因': 'SKU 为空'})
+    assert summarize_issues(issues)['示例行号'].tolist() == ['h-part1.csv:3, h-part2.csv:3']
+    assert summarize_issues(issues.assign(文件='h.csv'))['示例行号'].tolist() == ['3, 3']
@@ -0,0 +1,68 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+
+from writers import StreamingDelimitedWriter, output_path
+
+COLUMNS = ['广告活动名称', '关键词文本']
+
+
+# 函数：各活动行数 → DataFrame（活动 c0、c1 ... 的行相邻）
+def frame(block_sizes):
+    rows = [(f'c{i}', f'kw{i}-{j}') for i, size in enumerate(block_sizes) for j in range(size)]
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+# 函数：内存输出的各分卷读回为 DataFrame
+def read_parts(writer):
+    return [pd.read_csv(io.BytesIO(writer.output_data[path]), encoding='utf-8-sig')
+            for path in writer.output_files]
+
+
+@pytest.mark.parametrize('block_sizes, max_rows, part_sizes', [
+    ([3, 3, 3], 10, [9]),
+    ([3, 3, 3], 6, [6, 3]),
+    ([3, 3, 3], 5, [3, 3, 3]),
+    ([2, 7, 1], 4, [2, 4, 4]),
+    ([4, 4], 4, [4, 4]),
+])
+def test_write_frame_part_boundaries(block_sizes, max_rows, part_sizes):
+    df = frame(block_sizes)
+    with StreamingDelimitedWriter('header.csv', COLUMNS, max_rows=max_rows, in_memory=True) as writer:
+        writer.write_frame(df, '广告活动名称')
+    parts = read_parts(writer)
+    assert [len(part) for part in parts] == part_sizes
+    assert writer.row_count == len(df)
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), df)
+    # 只有超过上限的活动才跨分卷
+    split = {name for name in df['广告活动名称'] if sum(name in set(part['广告活动名称']) for part in parts) > 1}
+    assert split == {f'c{i}' for i, size in enumerate(block_sizes) if size > max_rows}
+    assert writer.split_blocks == len(split)
+
+
+def test_write_frame_matches_write_block():
+    df = frame([2, 5, 1, 3])
+    with StreamingDelimitedWriter('a.csv', COLUMNS, max_rows=4, in_memory=True) as by_frame:
+        by_frame.write_frame(df, '广告活动名称')
+    with StreamingDelimitedWriter('a.csv', COLUMNS, max_rows=4, in_memory=True) as by_block:
+        for _, group in df.groupby('广告活动名称', sort=False):
+            by_block.write_block(group.values.tolist())
+    assert by_frame.output_data == by_block.output_data
+
+
+def test_gzip_parts_and_names():
+    df = frame([3, 3])
+    path = output_path('header-JP.xlsx', 'csv', 'gzip')
+    with StreamingDelimitedWriter(path, COLUMNS, max_rows=3, compression='gzip', in_memory=True) as writer:
+        writer.write_frame(df, '广告活动名称')
+    assert writer.output_files == ['header-JP.csv.gz', 'header-JP-part2.csv.gz']
+    text = gzip.decompress(writer.output_data['header-JP-part2.csv.gz']).decode('utf-8-sig')
+    assert text.splitlines() == ['广告活动名称,关键词文本', 'c1,kw1-0', 'c1,kw1-1', 'c1,kw1-2']
+
+
+def test_empty_output_still_has_header_row():
+    with StreamingDelimitedWriter('empty.tsv', COLUMNS, delimiter='\t', in_memory=True) as writer:
+        writer.write_frame(frame([]), '广告活动名称')
+    assert writer.output_data['empty.tsv'].decode('utf-8-sig') == '广告活动名称\t关键词文本\r\n'
@@ -0,0 +1,258 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# 上传前校验：对生成的表头做向量化检查（ASIN 格式、关键词长度、金额、SKU、多余空白），
+# 在写出前找出亚马逊批量上传会拒绝的行，结果为 行号/列/原因 的问题表
+
+# 问题表的列；文件为问题行所在的输出文件（分卷时为该分卷），行号为该文件中的行号（表头占第 1 行）
+# validate_header 的行号按整个表头连续编号、文件为空，写出后由 locate_issues 换算到各输出文件
+ISSUE_COLUMNS = ['文件', '行号', '实体层级', '广告活动名称', '列', '值', '原因']
+
+# 问题汇总表的列
+ISSUE_SUMMARY_COLUMNS = ['列', '原因', '次数', '示例行号']
+
+# 亚马逊批量上传的限制
+KEYWORD_MAX_LENGTH = 80
+KEYWORD_MAX_WORDS = 10
+NEGATIVE_PHRASE_MAX_WORDS = 4
+CAMPAIGN_NAME_MAX_LENGTH = 128
+PERCENTAGE_RANGE = (0, 900)
+
+# 商品定向表达式：asin="10 位字母数字"
+ASIN_EXPRESSION = re.compile(r'asin="[A-Za-z0-9]{10}"')
+
+# 首尾空白或连续空白
+STRAY_WHITESPACE = re.compile(r'^\s|\s$|\s\s')
+
+# 检查多余空白的文本列
+WHITESPACE_COLUMNS = ['广告活动名称', 'SKU', '关键词文本', '拓展商品投放编号']
+
+# 各实体层级的金额列
+AMOUNT_COLUMNS = {
+    '广告活动': '每日预算',
+    '广告组': '广告组默认竞价',
+    '关键词': '竞价',
+    '商品定向': '竞价',
+}
+
+# 流式写出时每批校验的行数
+VALIDATION_BATCH_ROWS = 200_000
+
+
+# 函数：空值（NaN 或只有空白）
+def _is_blank(values):
+    return values.isna() | (values.astype(str).str.strip() == '')
+
+
+# 函数：非空但不是数字
+def _not_number(values):
+    return ~_is_blank(values) & pd.to_numeric(values, errors='coerce').isna()
+
+
+# 函数：转为浮点数组，不是数字的值为 NaN（数值列直接取值）
+def _numbers(values):
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy(dtype=float)
+    return pd.to_numeric(values.to_numpy(dtype=object), errors='coerce')
+
+
+class _IssueCollector:
+    # 收集各项检查命中的行位置，最后一次性组装为问题表。
+    # 每列只做一次 factorize（分类列直接用其编码），检查在不同值上计算再按编码展开
+    # （否定词、金额、活动名称等大量重复，去重后计算量小得多）
+
+    def __init__(self, df_header):
+        self.df = df_header
+        self.factorized = {}
+        self.parts = []
+        self.level_codes, self.level_names = self.factorize('实体层级')
+
+    # 函数：指定实体层级的行位置
+    def rows(self, *levels):
+        wanted = [code for code, name in enumerate(self.level_names) if name in levels]
+        return np.flatnonzero(np.isin(self.level_codes, wanted))
+
+    # 函数：列的编码和不同值（缓存）
+    def factorize(self, column):
+        if column not in self.factorized:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes = values.cat.codes.to_numpy().astype(np.intp)
+                uniques = values.cat.categories.to_numpy(dtype=object)
+            else:
+                codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+            # 空值编码为 -1，放到不同值的最后一位
+            codes[codes < 0] = len(uniques)
+            self.factorized[column] = codes, pd.Series([*uniques, None], dtype=object)
+        return self.factorized[column]
+
+    # 函数：列在 positions 行上的原值
+    def values(self, column, positions):
+        return self.df[column].take(positions).to_numpy(dtype=object)
+
+    # 函数：在 positions 行上对 column 做检查，check 接收不同值的 Series，返回是否有问题
+    def check(self, positions, column, check, reason):
+        if not len(positions) or column not in self.df.columns:
+            return
+        codes, uniques = self.factorize(column)
+        codes = codes[positions]
+        # 只检查这些行中出现的不同值
+        present = np.flatnonzero(np.bincount(codes, minlength=len(uniques)))
+        bad_values = np.zeros(len(uniques), dtype=bool)
+        bad_values[present] = np.asarray(check(uniques.iloc[present]), dtype=bool)
+        self.add(positions[bad_values[codes]], column, reason)
+
+    # 函数：记录问题行
+    def add(self, positions, column, reason):
+        if len(positions):
+            self.parts.append((positions, column, reason))
+
+    # 函数：组装问题表，按行号排序
+    def frame(self, row_offset=0):
+        if not self.parts:
+            return pd.DataFrame(columns=ISSUE_COLUMNS)
+        positions = np.concatenate([part[0] for part in self.parts])
+        columns = np.concatenate([np.full(len(part[0]), part[1], dtype=object) for part in self.parts])
+        reasons = np.concatenate([np.full(len(part[0]), part[2], dtype=object) for part in self.parts])
+        values = np.concatenate([self.values(part[1], part[0]) for part in self.parts])
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order]
+        return pd.DataFrame({
+            '文件': None,
+            '行号': positions + row_offset + 2,
+            '实体层级': self.values('实体层级', positions),
+            '广告活动名称': self.values('广告活动名称', positions),
+            '列': columns[order],
+            '值': values[order],
+            '原因': reasons[order],
+        }, columns=ISSUE_COLUMNS)
+
+
+# 函数：校验表头 DataFrame，返回问题表（无问题时为空表）
+# row_offset 为本批之前的数据行数（流式写出分批校验时使用）
+def validate_header(df_header, row_offset=0):
+    issues = _IssueCollector(df_header)
+
+    # 活动名称：不能为空，长度不超过上限
+    all_rows = np.arange(len(df_header))
+    issues.check(all_rows, '广告活动名称', _is_blank, '活动名称为空')
+    issues.check(all_rows, '广告活动名称',
+                 lambda values: values.astype(str).str.len() > CAMPAIGN_NAME_MAX_LENGTH,
+                 f'活动名称超过 {CAMPAIGN_NAME_MAX_LENGTH} 个字符')
+
+    # 关键词与否定关键词：不能为空，长度和词数不超过上限
+    keyword_rows = issues.rows('关键词', '否定关键词')
+    issues.check(keyword_rows, '关键词文本', _is_blank, '关键词为空')
+    issues.check(keyword_rows, '关键词文本',
+                 lambda values: values.astype(str).str.strip().str.len() > KEYWORD_MAX_LENGTH,
+                 f'关键词超过 {KEYWORD_MAX_LENGTH} 个字符')
+    match_types = issues.values('匹配类型', keyword_rows)
+    phrase_rows = keyword_rows[match_types == '否定词组']
+    other_rows = keyword_rows[match_types != '否定词组']
+    issues.check(other_rows, '关键词文本',
+                 lambda values: values.astype(str).str.count(r'\S+') > KEYWORD_MAX_WORDS,
+                 f'关键词超过 {KEYWORD_MAX_WORDS} 个词')
+    issues.check(phrase_rows, '关键词文本',
+                 lambda values: values.astype(str).str.count(r'\S+') > NEGATIVE_PHRASE_MAX_WORDS,
+                 f'否定词组超过 {NEGATIVE_PHRASE_MAX_WORDS} 个词')
+
+    # 商品定向与否定商品定向：asin="10 位字母数字"
+    issues.check(issues.rows('商品定向', '否定商品定向'), '拓展商品投放编号',
+                 lambda values: ~values.astype(str).str.fullmatch(ASIN_EXPRESSION),
+                 'ASIN 格式不正确（应为 10 位字母数字）')
+
+    # 商品广告：SKU 不能为空
+    issues.check(issues.rows('商品广告'), 'SKU', _is_blank, 'SKU 为空')
+
+    # 金额：必须为正数
+    for level, column in AMOUNT_COLUMNS.items():
+        rows = issues.rows(level)
+        issues.check(rows, column, _is_blank, f'{column}为空')
+        issues.check(rows, column, _not_number, f'{column}不是数字')
+        issues.check(rows, column, lambda values: pd.to_numeric(values, errors='coerce') <= 0, f'{column}必须大于 0')
+
+    # 竞价不能高于所在活动的每日预算：按活动编号的编码查每个活动的预算（同一编号取第一个活动行）
+    campaign_rows = issues.rows('广告活动')
+    if len(campaign_rows):
+        campaign_codes, campaign_ids = issues.factorize('广告活动编号')
+        budgets = np.full(len(campaign_ids), np.nan)
+        budgets[campaign_codes[campaign_rows][::-1]] = _numbers(df_header['每日预算'].take(campaign_rows))[::-1]
+        for column, levels in [('广告组默认竞价', ['广告组']), ('竞价', ['关键词', '商品定向'])]:
+            rows = issues.rows(*levels)
+            if not len(rows):
+                continue
+            bids = _numbers(df_header[column].take(rows))
+            limits = budgets[campaign_codes[rows]]
+            # 预算本身无效时已单独报告
+            issues.add(rows[(bids > limits) & (limits > 0)], column, f'{column}高于活动每日预算')
+
+    # 竞价调整：百分比为空或在范围内
+    low, high = PERCENTAGE_RANGE
+    issues.check(issues.rows('竞价调整'), '百分比', _not_number, '百分比不是数字')
+    issues.check(issues.rows('竞价调整'), '百分比',
+                 lambda values: ~pd.to_numeric(values, errors='coerce').between(low, high) & ~_is_blank(values),
+                 f'百分比应在 {low}-{high} 之间')
+
+    # 文本列：首尾或连续空白
+    for column in WHITESPACE_COLUMNS:
+        issues.check(all_rows, column,
+                     lambda values: values.astype(str).str.contains(STRAY_WHITESPACE),
+                     '首尾或连续空白')
+
+    return issues.frame(row_offset)
+
+
+# 函数：流式写出时分批校验：按活动累积到 batch_rows 行后组装 DataFrame 校验，行原样传出，问题表追加到 issues
+# 行号按全部数据行连续编号，写出后由 locate_issues 换算到各分卷
+def validate_stream(campaign_rows, issues, columns, batch_rows=VALIDATION_BATCH_ROWS):
+    batch = []
+    offset = 0
+    for rows in campaign_rows:
+        batch.extend(rows)
+        if len(batch) >= batch_rows:
+            issues.append(validate_header(pd.DataFrame(batch, columns=columns), row_offset=offset))
+            offset += len(batch)
+            batch = []
+        yield rows
+    if batch:
+        issues.append(validate_header(pd.DataFrame(batch, columns=columns), row_offset=offset))
+
+
+# 函数：合并分批校验的问题表
+def concat_issues(parts):
+    parts = [part for part in parts if not part.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=ISSUE_COLUMNS)
+
+
+# 函数：把连续编号的行号换算为所在输出文件和文件内的行号
+# part_row_counts 为各输出文件的数据行数（与 output_files 对应，见 writers 的 part_row_counts）
+def locate_issues(issues, output_files, part_row_counts):
+    if issues.empty or not output_files:
+        return issues
+    ends = np.cumsum(part_row_counts)
+    rows = issues['行号'].to_numpy(dtype=np.int64) - 2
+    parts = np.minimum(np.searchsorted(ends, rows, side='right'), len(output_files) - 1)
+    names = np.array([os.path.basename(str(path)) for path in output_files], dtype=object)
+    return issues.assign(文件=names[parts], 行号=rows - (ends - np.asarray(part_row_counts))[parts] + 2)
+
+
+# 函数：问题涉及的行数（分卷时不同文件的相同行号分别计数）
+def issue_row_count(issues):
+    return len(issues.drop_duplicates(['文件', '行号']))
+
+
+# 函数：问题汇总（按列和原因计数，附前几个行号，多个文件时行号前加文件名），日志和界面展示用
+def summarize_issues(issues, sample=5):
+    if issues.empty:
+        return pd.DataFrame(columns=ISSUE_SUMMARY_COLUMNS)
+    rows = issues['行号'].astype(str)
+    if issues['文件'].nunique() > 1:
+        rows = issues['文件'].astype(str) + ':' + rows
+    grouped = rows.groupby([issues['列'], issues['原因']], sort=False)
+    return pd.DataFrame({
+        '次数': grouped.size(),
+        '示例行号': grouped.agg(lambda values: ', '.join(values.head(sample))),
+    }).reset_index()[ISSUE_SUMMARY_COLUMNS]
@@ -0,0 +1,376 @@
+import csv
+import gzip
+import io
+import math
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# 表头文件写出：流式（write_only）写入，超过行数上限自动分卷；
+# 也可写出 csv/tsv 文本（UTF-8 带 BOM，Excel 打开日文不乱码），可选 gzip/zip 压缩
+
+# 单个文件数据行上限（Excel 单表上限为 1,048,576 行）
+BULK_UPLOAD_ROW_LIMIT = 1_000_000
+
+# 输出格式与分隔符（xlsx 为 None）
+OUTPUT_FORMATS = {'xlsx': None, 'csv': ',', 'tsv': '\t'}
+
+# 文本格式的压缩方式与文件后缀
+COMPRESSIONS = {'gzip': '.gz', 'zip': '.zip'}
+
+# gzip 压缩级别：6 与默认的 9 压缩率相近，速度快得多
+GZIP_LEVEL = 6
+
+# to_csv 每次写出的行数：分类列先按段转为 object 再写出（比直接写分类列快），转换的内存只与段大小有关
+CSV_CHUNK_ROWS = 100_000
+
+# 下载时的 MIME 类型（按文件后缀）
+MIME_TYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv',
+    '.tsv': 'text/tab-separated-values',
+    '.gz': 'application/gzip',
+    '.zip': 'application/zip',
+}
+
+
+# 函数：第 n 个分卷的文件名，第 1 卷沿用原文件名，之后为 xxx-part2.xlsx、xxx-part3.csv.gz ...
+def part_path(output_file, part):
+    if part == 1:
+        return output_file
+    stem = output_stem(output_file)
+    return f"{stem}-part{part}{output_file[len(stem):]}"
+
+
+# 函数：去掉后缀的文件名，gzip 文件连同内层后缀一起去掉（header.csv.gz → header）
+def output_stem(path):
+    stem, ext = os.path.splitext(path)
+    if ext == COMPRESSIONS['gzip']:
+        stem = os.path.splitext(stem)[0]
+    return stem
+
+
+# 函数：检查输出格式和压缩方式，不支持时抛出 ValueError
+def check_output_format(output_format, compression=None):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式：{output_format}（可选：{', '.join(OUTPUT_FORMATS)}）")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"不支持的压缩方式：{compression}（可选：{', '.join(COMPRESSIONS)}）")
+    if compression is not None and output_format == 'xlsx':
+        raise ValueError("xlsx 本身已是压缩格式，只有 csv/tsv 可以压缩")
+
+
+# 函数：按输出格式和压缩方式替换文件后缀：header-JP.xlsx → header-JP.csv / header-JP.csv.gz / header-JP.zip
+def output_path(output_file, output_format='xlsx', compression=None):
+    stem = output_stem(str(output_file))
+    if compression == 'zip':
+        return stem + COMPRESSIONS['zip']
+    return f"{stem}.{output_format}" + (COMPRESSIONS[compression] if compression else '')
+
+
+# 函数：下载时的 MIME 类型
+def output_mime(path):
+    return MIME_TYPES.get(os.path.splitext(str(path))[1], 'application/octet-stream')
+
+
+# 函数：多个输出文件打包为一个 zip（文件名 → bytes），zip 内只保留文件名
+def zip_outputs(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, data in files.items():
+            archive.writestr(os.path.basename(path), data)
+    return buffer.getvalue()
+
+
+# 函数：单元格取值，NaN 写为空单元格（与 to_excel 一致）
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# 函数：分隔文本的单元格取值：整数值的浮点数写为整数（12.0 → 12），流式行和 DataFrame 写出的文本一致
+def _text_cell(value):
+    value = _cell(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# 函数：DataFrame 转为写出分隔文本的 object 列，取值同 _text_cell（浮点列向量化转换，分类列只转换类别）
+def _text_frame(df):
+    data = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values.dtype):
+            numbers = values.to_numpy()
+            column = numbers.astype(object)
+            integral = np.isfinite(numbers) & (numbers == np.floor(numbers))
+            column[integral] = numbers[integral].astype(np.int64)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            categories = np.array([_text_cell(value) for value in values.cat.categories] + [None], dtype=object)
+            column = categories[values.cat.codes.to_numpy()]
+        elif values.dtype == object:
+            column = np.array([_text_cell(value) for value in values], dtype=object)
+        else:
+            column = values.to_numpy(dtype=object)
+        data[col] = column
+    return pd.DataFrame(data, columns=df.columns)
+
+
+class StreamingXlsxWriter:
+    # 流式 xlsx 写出：行块生成后立即写入 write_only 工作簿，内存占用与总行数无关。
+    # 按活动行块整体分卷，避免同一活动的实体被拆到两个文件；单个行块超过上限时才拆分。
+    # in_memory=True 时不写磁盘，各分卷内容保存在 output_data（文件名 → bytes）。
+
+    def __init__(self, output_file, columns, max_rows=BULK_UPLOAD_ROW_LIMIT, sheet_title='Sheet1', in_memory=False):
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows 必须为正整数")
+        self.output_file = output_file
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.sheet_title = sheet_title
+        self.in_memory = in_memory
+        self.output_files = []
+        self.output_data = {}
+        self.row_count = 0
+        self.split_blocks = 0
+        # 已保存的各分卷数据行数（与 output_files 对应）
+        self.part_row_counts = []
+        self._workbook = None
+        self._sheet = None
+        self._part_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 出错（包括取消生成）时不保存未完成的分卷
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard_part()
+        return False
+
+    # 函数：开始新分卷
+    def _open_part(self):
+        self._save_part()
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(self.sheet_title)
+        self._sheet.append(self.columns)
+        self._part_rows = 0
+        self.output_files.append(part_path(self.output_file, len(self.output_files) + 1))
+
+    # 函数：保存当前分卷
+    def _save_part(self):
+        if self._workbook is not None:
+            self.part_row_counts.append(self._part_rows)
+            if self.in_memory:
+                buffer = io.BytesIO()
+                self._workbook.save(buffer)
+                self.output_data[self.output_files[-1]] = buffer.getvalue()
+            else:
+                self._workbook.save(self.output_files[-1])
+            self._workbook = None
+            self._sheet = None
+
+    # 函数：丢弃未保存的分卷；先结束工作表的行写入，避免回收时向已关闭的临时文件写入
+    def _discard_part(self):
+        if self._sheet is not None:
+            self._sheet.close()
+        self._workbook = None
+        self._sheet = None
+
+    # 函数：写入一个活动的行块
+    def write_block(self, rows):
+        if not rows:
+            return
+        if self._workbook is None:
+            self._open_part()
+        limit = self.max_rows
+        if limit is not None and self._part_rows and self._part_rows + len(rows) > limit:
+            self._open_part()
+        if limit is not None and len(rows) > limit:
+            self.split_blocks += 1
+        for row in rows:
+            if limit is not None and self._part_rows >= limit:
+                self._open_part()
+            self._sheet.append([_cell(value) for value in row])
+            self._part_rows += 1
+        self.row_count += len(rows)
+
+    # 函数：完成写出，返回所有分卷文件名
+    def close(self):
+        if self._workbook is None and not self.output_files:
+            # 没有任何数据行时仍输出只含表头的文件
+            self._open_part()
+        self._save_part()
+        return self.output_files
+
+
+class StreamingDelimitedWriter:
+    # 流式 csv/tsv 写出，与 StreamingXlsxWriter 接口相同：按活动行块整体分卷，单个行块超过上限时才拆分。
+    # 每个分卷以 UTF-8 BOM 开头；compression='gzip' 时为 .csv.gz，'zip' 时每个分卷为一个只含一个 csv 的 zip。
+    # write_frame() 直接用 DataFrame.to_csv 写出整段行，不逐行转换。
+
+    def __init__(self, output_file, columns, max_rows=BULK_UPLOAD_ROW_LIMIT, delimiter=',', compression=None,
+                 in_memory=False):
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows 必须为正整数")
+        self.output_file = output_file
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.delimiter = delimiter
+        self.compression = compression
+        self.in_memory = in_memory
+        self.output_files = []
+        self.output_data = {}
+        self.row_count = 0
+        self.split_blocks = 0
+        # 已保存的各分卷数据行数（与 output_files 对应）
+        self.part_row_counts = []
+        self._raw = None
+        self._archive = None
+        self._text = None
+        self._writer = None
+        self._part_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_streams()
+        return False
+
+    # 函数：开始新分卷：打开（压缩）二进制流，写入 BOM 和表头行
+    def _open_part(self):
+        self._save_part()
+        path = part_path(self.output_file, len(self.output_files) + 1)
+        self.output_files.append(path)
+        self._raw = io.BytesIO() if self.in_memory else open(path, 'wb')
+        if self.compression == 'gzip':
+            binary = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw, compresslevel=GZIP_LEVEL, mtime=0)
+        elif self.compression == 'zip':
+            self._archive = zipfile.ZipFile(self._raw, 'w', compression=zipfile.ZIP_DEFLATED)
+            inner = os.path.splitext(os.path.basename(path))[0] + ('.tsv' if self.delimiter == '\t' else '.csv')
+            binary = self._archive.open(inner, 'w')
+        else:
+            binary = self._raw
+        self._text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._text, delimiter=self.delimiter, lineterminator='\r\n')
+        self._writer.writerow(self.columns)
+        self._part_rows = 0
+
+    # 函数：关闭当前分卷的各层流（文本 → 压缩 → 文件）
+    def _close_streams(self):
+        if self._text is not None:
+            # 压缩流关闭时写入结尾，但不关闭底层文件
+            if self._raw is self._text.buffer:
+                self._text.flush()
+                self._text.detach()
+            else:
+                self._text.close()
+            self._text = None
+            self._writer = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    # 函数：保存当前分卷
+    def _save_part(self):
+        if self._raw is None:
+            return
+        self.part_row_counts.append(self._part_rows)
+        self._close_streams()
+        if self.in_memory:
+            self.output_data[self.output_files[-1]] = self._raw.getvalue()
+        else:
+            self._raw.close()
+        self._raw = None
+
+    # 函数：为 rows_needed 行腾出空间：当前分卷放不下时开始新分卷
+    def _reserve(self, rows_needed):
+        if self._raw is None:
+            self._open_part()
+        limit = self.max_rows
+        if limit is not None and self._part_rows and self._part_rows + rows_needed > limit:
+            self._open_part()
+        if limit is not None and rows_needed > limit:
+            self.split_blocks += 1
+
+    # 函数：写入一个活动的行块（行列表）
+    def write_block(self, rows):
+        if not rows:
+            return
+        self._reserve(len(rows))
+        limit = self.max_rows
+        start = 0
+        while start < len(rows):
+            if limit is not None and self._part_rows >= limit:
+                self._open_part()
+            end = len(rows) if limit is None else min(len(rows), start + limit - self._part_rows)
+            self._writer.writerows([[_text_cell(value) for value in row] for row in rows[start:end]])
+            self._part_rows += end - start
+            start = end
+        self.row_count += len(rows)
+
+    # 函数：写入整个 DataFrame，按 group_column 相邻相同值分段（同一活动不跨分卷），每卷一次 to_csv
+    def write_frame(self, df, group_column=None):
+        if not len(df):
+            return
+        if group_column is None or self.max_rows is None:
+            bounds = [0, len(df)]
+        else:
+            codes = pd.factorize(df[group_column])[0]
+            bounds = [0, *np.flatnonzero(codes[1:] != codes[:-1]) + 1, len(df)]
+        limit = self.max_rows
+        start = 0
+        for block_start, block_end in zip(bounds[:-1], bounds[1:]):
+            if self._raw is None:
+                self._open_part()
+            pending = block_start - start
+            if limit is not None and self._part_rows + pending + (block_end - block_start) > limit:
+                self._write_rows(df, start, block_start)
+                start = block_start
+                self._reserve(block_end - block_start)
+        self._write_rows(df, start, len(df))
+
+    # 函数：写出 DataFrame 的 [start, end) 行，超过单卷上限时在行边界拆分
+    def _write_rows(self, df, start, end):
+        limit = self.max_rows
+        while start < end:
+            if self._raw is None or (limit is not None and self._part_rows >= limit):
+                self._open_part()
+            stop = end if limit is None else min(end, start + limit - self._part_rows)
+            for chunk_start in range(start, stop, CSV_CHUNK_ROWS):
+                chunk = _text_frame(df.iloc[chunk_start:min(stop, chunk_start + CSV_CHUNK_ROWS)])
+                chunk.to_csv(self._text, sep=self.delimiter, header=False, index=False, lineterminator='\r\n')
+            self._part_rows += stop - start
+            self.row_count += stop - start
+            start = stop
+
+    # 函数：完成写出，返回所有分卷文件名
+    def close(self):
+        if self._raw is None and not self.output_files:
+            # 没有任何数据行时仍输出只含表头的文件
+            self._open_part()
+        self._save_part()
+        return self.output_files
+
+
+# 函数：按输出格式创建流式写出器（xlsx 或 csv/tsv）
+def open_header_writer(output_file, columns, max_rows=BULK_UPLOAD_ROW_LIMIT, in_memory=False, output_format='xlsx',
+                       compression=None):
+    check_output_format(output_format, compression)
+    if output_format == 'xlsx':
+        return StreamingXlsxWriter(output_file, columns, max_rows=max_rows, in_memory=in_memory)
+    return StreamingDelimitedWriter(output_file, columns, max_rows=max_rows, delimiter=OUTPUT_FORMATS[output_format],
+                                    compression=compression, in_memory=in_memory)